@@ -10,6 +10,43 @@ import os
 
 app = Flask(__name__)
 
+# Banco consultado pela API
+CAMINHO_BANCO = os.environ.get('CNPJ_BANCO', 'cnpj_amostra.db')
+
+# Índice de sócios de indice_memoria.py (False se não houver índice atualizado)
+_indice = None
+
+def obter_indice():
+    """
+    Índice de sócios mapeado dos arquivos .npy (mmap, somente leitura).
+    Cada worker da API abre os mesmos arquivos, e as páginas ficam uma vez só
+    no cache do sistema, por mais workers que existam. O índice não é
+    construído aqui: rode `python indice_memoria.py --banco ...` antes de subir a API.
+    """
+    global _indice
+    if _indice is None:
+        from indice_memoria import IndiceMemoria, diretorio_indice
+        diretorio = diretorio_indice(CAMINHO_BANCO)
+        if os.path.exists(CAMINHO_BANCO) and IndiceMemoria.atualizado(diretorio, CAMINHO_BANCO):
+            _indice = IndiceMemoria.abrir(diretorio)
+        else:
+            _indice = False
+    return _indice or None
+
+# Bitmaps de presença de bitmap_presenca.py (False se não houver bitmaps atualizados)
+_presenca = None
+
+def obter_presenca():
+    """
+    Bitmaps de miolos e CNPJs básicos presentes, mapeados dos arquivos .npy
+    gravados pela carga (carregar_base.py). Como o índice, não são construídos aqui.
+    """
+    global _presenca
+    if _presenca is None:
+        from bitmap_presenca import BitmapPresenca
+        _presenca = (os.path.exists(CAMINHO_BANCO) and BitmapPresenca.abrir_se_atualizado(CAMINHO_BANCO)) or False
+    return _presenca or None
+
 # Função para normalizar nomes
 def normalizar_nome(nome):
     """Normaliza o nome para comparação"""
@@ -38,6 +75,32 @@ def similaridade(a, b):
         return 0
     return SequenceMatcher(None, a, b).ratio()
 
+def filtrar_por_nome(resultados, nome_normalizado):
+    """Candidatos (cpf_miolo, nome, cnpj, cpf) com nome parecido o bastante, um por CNPJ"""
+    # Os mesmos limites superiores do score da consulta em lote (escolher_candidato)
+    from consulta_cnpj_corrigida import candidatos_acima
+    
+    resultados_com_score = []
+    
+    nomes = [normalizar_nome(nome_socio) for _, nome_socio, _, _ in resultados]
+    for posicao, score in candidatos_acima(nome_normalizado, nomes, 0.7):  # Limiar de similaridade configurável
+        cpf_miolo, nome_socio, cnpj, cpf_numeros = resultados[posicao]
+        
+        # Adicionar se score for adequado
+        if score > 0.7:
+            # Verificar se já temos este CNPJ
+            existente = next((r for r in resultados_com_score if r['cnpj'] == cnpj), None)
+            
+            if not existente:
+                resultados_com_score.append({
+                    'cpf_miolo': cpf_miolo,
+                    'nome': nome_socio,
+                    'cnpj': cnpj,
+                    'cpf': cpf_numeros,
+                    'score': score
+                })
+    return resultados_com_score
+
 # Função para extrair miolo do CPF
 def extrair_miolo_cpf(cpf):
     """Extrai o miolo do CPF (6 dígitos centrais)"""
@@ -85,20 +148,36 @@ def consultar_socio_api():
     # Iniciar tempo de processamento
     inicio = time.time()
     
-    # Conectar ao banco SQLite
-    conn = sqlite3.connect('cnpj_amostra.db')
-    cursor = conn.cursor()
+    conn = None
     
     try:
-        # Buscar por miolo de CPF
-        cursor.execute('''
-        SELECT cpf_miolo, nome_socio, cnpj, cpf_numeros
-        FROM socios
-        WHERE cpf_miolo = ?
-        LIMIT 100
-        ''', (miolo_cpf,))
-        
-        resultados = cursor.fetchall()
+        indice = obter_indice()
+        presenca = obter_presenca()
+        if presenca is not None and not presenca.tem_miolo(miolo_cpf):
+            # Nenhum sócio com este miolo: responde sem ir ao índice nem ao banco
+            resultados = []
+        elif indice is not None:
+            # Busca no índice compartilhado, sem abrir o SQLite. O balde é comparado
+            # inteiro mesmo quando é quente: a resposta traz todos os sócios acima do limiar
+            inicio_faixa, fim_faixa = indice.faixas_lote([miolo_cpf]).get(miolo_cpf, (0, 0))
+            resultados = [
+                (miolo_cpf, nome_socio, cnpj_basico, cnpj_cpf_socio)
+                for cnpj_basico, nome_socio, cnpj_cpf_socio, _
+                in indice.linhas(slice(inicio_faixa, fim_faixa))
+            ]
+        else:
+            # Conectar ao banco SQLite
+            conn = sqlite3.connect(CAMINHO_BANCO)
+            cursor = conn.cursor()
+            
+            # Buscar por miolo de CPF (todos os sócios do miolo, como no índice)
+            cursor.execute('''
+            SELECT cpf_miolo, nome_socio, cnpj, cpf_numeros
+            FROM socios
+            WHERE cpf_miolo = ?
+            ''', (miolo_cpf,))
+            
+            resultados = cursor.fetchall()
         
         # Se não encontrou, retorna vazio
         if not resultados:
@@ -134,25 +213,7 @@ def consultar_socio_api():
         # Filtrar resultados por similaridade de nome
         nome_normalizado = normalizar_nome(nome)
         
-        resultados_com_score = []
-        
-        for cpf_miolo, nome_socio, cnpj, cpf_numeros in resultados:
-            nome_socio_norm = normalizar_nome(nome_socio)
-            score = similaridade(nome_normalizado, nome_socio_norm)
-            
-            # Adicionar se score for adequado
-            if score > 0.7:  # Limiar de similaridade configurável
-                # Verificar se já temos este CNPJ
-                existente = next((r for r in resultados_com_score if r['cnpj'] == cnpj), None)
-                
-                if not existente:
-                    resultados_com_score.append({
-                        'cpf_miolo': cpf_miolo,
-                        'nome': nome_socio,
-                        'cnpj': cnpj,
-                        'cpf': cpf_numeros,
-                        'score': score
-                    })
+        resultados_com_score = filtrar_por_nome(resultados, nome_normalizado)
         
         # Ordenar por similaridade
         resultados_com_score.sort(key=lambda x: x['score'], reverse=True)
@@ -179,7 +240,7 @@ def consultar_socio_api():
             'empresas': empresas,
             'tempo_ms': (fim - inicio) * 1000
         })
-        
+    
     except Exception as e:
         fim = time.time()
         return jsonify({
@@ -192,24 +253,74 @@ def consultar_socio_api():
         }), 500
     
     finally:
-        conn.close()
+        if conn is not None:
+            conn.close()
+
+# Rota de autocompletar de empresas pelo nome
+@app.route('/api/empresas/sugestoes', methods=['GET'])
+def sugerir_empresas_api():
+    """
+    Empresas cuja razão social ou nome fantasia começa com o texto `q`, até
+    `limite` (ordem alfabética), com cnpj_basico e situação cadastral. Lê só a
+    faixa do prefixo na tabela nomes_empresas criada pela carga (carregar_base.py).
+    """
+    from motor_consulta import MotorSQLite, LIMITE_SUGESTOES
+    from consulta_cnpj_corrigida import sugerir_empresas
+    
+    texto = request.args.get('q', '')
+    limite = min(request.args.get('limite', LIMITE_SUGESTOES, type=int), 100)
+    
+    inicio = time.time()
+    conn = None
+    try:
+        conn = sqlite3.connect(CAMINHO_BANCO)
+        sugestoes = sugerir_empresas(CAMINHO_BANCO, texto, limite, MotorSQLite(conn))
+        if sugestoes is None:
+            return jsonify({
+                'status': 'erro',
+                'mensagem': 'Banco sem o índice de nomes de empresas (rode carregar_base.py --apenas-indices)'
+            }), 503
+        
+        fim = time.time()
+        return jsonify({
+            'q': texto,
+            'status': 'sucesso',
+            'empresas': [{
+                'cnpj_basico': sugestao.cnpj_basico,
+                'nome': sugestao.nome,
+                'razao_social': sugestao.razao_social,
+                'situacao_cadastral': sugestao.situacao_cadastral,
+                'situacao_descricao': sugestao.situacao_descricao
+            } for sugestao in sugestoes],
+            'tempo_ms': (fim - inicio) * 1000
+        })
+    
+    except Exception as e:
+        return jsonify({
+            'status': 'erro',
+            'mensagem': str(e)
+        }), 500
+    
+    finally:
+        if conn is not None:
+            conn.close()
 
 # Rota para informações sobre o banco de dados
 @app.route('/api/info', methods=['GET'])
 def info_api():
     """Endpoint para obter informações sobre o banco de dados"""
     try:
-        if not os.path.exists('cnpj_amostra.db'):
+        if not os.path.exists(CAMINHO_BANCO):
             return jsonify({
                 'status': 'erro',
                 'mensagem': 'Banco de dados não encontrado'
             }), 404
         
         # Obter tamanho do banco
-        tamanho_mb = os.path.getsize('cnpj_amostra.db') / (1024 * 1024)
+        tamanho_mb = os.path.getsize(CAMINHO_BANCO) / (1024 * 1024)
         
         # Conectar ao banco
-        conn = sqlite3.connect('cnpj_amostra.db')
+        conn = sqlite3.connect(CAMINHO_BANCO)
         cursor = conn.cursor()
         
         # Obter lista de tabelas
@@ -261,9 +372,11 @@ def info_api():
             'tamanho_mb': tamanho_mb,
             'tabelas': tabelas_info,
             'indices': indices_info,
-            'estatisticas_miolos': estatisticas_miolos
+            'estatisticas_miolos': estatisticas_miolos,
+            'indice_memoria': obter_indice() is not None,
+            'bitmaps_presenca': obter_presenca() is not None
         })
-        
+    
     except Exception as e:
         return jsonify({
             'status': 'erro',
@@ -279,6 +392,7 @@ def home():
         'mensagem': 'API de teste para consulta CNPJ por miolo de CPF',
         'endpoints': {
             '/api/consultar_socio': 'POST - Consulta sócio por CPF e nome',
+            '/api/empresas/sugestoes': 'GET - Autocompletar de empresas pelo começo do nome (?q=...&limite=10)',
             '/api/info': 'GET - Informações sobre o banco de dados'
         }
     })
@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+# benchmarks.py - Medições de desempenho dos componentes da base CNPJ
+import os
+import time
+import random
+import zipfile
+import argparse
+
+import numpy as np
+
+import parser_receita
+
+def _medir(descricao, funcao, bytes_processados):
+    """Executa a função e imprime tempo e vazão"""
+    inicio = time.perf_counter()
+    linhas = funcao()
+    decorrido = time.perf_counter() - inicio
+    vazao = f"{bytes_processados/1024/1024/decorrido:8.1f} MB/s" if bytes_processados else " " * 13
+    print(f"  {descricao:<38} {decorrido:7.2f}s  {vazao}"
+          + (f"  {linhas/decorrido:12,.0f} linhas/s" if linhas else ""))
+    return decorrido
+
+def benchmark_parser(caminho_zip, tipo=None):
+    """
+    Compara o parser da Receita com pd.read_csv no mesmo arquivo e com os
+    limites de I/O: leitura do zip em disco e só a descompactação.
+    A vazão é sempre calculada sobre o tamanho descompactado.
+    """
+    tipo = tipo or parser_receita.identificar_tipo(caminho_zip)
+    with zipfile.ZipFile(caminho_zip) as arquivo_zip:
+        tamanho = sum(info.file_size for info in arquivo_zip.infolist())
+    
+    print(f"Arquivo: {caminho_zip} ({tipo})")
+    print(f"Compactado: {os.path.getsize(caminho_zip)/1024/1024:.1f} MB, "
+          f"descompactado: {tamanho/1024/1024:.1f} MB\n")
+    
+    def ler_disco():
+        with open(caminho_zip, 'rb') as f:
+            while f.read(parser_receita.TAMANHO_BUFFER):
+                pass
+        return 0
+    
+    def descompactar():
+        with zipfile.ZipFile(caminho_zip) as arquivo_zip:
+            for membro in arquivo_zip.namelist():
+                with arquivo_zip.open(membro) as fluxo:
+                    while fluxo.read(parser_receita.TAMANHO_BUFFER):
+                        pass
+        return 0
+    
+    def parser():
+        return sum(len(lote) for lote in parser_receita.ler_lotes(caminho_zip, tipo))
+    
+    _medir("Leitura do zip (disco, cache quente)", ler_disco, os.path.getsize(caminho_zip))
+    _medir("Descompactação", descompactar, tamanho)
+    _medir("parser_receita.ler_lotes", parser, tamanho)
+    
+    try:
+        import pandas as pd
+    except ImportError:
+        print("  pandas não instalado, comparação com pd.read_csv ignorada")
+        return
+    
+    def pandas():
+        total = 0
+        leitor = pd.read_csv(
+            caminho_zip, sep=';', header=None, encoding='latin-1', dtype=str,
+            names=parser_receita.colunas(tipo), chunksize=500000
+        )
+        for chunk in leitor:
+            total += len(chunk)
+        return total
+    
+    _medir("pd.read_csv (dtype=str, chunks)", pandas, tamanho)
+
+def benchmark_memoria(db_path, quantidade=100000, semente=42):
+    """
+    Resolve o mesmo lote de miolos (metade existentes, metade aleatórios) com
+    uma consulta SQL por miolo e com o índice NumPy (np.searchsorted em lote).
+    """
+    from motor_consulta import MotorSQLite
+    from indice_memoria import IndiceMemoria
+    
+    indice = IndiceMemoria.carregar(db_path)
+    gerador = random.Random(semente)
+    existentes = indice.miolo[[gerador.randrange(len(indice)) for _ in range(quantidade // 2)]]
+    miolos = [f"{int(m):06d}" for m in existentes]
+    miolos += [f"{gerador.randrange(1000000):06d}" for _ in range(quantidade - len(miolos))]
+    
+    print(f"Banco: {db_path} ({len(indice):,} sócios no índice)")
+    print(f"Lote: {len(miolos):,} miolos\n")
+    
+    motor = MotorSQLite(db_path)
+    resultados = {}
+    
+    def sql():
+        resultados['sql'] = {m: motor.socios_por_miolo(m) for m in set(miolos)}
+        return len(miolos)
+    
+    def memoria():
+        resultados['memoria'] = indice.buscar_lote(miolos)
+        return len(miolos)
+    
+    def so_busca():
+        indice.faixas([int(m) for m in miolos])
+        return len(miolos)
+    
+    try:
+        tempo_sql = _medir("SQL (uma consulta por miolo)", sql, 0)
+        tempo_memoria = _medir("NumPy (searchsorted + sócios)", memoria, 0)
+        _medir("NumPy (só searchsorted)", so_busca, 0)
+    finally:
+        motor.fechar()
+    
+    print(f"\nGanho: {tempo_sql / tempo_memoria:.0f}x; "
+          f"resultados idênticos: {'SIM' if resultados['sql'] == resultados['memoria'] else 'NÃO'}")
+
+def benchmark_consulta(db_path, arquivo, engine='sqlite', repeticoes=3):
+    """
+    Tempo e pico de memória alocada (tracemalloc) por consulta de sócio, com
+    a lista de um arquivo CSV (nome,cpf), e o plano da consulta por miolo no SQLite.
+    """
+    import io
+    import csv
+    import tracemalloc
+    import contextlib
+    from motor_consulta import criar_motor
+    from consulta_cnpj_corrigida import consulta_socio_direta
+    
+    with open(arquivo, 'r', encoding='utf-8') as f:
+        socios = [(linha['nome'], linha['cpf']) for linha in csv.DictReader(f)]
+    
+    motor = criar_motor(engine, db_path)
+    try:
+        if engine != 'duckdb':
+            plano = motor._executar(
+                f"EXPLAIN QUERY PLAN SELECT {motor._select_socios()} FROM socios WHERE {motor._expressao_miolo()} = ?",
+                ('000000',))
+            print(f"Plano: {'; '.join(linha[-1] for linha in plano)}")
+        print(f"Consultas: {len(socios)} x {repeticoes} ({engine})\n")
+        
+        saida = io.StringIO()
+        picos = []
+        inicio = time.perf_counter()
+        for _ in range(repeticoes):
+            for nome, cpf in socios:
+                with contextlib.redirect_stdout(saida):
+                    consulta_socio_direta(db_path, nome, cpf, motor=motor)
+                saida.seek(0)
+                saida.truncate()
+        decorrido = time.perf_counter() - inicio
+        
+        tracemalloc.start()
+        for nome, cpf in socios:
+            tracemalloc.reset_peak()
+            antes = tracemalloc.get_traced_memory()[0]
+            with contextlib.redirect_stdout(saida):
+                consulta_socio_direta(db_path, nome, cpf, motor=motor)
+            picos.append(tracemalloc.get_traced_memory()[1] - antes)
+            saida.seek(0)
+            saida.truncate()
+        tracemalloc.stop()
+    finally:
+        motor.fechar()
+    
+    total = len(socios) * repeticoes
+    print(f"  Tempo por consulta:        {decorrido / total * 1000:8.3f} ms")
+    print(f"  Pico alocado por consulta: {sum(picos) / len(picos) / 1024:8.1f} KB (máximo {max(picos) / 1024:.1f} KB)")
+
+def benchmark_pontuacao(db_path, quantidade=2000, tamanho=100, limiar=0.7, semente=42):
+    """
+    Escolha do candidato em buckets de `tamanho` nomes reais da base: a pessoa
+    procurada aparece de 1 a 4 vezes (uma por empresa) entre nomes sorteados,
+    e o nome buscado é o dela com ruído (idêntico, letra trocada, ordem
+    invertida, nome do meio abreviado) ou o de outra pessoa. Compara o ratio()
+    em todos os candidatos com a cascata podada pelos limites superiores.
+    """
+    import sqlite3
+    from consulta_cnpj_corrigida import normalizar_nome, similaridade, escolher_candidato, ESTATISTICAS_CASCATA
+    
+    conn = sqlite3.connect(db_path)
+    try:
+        maximo = conn.execute("SELECT MAX(rowid) FROM socios").fetchone()[0]
+        gerador = random.Random(semente)
+        rowids = [gerador.randint(1, maximo) for _ in range(min(50000, maximo))]
+        nomes = [normalizar_nome(nome) for (nome,) in conn.execute(
+            f"SELECT nome_socio FROM socios WHERE rowid IN ({','.join('?' * len(rowids))})", rowids)]
+    finally:
+        conn.close()
+    nomes = [nome for nome in nomes if nome]
+    
+    def ruido(nome):
+        partes = nome.split()
+        sorteio = gerador.random()
+        if sorteio < 0.3:
+            return nome
+        if sorteio < 0.6:
+            i = gerador.randrange(len(nome))
+            return nome[:i] + gerador.choice('AEIOUSZ') + nome[i + 1:]
+        if sorteio < 0.7:
+            return ' '.join(partes[-1:] + partes[:-1])
+        if sorteio < 0.85 and len(partes) > 2:
+            return ' '.join(partes[:1] + [partes[1][0]] + partes[2:])
+        return gerador.choice(nomes)
+    
+    buckets = []
+    for _ in range(quantidade):
+        pessoa = gerador.choice(nomes)
+        candidatos = [pessoa] * gerador.randint(1, 4)
+        candidatos += [gerador.choice(nomes) for _ in range(tamanho - len(candidatos))]
+        gerador.shuffle(candidatos)
+        buckets.append((ruido(pessoa), candidatos))
+    
+    print(f"Banco: {db_path} ({len(nomes):,} nomes sorteados)")
+    print(f"{quantidade:,} buckets de {tamanho} candidatos, limiar {limiar}\n")
+    
+    def todos():
+        escolhas = []
+        for alvo, candidatos in buckets:
+            scores = [similaridade(alvo, nome) for nome in candidatos]
+            melhor = max(range(len(scores)), key=scores.__getitem__)
+            escolhas.append((melhor, scores[melhor]))
+        return escolhas, len(buckets) * tamanho
+    
+    def cascata(limiar_cascata):
+        def executar():
+            ESTATISTICAS_CASCATA.clear()
+            escolhas = [escolher_candidato(alvo, candidatos, limiar_cascata)[:2] for alvo, candidatos in buckets]
+            return escolhas, ESTATISTICAS_CASCATA['calculados']
+        return executar
+    
+    referencia = None
+    print(f"  {'Estratégia':<36} {'µs/bucket':>10} {'ratio()/bucket':>15}  Idêntico")
+    for descricao, funcao in [("ratio() em todos", todos),
+                              ("Cascata (limites vs melhor)", cascata(None)),
+                              (f"Cascata (limites vs melhor e {limiar})", cascata(limiar))]:
+        inicio = time.perf_counter()
+        escolhas, calculados = funcao()
+        decorrido = time.perf_counter() - inicio
+        referencia = referencia or escolhas
+        print(f"  {descricao:<36} {decorrido / quantidade * 1e6:10.0f} {calculados / quantidade:15.1f}  "
+              f"{'SIM' if escolhas == referencia else 'NÃO'}")
+
+def _pss_mb():
+    """Memória proporcional (PSS) do processo atual: páginas compartilhadas divididas entre quem as usa"""
+    with open('/proc/self/smaps_rollup', 'r') as f:
+        for linha in f:
+            if linha.startswith('Pss:'):
+                return int(linha.split()[1]) / 1024
+    return 0.0
+
+def _worker_memoria(diretorio, mmap, barreira, fila):
+    from indice_memoria import IndiceMemoria, ARRAYS
+    antes = _pss_mb()
+    indice = IndiceMemoria.abrir(diretorio, mmap)
+    # Toca todas as páginas, como um worker aquecido depois de muitas consultas
+    for nome in ARRAYS:
+        int(np.asarray(getattr(indice, nome)).view(np.uint8).sum())
+    barreira.wait()
+    fila.put(_pss_mb() - antes)
+    barreira.wait()
+
+def benchmark_workers(db_path, maximo=32):
+    """
+    Memória ocupada pelo índice de sócios (soma do PSS de N processos, descontado
+    o interpretador) com os arrays mapeados do disco (mmap) e copiados para cada processo.
+    Só funciona no Linux (/proc/<pid>/smaps_rollup).
+    """
+    import multiprocessing
+    from indice_memoria import IndiceMemoria, diretorio_indice
+    
+    IndiceMemoria.carregar(db_path)
+    diretorio = diretorio_indice(db_path)
+    tamanho = sum(os.path.getsize(os.path.join(diretorio, f)) for f in os.listdir(diretorio))
+    print(f"Índice: {diretorio} ({tamanho/1024/1024:.1f} MB em disco)\n")
+    print(f"  {'workers':>7}  {'mmap (MB)':>10}  {'cópia (MB)':>10}")
+    
+    contexto = multiprocessing.get_context('spawn')
+    n = 1
+    while n <= maximo:
+        totais = []
+        for mmap in (True, False):
+            barreira = contexto.Barrier(n + 1)
+            fila = contexto.Queue()
+            processos = [contexto.Process(target=_worker_memoria, args=(diretorio, mmap, barreira, fila))
+                         for _ in range(n)]
+            for processo in processos:
+                processo.start()
+            barreira.wait()
+            totais.append(sum(fila.get() for _ in range(n)))
+            barreira.wait()
+            for processo in processos:
+                processo.join()
+        print(f"  {n:>7}  {totais[0]:>10.1f}  {totais[1]:>10.1f}")
+        n *= 2
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks da base CNPJ")
+    subparsers = parser.add_subparsers(dest='comando', help='Benchmarks disponíveis')
+    
+    parser_parser = subparsers.add_parser('parser', help='Parser da Receita vs pd.read_csv')
+    parser_parser.add_argument('arquivo', type=str, help='Arquivo ZIP da Receita')
+    parser_parser.add_argument('--tipo', type=str, choices=sorted(parser_receita.LAYOUTS),
+                               help='Tipo do arquivo (padrão: pelo nome)')
+    
+    parser_memoria = subparsers.add_parser('memoria', help='Índice NumPy em memória vs uma consulta SQL por miolo')
+    parser_memoria.add_argument('--banco', type=str, default='cnpj_completo.db', help='Caminho para o banco de dados')
+    parser_memoria.add_argument('--quantidade', type=int, default=100000, help='Número de miolos no lote')
+    
+    parser_consulta = subparsers.add_parser('consulta', help='Tempo e memória alocada por consulta de sócio')
+    parser_consulta.add_argument('arquivo', type=str, help='CSV com as colunas nome,cpf')
+    parser_consulta.add_argument('--banco', type=str, default='cnpj_completo.db', help='Caminho para o banco de dados')
+    parser_consulta.add_argument('--engine', type=str, choices=['sqlite', 'duckdb', 'memoria'], default='sqlite',
+                                 help='Backend de consulta')
+    
+    parser_pontuacao = subparsers.add_parser('pontuacao', help='Escolha do candidato com e sem poda por limites superiores')
+    parser_pontuacao.add_argument('--banco', type=str, default='cnpj_completo.db', help='Caminho para o banco de dados')
+    parser_pontuacao.add_argument('--quantidade', type=int, default=2000, help='Número de buckets')
+    parser_pontuacao.add_argument('--tamanho', type=int, default=100, help='Candidatos por bucket')
+    parser_pontuacao.add_argument('--limiar', type=float, default=0.7, help='Limiar de similaridade')
+    
+    parser_workers = subparsers.add_parser('workers', help='Memória total de N processos com o índice de sócios aberto')
+    parser_workers.add_argument('--banco', type=str, default='cnpj_completo.db', help='Caminho para o banco de dados')
+    parser_workers.add_argument('--maximo', type=int, default=32, help='Maior número de processos (dobra a partir de 1)')
+    
+    args = parser.parse_args()
+    
+    if args.comando == 'parser':
+        benchmark_parser(args.arquivo, args.tipo)
+    elif args.comando == 'memoria':
+        benchmark_memoria(args.banco, args.quantidade)
+    elif args.comando == 'consulta':
+        benchmark_consulta(args.banco, args.arquivo, args.engine)
+    elif args.comando == 'pontuacao':
+        benchmark_pontuacao(args.banco, args.quantidade, args.tamanho, args.limiar)
+    elif args.comando == 'workers':
+        benchmark_workers(args.banco, args.maximo)
+    else:
+        parser.print_help()
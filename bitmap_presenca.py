@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+# bitmap_presenca.py - Bitmaps de presença de miolos de CPF e CNPJs básicos
+import os
+import json
+import time
+import shutil
+import argparse
+
+import numpy as np
+
+from motor_consulta import MotorSQLite, IDENTIFICADOR_PF, filtro_identificador
+
+VERSAO_BITMAP = 1
+
+# Um bit por valor possível: miolos de 6 dígitos e CNPJs básicos de 8
+TOTAL_MIOLOS = 10 ** 6
+TOTAL_CNPJS = 10 ** 8
+
+ARRAYS = ['miolos', 'cnpjs']
+
+TAMANHO_LOTE = 200000
+
+def diretorio_bitmap(db_path):
+    """Diretório dos bitmaps, ao lado do banco (ex.: cnpj_completo.db.presenca/)"""
+    return db_path + '.presenca'
+
+def _valor(texto, digitos):
+    """Posição do bit de um miolo/CNPJ básico, ou None se não for um código de `digitos` dígitos"""
+    if isinstance(texto, str) and len(texto) == digitos and texto.isdigit():
+        return int(texto)
+    return None
+
+class BitmapPresenca:
+    """
+    Quais miolos de CPF têm sócio pessoa física e quais CNPJs básicos têm
+    estabelecimento, um bit por valor possível (125 KB e 12,5 MB):
+        
+        miolos  uint8  bit i ligado se o miolo i (000000..999999) tem sócio PF
+        cnpjs   uint8  bit i ligado se o CNPJ básico i tem estabelecimento
+    
+    Os motores de consulta olham o bit antes de ir ao banco: um miolo ou CNPJ
+    ausente é respondido sem SQL. Valores fora do formato (ex.: miolo '') não
+    têm bit e seguem para a consulta normal. Como o índice de sócios, os
+    bitmaps são gravados ao lado do banco e abertos com mmap.
+    """
+    
+    def __init__(self, arrays):
+        for nome in ARRAYS:
+            setattr(self, nome, arrays[nome])
+    
+    @staticmethod
+    def _marcar(presentes, cursor, digitos):
+        """Liga os valores lidos do cursor em lotes (sem a lista inteira na memória)"""
+        while True:
+            lote = [valor for (valor,) in cursor.fetchmany(TAMANHO_LOTE)]
+            if not lote:
+                break
+            valores = [v for v in (_valor(texto, digitos) for texto in lote) if v is not None]
+            presentes[np.array(valores, dtype=np.int64)] = True
+    
+    @classmethod
+    def construir(cls, db_path):
+        """
+        Lê os miolos de pessoas físicas e os CNPJs básicos dos estabelecimentos (pelos
+        índices da carga). Uma base pequena ou sem sócios tem um bitmap de miolos
+        pequeno ou vazio; só uma coluna cpf_miolo ausente ou ainda não calculada
+        (NULL, antes da correção) impede o bitmap, que negaria miolos existentes.
+        """
+        miolos = np.zeros(TOTAL_MIOLOS, dtype=bool)
+        cnpjs = np.zeros(TOTAL_CNPJS, dtype=bool)
+        motor = MotorSQLite(db_path)
+        try:
+            if not motor.colunas('socios')['cpf_miolo'] or (
+                    not motor.miolo_corrigido()
+                    and motor._executar("SELECT 1 FROM socios WHERE cpf_miolo IS NULL LIMIT 1")):
+                raise ValueError(f"{db_path} não tem a coluna cpf_miolo preenchida (carregar_base.py)")
+            filtro = (f"WHERE {filtro_identificador(IDENTIFICADOR_PF)}"
+                      if motor.colunas('socios')['identificador_socio'] else '')
+            cursor = motor.conn.cursor()
+            cursor.execute(f"SELECT DISTINCT cpf_miolo FROM socios {filtro}")
+            cls._marcar(miolos, cursor, 6)
+            cursor.execute("SELECT DISTINCT cnpj_basico FROM estabelecimentos")
+            cls._marcar(cnpjs, cursor, 8)
+        finally:
+            motor.fechar()
+        # Bit i no bit (i % 8) do byte i // 8
+        return cls({'miolos': np.packbits(miolos, bitorder='little'),
+                    'cnpjs': np.packbits(cnpjs, bitorder='little')})
+    
+    def salvar(self, diretorio, db_path=None):
+        """Grava um .npy por bitmap e presenca.json, trocando o diretório inteiro no fim"""
+        temporario = diretorio + '.tmp'
+        if os.path.isdir(temporario):
+            shutil.rmtree(temporario)
+        os.makedirs(temporario)
+        for nome in ARRAYS:
+            np.save(os.path.join(temporario, f"{nome}.npy"), getattr(self, nome))
+        metadados = {'versao': VERSAO_BITMAP, 'miolos': self.total('miolos'), 'cnpjs': self.total('cnpjs')}
+        if db_path:
+            metadados['banco'] = os.path.abspath(db_path)
+            metadados['banco_mtime'] = os.path.getmtime(db_path)
+        with open(os.path.join(temporario, 'presenca.json'), 'w', encoding='utf-8') as f:
+            json.dump(metadados, f, indent=2)
+        
+        if os.path.isdir(diretorio):
+            shutil.rmtree(diretorio)
+        os.rename(temporario, diretorio)
+    
+    @classmethod
+    def abrir(cls, diretorio, mmap=True):
+        modo = 'r' if mmap else None
+        return cls({nome: np.load(os.path.join(diretorio, f"{nome}.npy"), mmap_mode=modo) for nome in ARRAYS})
+    
+    @staticmethod
+    def atualizado(diretorio, db_path):
+        """Se os bitmaps gravados existem e foram gerados a partir da versão atual do banco"""
+        caminho = os.path.join(diretorio, 'presenca.json')
+        if not os.path.exists(caminho):
+            return False
+        with open(caminho, 'r', encoding='utf-8') as f:
+            metadados = json.load(f)
+        return (metadados.get('versao') == VERSAO_BITMAP
+                and metadados.get('banco_mtime') == os.path.getmtime(db_path))
+    
+    @classmethod
+    def atualizar(cls, db_path):
+        """Constrói e grava os bitmaps do banco se não existirem ou estiverem desatualizados (sem abri-los)"""
+        diretorio = diretorio_bitmap(db_path)
+        if not cls.atualizado(diretorio, db_path):
+            print(f"Construindo bitmaps de presença de {db_path}...")
+            inicio = time.time()
+            bitmap = cls.construir(db_path)
+            bitmap.salvar(diretorio, db_path)
+            print(f"Bitmaps construídos em {time.time() - inicio:.1f}s "
+                  f"({bitmap.total('miolos'):,} miolos, {bitmap.total('cnpjs'):,} CNPJs básicos)")
+    
+    @classmethod
+    def carregar(cls, db_path, mmap=True):
+        """Abre os bitmaps do banco, construindo e gravando se não existirem ou estiverem desatualizados"""
+        cls.atualizar(db_path)
+        return cls.abrir(diretorio_bitmap(db_path), mmap)
+    
+    @classmethod
+    def abrir_se_atualizado(cls, db_path):
+        """Bitmaps do banco, se existirem e estiverem atualizados (None caso contrário: as consultas vão ao banco)"""
+        diretorio = diretorio_bitmap(db_path)
+        return cls.abrir(diretorio) if cls.atualizado(diretorio, db_path) else None
+    
+    def total(self, nome):
+        """Número de bits ligados"""
+        return int(np.unpackbits(np.asarray(getattr(self, nome))).sum())
+    
+    @staticmethod
+    def _ligado(bits, posicao):
+        return bool(bits[posicao >> 3] >> (posicao & 7) & 1)
+    
+    def tem_miolo(self, miolo):
+        """False só se o miolo com certeza não tem sócio pessoa física"""
+        posicao = _valor(miolo, 6)
+        return posicao is None or self._ligado(self.miolos, posicao)
+    
+    def tem_cnpj(self, cnpj_basico):
+        """False só se o CNPJ básico com certeza não tem estabelecimento"""
+        posicao = _valor(cnpj_basico, 8)
+        return posicao is None or self._ligado(self.cnpjs, posicao)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Constrói os bitmaps de presença de miolos e CNPJs básicos")
+    parser.add_argument("--banco", type=str, default="cnpj_completo.db", help="Caminho para o banco de dados")
+    parser.add_argument("--forcar", action="store_true", help="Reconstruir mesmo se os bitmaps estiverem atualizados")
+    
+    args = parser.parse_args()
+    
+    diretorio = diretorio_bitmap(args.banco)
+    if args.forcar or not BitmapPresenca.atualizado(diretorio, args.banco):
+        inicio = time.time()
+        bitmap = BitmapPresenca.construir(args.banco)
+        bitmap.salvar(diretorio, args.banco)
+        print(f"Bitmaps construídos em {time.time() - inicio:.1f}s: {bitmap.total('miolos'):,} miolos, "
+              f"{bitmap.total('cnpjs'):,} CNPJs básicos -> {diretorio}")
+    else:
+        print(f"Bitmaps já atualizados: {diretorio}")
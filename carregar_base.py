@@ -0,0 +1,625 @@
+#!/usr/bin/env python3
+# carregar_base.py - Carga dos arquivos da Receita Federal no banco SQLite
+import os
+import sys
+import glob
+import time
+import queue
+import shutil
+import sqlite3
+import argparse
+import threading
+from array import array
+from datetime import datetime
+
+import numpy as np
+
+import bitmap_presenca
+import download_base_completa
+import grafo_societario
+import parser_receita
+from parser_receita import LAYOUTS, identificar_tipo
+from motor_consulta import (MIOLOS_SENTINELA, LIMITE_BALDE_QUENTE, IDENTIFICADOR_PF, IDENTIFICADOR_PJ, TABELA_NOMES,
+                            TABELA_NOMES_EMPRESAS, TABELA_FONETICA,
+                            filtro_sentinelas, filtro_identificador)
+from consulta_cnpj_corrigida import normalizar_nome, normalizar_nome_empresa, chave_fonetica, SITUACOES_CADASTRAIS
+
+# Colunas calculadas durante a carga (após as colunas do layout)
+COLUNAS_EXTRAS = {
+    'socios': [('cpf_miolo', parser_receita.CODIGO)],
+}
+
+def extrair_miolo(cnpj_cpf_socio):
+    """Miolo do CPF a partir do campo da Receita (***XXXXXX** ou documento completo)"""
+    if not cnpj_cpf_socio:
+        return ''
+    digitos = ''.join(c for c in cnpj_cpf_socio if c.isdigit())
+    if cnpj_cpf_socio.startswith('***'):
+        return digitos[:6]
+    if len(digitos) >= 11:
+        return digitos[3:9]
+    return ''
+
+def criar_tabelas(conn):
+    """Cria as tabelas da base (colunas com os nomes do layout da Receita)"""
+    cursor = conn.cursor()
+    
+    for tipo, layout in LAYOUTS.items():
+        layout = layout + COLUNAS_EXTRAS.get(tipo, [])
+        colunas = [nome for nome, _ in layout]
+        
+        cursor.execute(f"PRAGMA table_info({tipo})")
+        existentes = [col[1] for col in cursor.fetchall()]
+        if existentes and existentes[:len(colunas)] != colunas:
+            # Bancos antigos têm colunas derivadas do "cabeçalho" (ex.: [***331355**])
+            raise ValueError(f"Tabela {tipo} já existe com outro esquema; use um banco novo")
+        
+        definicao = ', '.join(f"{nome} {parser_receita.TIPOS_SQL[t]}" for nome, t in layout)
+        cursor.execute(f"CREATE TABLE IF NOT EXISTS {tipo} ({definicao})")
+    
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS arquivos_carregados (
+        arquivo TEXT PRIMARY KEY,
+        tipo TEXT,
+        linhas INTEGER,
+        carregado_em TEXT
+    )
+    """)
+    conn.commit()
+
+def _configurar_carga(conn):
+    """Configurações para carga em massa (o banco pode ser recriado em caso de falha)"""
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = OFF")
+    conn.execute("PRAGMA cache_size = -262144")  # 256 MB
+    conn.execute("PRAGMA temp_store = MEMORY")
+
+def _lote_socios(lote):
+    """
+    Acrescenta o miolo do CPF a cada linha de sócio. Só pessoas físicas têm
+    miolo: os dígitos do CNPJ de um sócio pessoa jurídica iam parar nos
+    mesmos baldes dos CPFs
+    """
+    return [linha + (extrair_miolo(linha[3]) if linha[1] == IDENTIFICADOR_PF else '',) for linha in lote]
+
+def carregar_arquivo(conn, caminho_zip):
+    """
+    Carrega um zip da Receita na tabela correspondente.
+    Retorna o número de linhas inseridas (0 se o arquivo já tinha sido carregado).
+    O controle é pelo nome do zip, que a Receita repete todo mês: um banco
+    guarda um mês só (a atualização mensal carrega o mês novo num banco à parte).
+    """
+    nome = os.path.basename(caminho_zip)
+    tipo = identificar_tipo(nome)
+    if not tipo:
+        print(f"Tipo não reconhecido, ignorando: {nome}")
+        return 0
+    
+    cursor = conn.cursor()
+    cursor.execute("SELECT linhas FROM arquivos_carregados WHERE arquivo = ?", (nome,))
+    if cursor.fetchone():
+        print(f"Arquivo já carregado: {nome}")
+        return 0
+    
+    colunas = [nome for nome, _ in LAYOUTS[tipo] + COLUNAS_EXTRAS.get(tipo, [])]
+    sql = f"INSERT INTO {tipo} ({', '.join(colunas)}) VALUES ({', '.join('?' * len(colunas))})"
+    
+    inicio = time.time()
+    total = 0
+    
+    # O arquivo inteiro é uma transação: se a leitura falhar no meio, nenhuma
+    # linha dele fica na tabela e a próxima tentativa não duplica nada
+    try:
+        # Cada lote corresponde a um bloco lido do zip (parser_receita.TAMANHO_BUFFER)
+        for lote in parser_receita.ler_lotes(caminho_zip, tipo):
+            if tipo == 'socios':
+                lote = _lote_socios(lote)
+            cursor.executemany(sql, lote)
+            total += len(lote)
+        
+        cursor.execute(
+            "INSERT INTO arquivos_carregados (arquivo, tipo, linhas, carregado_em) VALUES (?, ?, ?, ?)",
+            (nome, tipo, total, datetime.now().isoformat())
+        )
+        conn.commit()
+    except BaseException:
+        conn.rollback()
+        raise
+    
+    decorrido = time.time() - inicio
+    print(f"Carregado {nome}: {total:,} linhas em {tipo} ({decorrido:.1f}s, {total/max(decorrido, 1e-6):,.0f} linhas/s)")
+    return total
+
+def finalizar_base(conn):
+    """Cria os índices depois da carga (muito mais rápido do que manter durante os INSERTs)"""
+    print("Criando índices...")
+    inicio = time.time()
+    cursor = conn.cursor()
+    
+    pf = filtro_identificador(IDENTIFICADOR_PF)
+    indices = [
+        # Índice de cobertura da busca por miolo: traz as colunas lidas por
+        # motor_consulta.socios_por_miolo e a consulta não toca as páginas da tabela.
+        # Parcial: só pessoas físicas, sem as linhas sentinela (sem CPF recuperável).
+        # Substitui o índice só de cpf_miolo dos scripts de correção
+        "CREATE INDEX IF NOT EXISTS idx_socios_pf_miolo "
+        "ON socios(cpf_miolo, cnpj_basico, nome_socio, cnpj_cpf_socio, identificador_socio) "
+        f"WHERE {pf} AND {filtro_sentinelas()}",
+        "DROP INDEX IF EXISTS idx_socios_cpf_miolo",
+        # Sócios pessoa jurídica pelo CNPJ completo: em que empresas um CNPJ é sócio
+        "CREATE INDEX IF NOT EXISTS idx_socios_pj_documento ON socios(cnpj_cpf_socio, cnpj_basico) "
+        f"WHERE {filtro_identificador(IDENTIFICADOR_PJ)}",
+        "CREATE INDEX IF NOT EXISTS idx_socios_cnpj_basico ON socios(cnpj_basico)",
+        "CREATE INDEX IF NOT EXISTS idx_estabelecimentos_cnpj_basico ON estabelecimentos(cnpj_basico)",
+        "CREATE INDEX IF NOT EXISTS idx_empresas_cnpj_basico ON empresas(cnpj_basico)",
+        "CREATE INDEX IF NOT EXISTS idx_simples_cnpj_basico ON simples(cnpj_basico)",
+    ]
+    for sql in indices:
+        cursor.execute(sql)
+    
+    estatisticas_baldes(conn)
+    grupos_economicos(conn)
+    resumo_empresas(conn)
+    indice_nomes_socios(conn)
+    indice_fonetico_socios(conn)
+    indice_nomes_empresas(conn)
+    cursor.execute("ANALYZE")
+    conn.commit()
+    print(f"Índices criados em {time.time() - inicio:.1f}s")
+
+def estatisticas_baldes(conn):
+    """
+    Tamanho dos baldes (sócios pessoa física por miolo), lido do índice por
+    miolo; as linhas sentinela, fora dele, são contadas à parte. Os miolos com
+    mais de LIMITE_BALDE_QUENTE sócios vão para a tabela miolos_quentes, que os
+    motores de consulta usam para decidir a busca pela chave fonética do nome.
+    """
+    cursor = conn.cursor()
+    cursor.execute("DROP TABLE IF EXISTS miolos_quentes")
+    cursor.execute("CREATE TABLE miolos_quentes (cpf_miolo TEXT PRIMARY KEY, socios INTEGER) WITHOUT ROWID")
+    
+    tamanhos = []
+    quentes = []
+    sentinelas = 0
+    pf = filtro_identificador(IDENTIFICADOR_PF)
+    sentinela = f"cpf_miolo IS NULL OR NOT ({filtro_sentinelas()})"
+    for miolo, socios in cursor.execute(
+            f"SELECT cpf_miolo, COUNT(*) FROM socios WHERE {pf} AND {filtro_sentinelas()} GROUP BY cpf_miolo "
+            f"UNION ALL SELECT cpf_miolo, COUNT(*) FROM socios WHERE {pf} AND ({sentinela}) GROUP BY cpf_miolo"
+            ).fetchall():
+        if miolo in MIOLOS_SENTINELA or miolo is None:
+            sentinelas += socios
+        else:
+            tamanhos.append(socios)
+        if socios > LIMITE_BALDE_QUENTE and miolo is not None:
+            quentes.append((miolo, socios))
+    cursor.executemany("INSERT INTO miolos_quentes (cpf_miolo, socios) VALUES (?, ?)", quentes)
+    
+    if tamanhos:
+        tamanhos.sort()
+        print(f"Baldes: {len(tamanhos):,} miolos, mediana {tamanhos[len(tamanhos) // 2]}, "
+              f"p99 {tamanhos[int(len(tamanhos) * 0.99)]}, maior {tamanhos[-1]:,}; "
+              f"{len(quentes)} quentes (> {LIMITE_BALDE_QUENTE}); {sentinelas:,} linhas sem miolo")
+    return quentes
+
+def grupos_economicos(conn):
+    """
+    Grupos de empresas ligadas por sócios em comum, gravados em grupos_economicos
+    (uma linha por empresa que faz parte de um grupo com mais de uma; grupo_id é
+    o menor cnpj_basico do grupo). Duas empresas se ligam quando têm o mesmo
+    sócio pessoa física (mesmo miolo de CPF e mesmo nome normalizado) ou o
+    mesmo sócio pessoa jurídica, que também entra no grupo. As ligações são
+    juntadas com union-find sobre a base inteira.
+    """
+    cursor = conn.cursor()
+    origens, destinos = array('I'), array('I')
+    
+    # Pessoas físicas, na ordem do índice por miolo: cada balde é agrupado pelo nome
+    # (os miolos sentinela ficam de fora: o nome sozinho não identifica a pessoa)
+    def ligar_balde(balde):
+        primeira = {}
+        for nome, cnpj in balde:
+            chave = normalizar_nome(nome)
+            if chave in primeira:
+                origens.append(primeira[chave])
+                destinos.append(cnpj)
+            else:
+                primeira[chave] = cnpj
+    
+    cursor.execute(
+        f"SELECT cpf_miolo, nome_socio, cnpj_basico FROM socios "
+        f"WHERE {filtro_identificador(IDENTIFICADOR_PF)} AND {filtro_sentinelas()} ORDER BY cpf_miolo")
+    miolo_atual, balde = None, {}
+    for miolo, nome, cnpj_basico in cursor:
+        if miolo != miolo_atual:
+            ligar_balde(balde)
+            miolo_atual, balde = miolo, {}
+        if cnpj_basico and cnpj_basico.isdigit():
+            # Uma empresa por nome exato basta; os nomes só são normalizados no fim do balde
+            balde.setdefault((nome, int(cnpj_basico)), None)
+    ligar_balde(balde)
+    
+    # Pessoas jurídicas: a empresa sócia (CNPJ básico do documento) e a participada
+    cursor.execute(
+        f"SELECT cnpj_cpf_socio, cnpj_basico FROM socios WHERE {filtro_identificador(IDENTIFICADOR_PJ)}")
+    for documento, cnpj_basico in cursor:
+        documento = ''.join(c for c in documento or '' if c.isdigit())
+        if len(documento) == 14 and cnpj_basico and cnpj_basico.isdigit():
+            origens.append(int(documento[:8]))
+            destinos.append(int(cnpj_basico))
+    
+    origens = np.frombuffer(origens, dtype=np.uint32)
+    destinos = np.frombuffer(destinos, dtype=np.uint32)
+    nos = np.union1d(origens, destinos)
+    
+    # Union-find (união pelo tamanho, compressão de caminho pela metade)
+    pai = list(range(len(nos)))
+    tamanho = [1] * len(nos)
+    
+    def raiz(i):
+        while pai[i] != i:
+            pai[i] = pai[pai[i]]
+            i = pai[i]
+        return i
+    
+    for a, b in zip(np.searchsorted(nos, origens).tolist(), np.searchsorted(nos, destinos).tolist()):
+        a, b = raiz(a), raiz(b)
+        if a != b:
+            if tamanho[a] < tamanho[b]:
+                a, b = b, a
+            pai[b] = a
+            tamanho[a] += tamanho[b]
+    
+    raizes = np.array([raiz(i) for i in range(len(nos))], dtype=np.int64)
+    empresas = np.bincount(raizes, minlength=len(nos))[raizes]
+    grupo_id = np.full(len(nos), np.iinfo(np.int64).max, dtype=np.int64)
+    np.minimum.at(grupo_id, raizes, nos.astype(np.int64))
+    grupo_id = grupo_id[raizes]
+    
+    cursor.execute("DROP TABLE IF EXISTS grupos_economicos")
+    cursor.execute("CREATE TABLE grupos_economicos (cnpj_basico TEXT PRIMARY KEY, grupo_id INTEGER, "
+                   "empresas INTEGER) WITHOUT ROWID")
+    em_grupo = empresas > 1
+    cursor.executemany(
+        "INSERT INTO grupos_economicos (cnpj_basico, grupo_id, empresas) VALUES (?, ?, ?)",
+        zip((f"{c:08d}" for c in nos[em_grupo].tolist()), grupo_id[em_grupo].tolist(), empresas[em_grupo].tolist())
+    )
+    cursor.execute("CREATE INDEX idx_grupos_economicos_grupo ON grupos_economicos(grupo_id)")
+    
+    if em_grupo.any():
+        print(f"Grupos econômicos: {len(np.unique(grupo_id[em_grupo])):,} grupos com "
+              f"{int(em_grupo.sum()):,} empresas; maior com {int(empresas.max()):,}")
+    return int(em_grupo.sum())
+
+def _sql_literal(valor):
+    return "'" + valor.replace("'", "''") + "'"
+
+def resumo_empresas(conn):
+    """
+    Tabela empresa_resumo: uma linha por empresa com estabelecimento, com a
+    razão social, os dados da matriz (menor cnpj_ordem, o primeiro estabelecimento
+    que a consulta de CNPJ mostra), a descrição da situação e as contagens de
+    estabelecimentos e sócios. A verificação de CNPJ lê só esta linha, pela chave.
+    """
+    cursor = conn.cursor()
+    cursor.execute("DROP TABLE IF EXISTS empresa_resumo")
+    cursor.execute("""
+    CREATE TABLE empresa_resumo (
+        cnpj_basico TEXT PRIMARY KEY, razao_social TEXT, situacao_cadastral TEXT, situacao_descricao TEXT,
+        logradouro TEXT, numero TEXT, bairro TEXT, uf TEXT, cnae_fiscal_principal TEXT, municipio TEXT,
+        estabelecimentos INTEGER, socios INTEGER
+    ) WITHOUT ROWID
+    """)
+    
+    # Mesma regra de consulta_cnpj_corrigida.mapear_situacao_cadastral
+    codigo = "trim(coalesce(m.situacao_cadastral, ''))"
+    descricao = (f"CASE {codigo} "
+                 + ' '.join(f"WHEN {_sql_literal(c)} THEN {_sql_literal(d)}" for c, d in SITUACOES_CADASTRAIS.items())
+                 + f" ELSE 'DESCONHECIDA (' || {codigo} || ')' END")
+    
+    # MIN(cnpj_ordem) com as outras colunas "soltas": o SQLite as tira da mesma linha do mínimo
+    cursor.execute(f"""
+    INSERT INTO empresa_resumo
+    SELECT m.cnpj_basico,
+           (SELECT razao_social FROM empresas e WHERE e.cnpj_basico = m.cnpj_basico
+            AND razao_social IS NOT NULL AND razao_social <> '' LIMIT 1),
+           m.situacao_cadastral, {descricao}, m.logradouro, m.numero, m.bairro, m.uf, m.cnae_fiscal_principal,
+           m.municipio, m.estabelecimentos,
+           (SELECT COUNT(*) FROM socios s WHERE s.cnpj_basico = m.cnpj_basico)
+    FROM (
+        SELECT cnpj_basico, MIN(cnpj_ordem), situacao_cadastral, logradouro, numero, bairro, uf,
+               cnae_fiscal_principal, municipio, COUNT(*) AS estabelecimentos
+        FROM estabelecimentos GROUP BY cnpj_basico
+    ) m
+    """)
+    print(f"Resumo de empresas: {cursor.rowcount:,} empresas")
+    return cursor.rowcount
+
+def indice_nomes_socios(conn):
+    """
+    Índice FTS5 dos nomes normalizados dos sócios, para a busca só por nome.
+    Sem conteúdo próprio (content=''): guarda só os termos, e o rowid de cada
+    entrada é o da linha em socios, lida depois pela chave. Refeito a cada carga
+    (tabelas contentless não aceitam DELETE).
+    """
+    cursor = conn.cursor()
+    conn.create_function('normalizar_nome', 1, normalizar_nome, deterministic=True)
+    cursor.execute(f"DROP TABLE IF EXISTS {TABELA_NOMES}")
+    cursor.execute(f"CREATE VIRTUAL TABLE {TABELA_NOMES} USING fts5(nome, content='')")
+    cursor.execute(f"INSERT INTO {TABELA_NOMES} (rowid, nome) SELECT rowid, normalizar_nome(nome_socio) FROM socios")
+    total = cursor.rowcount
+    cursor.execute(f"INSERT INTO {TABELA_NOMES} ({TABELA_NOMES}) VALUES ('optimize')")
+    print(f"Índice de nomes: {total:,} sócios")
+    return total
+
+def indice_fonetico_socios(conn):
+    """
+    Tabela socios_fonetica: a chave fonética do nome de cada sócio
+    (consulta_cnpj_corrigida.chave_fonetica) com o miolo e o rowid da linha em
+    socios, chave primária (chave, miolo, socio) e sem rowid. Serve de bloqueio
+    para a busca só por nome (pela chave) e para os baldes quentes (chave e miolo):
+    só quem soa igual vai para a comparação de nomes.
+    """
+    cursor = conn.cursor()
+    conn.create_function('chave_fonetica', 1, lambda nome: chave_fonetica(normalizar_nome(nome)), deterministic=True)
+    cursor.execute(f"DROP TABLE IF EXISTS {TABELA_FONETICA}")
+    cursor.execute(f"""
+    CREATE TABLE {TABELA_FONETICA} (
+        chave TEXT, miolo TEXT, socio INTEGER, PRIMARY KEY (chave, miolo, socio)
+    ) WITHOUT ROWID
+    """)
+    cursor.execute(f"""
+    INSERT INTO {TABELA_FONETICA}
+    SELECT chave, cpf_miolo, rowid FROM (SELECT chave_fonetica(nome_socio) AS chave, cpf_miolo, rowid FROM socios)
+    WHERE chave <> ''
+    ORDER BY 1, 2, 3
+    """)
+    total = cursor.rowcount
+    chaves = cursor.execute(f"SELECT COUNT(DISTINCT chave) FROM {TABELA_FONETICA}").fetchone()[0]
+    print(f"Chaves fonéticas: {total:,} sócios em {chaves:,} chaves")
+    return total
+
+def indice_nomes_empresas(conn):
+    """
+    Tabela nomes_empresas: razão social e nomes fantasia normalizados de cada
+    empresa, com chave primária (nome, cnpj_basico) e sem rowid, então a tabela
+    é o próprio índice ordenado por nome. O autocompletar lê só a faixa do prefixo
+    (motor_consulta.empresas_por_prefixo). Nomes repetidos entre filiais entram uma vez.
+    """
+    cursor = conn.cursor()
+    conn.create_function('normalizar_nome_empresa', 1, normalizar_nome_empresa, deterministic=True)
+    cursor.execute(f"DROP TABLE IF EXISTS {TABELA_NOMES_EMPRESAS}")
+    cursor.execute(f"""
+    CREATE TABLE {TABELA_NOMES_EMPRESAS} (
+        nome TEXT, cnpj_basico TEXT, PRIMARY KEY (nome, cnpj_basico)
+    ) WITHOUT ROWID
+    """)
+    cursor.execute(f"""
+    INSERT OR IGNORE INTO {TABELA_NOMES_EMPRESAS}
+    SELECT nome, cnpj_basico FROM (
+        SELECT normalizar_nome_empresa(razao_social) AS nome, cnpj_basico FROM empresas
+        UNION ALL
+        SELECT normalizar_nome_empresa(nome_fantasia), cnpj_basico FROM estabelecimentos
+    ) WHERE nome <> ''
+    ORDER BY nome, cnpj_basico
+    """)
+    print(f"Nomes de empresas: {cursor.rowcount:,} nomes")
+    return cursor.rowcount
+
+def estruturas_auxiliares(db_path):
+    """
+    Grafo de participações entre empresas e bitmaps de presença, gravados ao lado
+    do banco depois de finalizar_base. Chamada com a conexão da carga já fechada:
+    o fechamento grava o WAL no banco e muda o mtime que os dois guardam.
+    """
+    grafo_societario.GrafoSocietario.atualizar(db_path)
+    try:
+        bitmap_presenca.BitmapPresenca.atualizar(db_path)
+    except ValueError as e:
+        # A carga já terminou: sem os bitmaps, as consultas só vão sempre ao banco
+        print(f"Bitmaps de presença não construídos: {e}")
+
+def carregar_diretorio(diretorio, db_path):
+    """Carrega todos os zips de um diretório já baixado"""
+    conn = sqlite3.connect(db_path)
+    try:
+        _configurar_carga(conn)
+        criar_tabelas(conn)
+        
+        arquivos = sorted(
+            os.path.join(diretorio, nome) for nome in os.listdir(diretorio)
+            if nome.lower().endswith('.zip') and identificar_tipo(nome)
+        )
+        print(f"Encontrados {len(arquivos)} arquivos ZIP em {diretorio}")
+        
+        for caminho in arquivos:
+            carregar_arquivo(conn, caminho)
+        
+        finalizar_base(conn)
+    finally:
+        conn.close()
+    estruturas_auxiliares(db_path)
+
+def _consumidor_carga(db_path, fila, resultado):
+    """Thread de carga: consome os arquivos à medida que os downloads terminam"""
+    conn = sqlite3.connect(db_path)
+    try:
+        _configurar_carga(conn)
+        criar_tabelas(conn)
+        
+        while True:
+            caminho = fila.get()
+            if caminho is None:
+                break
+            inicio = time.time()
+            try:
+                resultado['linhas'] += carregar_arquivo(conn, caminho)
+            except Exception as e:
+                print(f"Erro ao carregar {caminho}: {e}")
+                resultado['falhas'].append(caminho)
+            resultado['tempo_carga'] += time.time() - inicio
+        
+        finalizar_base(conn)
+    except Exception as e:
+        print(f"Erro na carga: {e}")
+        resultado['falhas'].append(str(e))
+        return
+    finally:
+        conn.close()
+    
+    # Com a conexão fechada (o mtime do banco já é o final), como em carregar_diretorio
+    try:
+        estruturas_auxiliares(db_path)
+    except Exception as e:
+        print(f"Erro nas estruturas auxiliares: {e}")
+        resultado['falhas'].append(str(e))
+
+def banco_do_mes(db_path, url_mes):
+    """Banco em que o mês é carregado antes de substituir db_path (ex.: cnpj_completo.db.2025-05.carga)"""
+    return f"{db_path}.{url_mes.rstrip('/').rsplit('/', 1)[-1]}.carga"
+
+# Arquivos ao lado do banco que acompanham a troca (construídos por estruturas_auxiliares)
+DIRETORIOS_AUXILIARES = [grafo_societario.diretorio_grafo, bitmap_presenca.diretorio_bitmap]
+
+def _substituir_banco(novo, db_path):
+    """
+    Troca db_path pelo banco novo (os.replace: quem já tem o antigo aberto continua
+    lendo o antigo) e leva junto o grafo e os bitmaps dele. O WAL e o -shm do
+    antigo são apagados antes: aplicados ao banco novo, o corromperiam.
+    """
+    for sufixo in ('-wal', '-shm'):
+        if os.path.exists(db_path + sufixo):
+            os.remove(db_path + sufixo)
+    os.replace(novo, db_path)
+    for diretorio in DIRETORIOS_AUXILIARES:
+        if os.path.isdir(diretorio(novo)):
+            if os.path.isdir(diretorio(db_path)):
+                shutil.rmtree(diretorio(db_path))
+            os.rename(diretorio(novo), diretorio(db_path))
+
+def _mes_do_banco(db_path):
+    """URL do mês gravado no banco pela atualização mensal (None se não houver)"""
+    if not os.path.exists(db_path):
+        return None
+    conn = sqlite3.connect(db_path)
+    try:
+        linha = conn.execute("SELECT url_mes FROM base_mes").fetchone()
+    except sqlite3.OperationalError:
+        linha = None
+    finally:
+        conn.close()
+    return linha[0] if linha else None
+
+def _registrar_mes(db_path, url_mes):
+    conn = sqlite3.connect(db_path)
+    try:
+        conn.execute("CREATE TABLE IF NOT EXISTS base_mes (url_mes TEXT)")
+        conn.execute("DELETE FROM base_mes")
+        conn.execute("INSERT INTO base_mes (url_mes) VALUES (?)", (url_mes,))
+        conn.commit()
+    finally:
+        conn.close()
+
+def _remover_cargas_antigas(db_path, atual):
+    """Apaga os bancos (e seus arquivos auxiliares) de cargas interrompidas de outros meses"""
+    for caminho in glob.glob(glob.escape(db_path) + '.*.carga*'):
+        if caminho.startswith(atual):
+            continue
+        print(f"Removendo carga de outro mês: {caminho}")
+        if os.path.isdir(caminho):
+            shutil.rmtree(caminho)
+        else:
+            os.remove(caminho)
+
+def atualizar_base_mensal(output_dir, db_path, url_base=download_base_completa.URL_BASE, socios_only=False,
+                          num_workers=3, num_partes=8, caminho_checkpoint=download_base_completa.CAMINHO_CHECKPOINT):
+    """
+    Baixa e carrega a base do mês em pipeline: cada zip é entregue à carga
+    assim que seu download termina e é verificado, de modo que a carga de
+    Socios0.zip acontece enquanto Estabelecimentos9.zip ainda está baixando.
+    O tempo total tende a max(download, carga) em vez da soma.
+    
+    O mês é carregado num banco à parte (banco_do_mes), e não no db_path: os
+    zips têm os mesmos nomes todo mês, e acrescentar o mês novo às tabelas do
+    anterior misturaria os dois. Só com todos os arquivos baixados e carregados
+    o banco do mês substitui db_path; uma execução interrompida retoma a carga
+    no mesmo banco do mês, sem repetir os arquivos já carregados. Com
+    socios_only, a base nova tem só os sócios.
+    """
+    url_mes = download_base_completa.descobrir_mes_atual(url_base)
+    if _mes_do_banco(db_path) == url_mes:
+        print(f"{db_path} já tem a base de {url_mes}")
+        return {'linhas': 0, 'falhas': [], 'tempo_carga': 0.0}
+    novo = banco_do_mes(db_path, url_mes)
+    _remover_cargas_antigas(db_path, novo)
+    _registrar_mes(novo, url_mes)
+    
+    fila = queue.Queue()
+    resultado = {'linhas': 0, 'falhas': [], 'tempo_carga': 0.0}
+    
+    consumidor = threading.Thread(target=_consumidor_carga, args=(novo, fila, resultado), daemon=True)
+    consumidor.start()
+    
+    inicio = time.time()
+    try:
+        checkpoint = download_base_completa.baixar_base_completa(
+            output_dir, num_workers, socios_only, num_partes, url_base,
+            caminho_checkpoint=caminho_checkpoint, ao_concluir=fila.put, url_mes=url_mes
+        )
+    finally:
+        tempo_download = time.time() - inicio
+        fila.put(None)
+        consumidor.join()
+    
+    tempo_total = time.time() - inicio
+    print(f"\nAtualização concluída em {tempo_total/60:.1f} min "
+          f"(download {tempo_download/60:.1f} min, carga {resultado['tempo_carga']/60:.1f} min)")
+    print(f"{resultado['linhas']:,} linhas carregadas, {len(resultado['falhas'])} falha(s) de carga")
+    
+    if resultado['falhas'] or checkpoint['failed']:
+        print(f"Mês incompleto: {db_path} não foi substituído ({novo} fica para a próxima execução)")
+    else:
+        _substituir_banco(novo, db_path)
+        print(f"{db_path} atualizado com {url_mes}")
+    return resultado
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Carga da base da Receita Federal no SQLite")
+    parser.add_argument("--banco", type=str, default="cnpj_completo.db", help="Caminho para o banco de dados")
+    parser.add_argument("--dir", type=str, default="base_completa", help="Diretório com os arquivos ZIP")
+    parser.add_argument("--baixar", action="store_true",
+                        help="Baixar o mês atual e carregar cada arquivo assim que o download terminar, num "
+                             "banco à parte que substitui --banco quando o mês estiver completo")
+    parser.add_argument("--url-base", type=str, default=download_base_completa.URL_BASE,
+                        help="URL raiz dos dados abertos do CNPJ")
+    parser.add_argument("--workers", type=int, default=3, help="Número inicial de downloads simultâneos")
+    parser.add_argument("--partes", type=int, default=8, help="Número de faixas baixadas em paralelo por arquivo")
+    parser.add_argument("--checkpoint", type=str, default=download_base_completa.CAMINHO_CHECKPOINT,
+                        help="Arquivo de checkpoint do download")
+    parser.add_argument("--socios-only", action="store_true", help="Apenas os arquivos de sócios")
+    parser.add_argument("--apenas-indices", action="store_true",
+                        help="Não carregar nada: só criar/atualizar os índices de um banco já carregado")
+    parser.add_argument("--exportar-parquet", type=str, metavar="DIR",
+                        help="Depois da carga, exportar a base para Parquet particionado neste diretório")
+    
+    args = parser.parse_args()
+    
+    if args.apenas_indices:
+        conn = sqlite3.connect(args.banco)
+        try:
+            finalizar_base(conn)
+        finally:
+            conn.close()
+        estruturas_auxiliares(args.banco)
+    elif args.baixar:
+        atualizar_base_mensal(args.dir, args.banco, args.url_base, args.socios_only,
+                              args.workers, args.partes, args.checkpoint)
+    else:
+        if not os.path.isdir(args.dir):
+            print(f"Erro: Diretório {args.dir} não encontrado")
+            sys.exit(1)
+        carregar_diretorio(args.dir, args.banco)
+    
+    if args.exportar_parquet:
+        import exportar_parquet
+        exportar_parquet.exportar_base(args.banco, args.exportar_parquet)
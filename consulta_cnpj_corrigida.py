@@ -1,15 +1,37 @@
 #!/usr/bin/env python3
 # consulta_cnpj_corrigida.py - Versão com correções para os problemas identificados
-import sqlite3
 import argparse
 import pandas as pd
 import os
 import re
 import json
+import multiprocessing
+from functools import lru_cache
+from collections import namedtuple, Counter
 from difflib import SequenceMatcher
 
-def normalizar_nome(nome):
-    """Normaliza o nome para comparação"""
+from motor_consulta import (MotorConsulta, MotorSQLite, Participacao, LIMIAR_JUNCAO, LIMITE_SUGESTOES,
+                            RAZAO_SORT_MERGE, MIOLOS_SENTINELA, criar_motor)
+
+# Empresa (um estabelecimento) no resultado das consultas. Os resultados guardam
+# namedtuples e só viram dicts na gravação, com resultado_para_json
+Empresa = namedtuple('Empresa', (
+    'cnpj_basico', 'nome_empresa', 'situacao_cadastral', 'situacao_descricao',
+    'endereco', 'bairro', 'uf', 'cnae_principal', 'cnae_descricao', 'municipio'
+))
+
+def resultado_para_json(resultado):
+    """Resultado de consulta_socio_direta/verificar_cnpj_direto no formato dos arquivos JSON e CSV"""
+    convertido = dict(resultado)
+    for chave in ('empresas', 'socios', 'participacoes', 'candidatos'):
+        if chave in convertido:
+            convertido[chave] = [item._asdict() for item in convertido[chave]]
+    if convertido.get('grupo_economico'):
+        convertido['grupo_economico'] = convertido['grupo_economico']._asdict()
+    return convertido
+
+def normalizar_nome(nome, manter_digitos=False):
+    """Normaliza o nome para comparação (nomes de empresa mantêm os dígitos: 3M, 99 TAXIS)"""
     import unicodedata
     import re
     
@@ -24,19 +46,170 @@ def normalizar_nome(nome):
     nome = nome.upper()
     
     # Remover caracteres especiais e números
-    nome = re.sub(r'[^A-Z ]', '', nome)
+    nome = re.sub(r'[^A-Z0-9 ]' if manter_digitos else r'[^A-Z ]', '', nome)
     
     # Remover espaços extras
     nome = ' '.join(nome.split())
     
     return nome
 
+def normalizar_nome_empresa(nome):
+    """Forma da razão social / nome fantasia gravada em nomes_empresas (carregar_base.py)"""
+    return normalizar_nome(nome, manter_digitos=True)
+
+# Partículas dos nomes: ficam no índice FTS, mas não entram na busca nem na chave
+# fonética (casariam com quase todos, e são as primeiras a faltar numa grafia)
+PARTICULAS_NOME = {'DA', 'DE', 'DO', 'DAS', 'DOS', 'E'}
+
+# Regras da chave fonética, aplicadas em ordem a cada palavra do nome normalizado.
+# Grafias do português com o mesmo som ficam iguais: LUIZ/LUIS, SOUZA/SOUSA,
+# THEREZA/TEREZA, CESAR/CEZAR, KATIA/CATIA, WALTER/VALTER, MATTOS/MATOS
+REGRAS_FONETICAS = [(re.compile(padrao), troca) for padrao, troca in (
+    (r'CHR', 'KR'), (r'PH', 'F'), (r'TH', 'T'), (r'S?CH|SH', 'X'), (r'LH', 'LI'), (r'NH', 'NI'),
+    (r'Y', 'I'), (r'W', 'V'),
+    (r'QU(?=[EI])', 'K'), (r'Q', 'K'), (r'[SX]?C(?=[EI])', 'S'), (r'C', 'K'),
+    (r'G(?=[EI])', 'J'), (r'GU(?=[EI])', 'G'),
+    (r'Z', 'S'), (r'H', ''), (r'N$', 'M'), (r'O$', 'U'), (r'(?<=.)[EI]$', ''),
+    (r'(.)\1+', r'\1'),
+)]
+
+@lru_cache(maxsize=65536)
+def _fonetica_palavra(palavra):
+    # Poucas palavras distintas entre milhões de nomes: cada uma passa pelas regras uma vez
+    for padrao, troca in REGRAS_FONETICAS:
+        palavra = padrao.sub(troca, palavra)
+    return palavra
+
+def chave_fonetica(nome_normalizado):
+    """
+    Chave fonética do nome (já normalizado): as palavras sem as partículas, cada
+    uma reescrita por REGRAS_FONETICAS. Nomes com a mesma chave soam iguais; é a
+    chave de bloqueio gravada por sócio na carga (socios_fonetica), que separa os
+    poucos candidatos a comparar com o SequenceMatcher
+    """
+    return ' '.join(_fonetica_palavra(palavra) for palavra in nome_normalizado.split()
+                    if palavra not in PARTICULAS_NOME)
+
 def similaridade(a, b):
     """Calcula a similaridade entre duas strings"""
     if not a or not b:
         return 0
     return SequenceMatcher(None, a, b).ratio()
 
+# Os nomes dos candidatos se repetem muito (um sócio por empresa, lotes com a mesma pessoa)
+_normalizar_candidato = lru_cache(maxsize=65536)(normalizar_nome)
+
+# Contadores da cascata de escolher_candidato (por processo; o processamento
+# em lote soma os dos workers). Consultas: em qual etapa a escolha terminou;
+# candidatos: quantos tiveram o score calculado e quantos foram descartados pelo limite
+ESTATISTICAS_CASCATA = Counter()
+
+def limite_tamanho(tamanho, outro):
+    """Limite superior do score pelos tamanhos dos dois nomes (o real_quick_ratio do SequenceMatcher)"""
+    return 2 * min(tamanho, outro) / (tamanho + outro) if tamanho and outro else 0
+
+def pontuar_acima(comparador, nome, patamar=None):
+    """
+    similaridade() entre o nome fixado no comparador (seq1) e `nome`, ou None se
+    ela não pode alcançar o patamar: o limite pelo tamanho e o das letras em
+    comum (quick_ratio) são verificados antes do ratio() completo, o passo caro
+    """
+    if patamar is not None and limite_tamanho(len(comparador.a), len(nome)) < patamar:
+        return None
+    if not comparador.a or not nome:
+        return 0
+    comparador.set_seq2(nome)
+    if patamar is not None and comparador.quick_ratio() < patamar:
+        return None
+    return comparador.ratio()
+
+def candidatos_acima(alvo, nomes, limiar):
+    """(posição, score) de todos os nomes com similaridade() >= limiar com `alvo`, na ordem da lista"""
+    comparador = SequenceMatcher(None, alvo)
+    pontuados = ((i, pontuar_acima(comparador, nome, limiar)) for i, nome in enumerate(nomes))
+    return [(i, score) for i, score in pontuados if score is not None and score >= limiar]
+
+def escolher_candidato(alvo, nomes, limiar=None):
+    """
+    Escolhe entre os nomes normalizados dos candidatos o mais parecido com
+    `alvo` (também normalizado). Retorna (posição, score, etapa), com o mesmo
+    resultado de calcular similaridade() para todos e ordenar: maior score e,
+    no empate, o primeiro da lista. Etapas, da mais barata para a mais cara:
+        
+        exato   nome idêntico: score 1.0, nada mais precisa ser calculado
+        tokens  mesmo conjunto de palavras (ex.: sobrenome antes do nome):
+                calculados primeiro, servem de patamar para o descarte
+        fuzzy   os demais, em ordem decrescente do limite superior do score
+                pelo tamanho (2*min/(la+lb), o real_quick_ratio); quem não
+                alcança o patamar por esse limite ou pelo quick_ratio (letras
+                em comum) é descartado sem o ratio() completo
+    
+    O patamar é o melhor score já encontrado ou, se informado, o `limiar`
+    quando ainda não foi alcançado. Se ninguém chegar ao limiar, os
+    descartados só por ele são revistos, para que o score devolvido de um
+    nome que não corresponde continue sendo o máximo exato.
+    
+    A escolha termina em 'tokens' se todos os outros forem descartados.
+    """
+    if alvo and alvo in nomes:
+        ESTATISTICAS_CASCATA['exato'] += 1
+        return nomes.index(alvo), 1.0, 'exato'
+    
+    tokens = set(alvo.split())
+    tamanho = len(alvo)
+    comparador = SequenceMatcher(None, alvo)
+    
+    def limite(i):
+        return limite_tamanho(tamanho, len(nomes[i]))
+    
+    mesmos_tokens = [i for i, nome in enumerate(nomes) if tokens and set(nome.split()) == tokens]
+    conjunto_tokens = set(mesmos_tokens)
+    demais = sorted(set(range(len(nomes))) - conjunto_tokens, key=limite, reverse=True)
+    
+    melhor, melhor_score = None, None
+    calculados = 0
+    fora_dos_tokens = False
+    adiados = []
+    descartados = 0
+    
+    def avaliar(i, patamar):
+        nonlocal melhor, melhor_score, calculados, fora_dos_tokens
+        score = pontuar_acima(comparador, nomes[i], patamar)
+        if score is None:
+            return False
+        calculados += 1
+        fora_dos_tokens = fora_dos_tokens or i not in conjunto_tokens
+        if melhor_score is None or score > melhor_score or (score == melhor_score and i < melhor):
+            melhor, melhor_score = i, score
+        return True
+    
+    for i in mesmos_tokens + demais:
+        if limiar is not None and (melhor_score is None or melhor_score < limiar):
+            if not avaliar(i, limiar):
+                adiados.append(i)
+        elif not avaliar(i, melhor_score):
+            descartados += 1
+    
+    # Ninguém chegou ao limiar: o score exato do melhor pode estar entre os adiados
+    if melhor_score is None or (limiar is not None and melhor_score < limiar):
+        for i in adiados:
+            if not avaliar(i, melhor_score):
+                descartados += 1
+    else:
+        descartados += len(adiados)
+    
+    etapa = 'tokens' if mesmos_tokens and not fora_dos_tokens else 'fuzzy'
+    ESTATISTICAS_CASCATA[etapa] += 1
+    ESTATISTICAS_CASCATA['calculados'] += calculados
+    ESTATISTICAS_CASCATA['descartados'] += descartados
+    return melhor, melhor_score, etapa
+
+def resumo_cascata(estatisticas=None):
+    """Linha de resumo dos contadores da cascata"""
+    e = ESTATISTICAS_CASCATA if estatisticas is None else estatisticas
+    return (f"Cascata: {e['exato']} exatos, {e['tokens']} por tokens, {e['fuzzy']} fuzzy; "
+            f"{e['calculados']} scores calculados, {e['descartados']} candidatos descartados pelo limite")
+
 def extrair_miolo_cpf(cpf):
     """Extrai o miolo do CPF (6 dígitos centrais)"""
     # Remove caracteres não numéricos
@@ -52,196 +225,189 @@ def extrair_miolo_cpf(cpf):
     
     return cpf_limpo  # Retorna o que tiver
 
+# Mapeamento detalhado das situações cadastrais (também usado por carregar_base.py
+# para gravar a descrição em empresa_resumo)
+SITUACOES_CADASTRAIS = {
+    "1": "NULA",
+    "2": "ATIVA",
+    "3": "SUSPENSA",
+    "4": "INAPTA",
+    "8": "BAIXADA",
+    # Códigos adicionais
+    "01": "NULA",
+    "02": "ATIVA",
+    "03": "SUSPENSA",
+    "04": "INAPTA",
+    "08": "BAIXADA",
+    "05": "CANCELADA",
+    "06": "IRREGULAR",
+    "07": "LIQUIDAÇÃO EXTRAJUDICIAL"
+}
+
 def mapear_situacao_cadastral(codigo):
     """Mapeamento detalhado das situações cadastrais"""
-    mapeamento = {
-        "1": "NULA",
-        "2": "ATIVA",
-        "3": "SUSPENSA",
-        "4": "INAPTA",
-        "8": "BAIXADA",
-        # Códigos adicionais
-        "01": "NULA",
-        "02": "ATIVA",
-        "03": "SUSPENSA",
-        "04": "INAPTA",
-        "08": "BAIXADA",
-        "05": "CANCELADA", 
-        "06": "IRREGULAR",
-        "07": "LIQUIDAÇÃO EXTRAJUDICIAL"
-    }
-    
     # Converter para string para garantir compatibilidade
     codigo_str = str(codigo).strip() if codigo else ""
     
     # Tentar buscar no mapeamento
-    return mapeamento.get(codigo_str, f"DESCONHECIDA ({codigo_str})")
+    return SITUACOES_CADASTRAIS.get(codigo_str, f"DESCONHECIDA ({codigo_str})")
+
+def _como_motor(conn):
+    """Aceita uma conexão SQLite (uso antigo) ou um motor de motor_consulta"""
+    if isinstance(conn, MotorConsulta):
+        return conn
+    return MotorSQLite(conn)
 
 def obter_nome_empresa(conn, cnpj_basico):
     """Função corrigida para obter o nome da empresa de forma mais confiável"""
-    cursor = conn.cursor()
-    nome_empresa = None
-    
-    # 1. Tentar na tabela k3241k03200y0d (identificada como de empresas)
-    try:
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='k3241k03200y0d'")
-        if cursor.fetchone():
-            cursor.execute("SELECT col_1 FROM k3241k03200y0d WHERE col_0 = ? LIMIT 1", (cnpj_basico,))
-            result = cursor.fetchone()
-            if result and result[0]:
-                nome_empresa = result[0]
-                print(f"Nome encontrado em k3241k03200y0d: {nome_empresa}")
-                return nome_empresa
-    except Exception as e:
-        print(f"Erro ao buscar em k3241k03200y0d: {e}")
-    
-    # 2. Tentar na tabela outros
-    try:
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='outros'")
-        if cursor.fetchone():
-            cursor.execute("SELECT col_1 FROM outros WHERE col_0 = ? LIMIT 1", (cnpj_basico,))
-            result = cursor.fetchone()
-            if result and result[0]:
-                nome_empresa = result[0]
-                print(f"Nome encontrado em outros: {nome_empresa}")
-                return nome_empresa
-    except Exception as e:
-        print(f"Erro ao buscar em outros: {e}")
-    
-    # 3. Tentar na tabela empresas
+    # Tabelas k3241k03200y0d e outros (bancos antigos), depois empresas
     try:
-        cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='empresas'")
-        if cursor.fetchone():
-            cursor.execute("SELECT razao_social FROM empresas WHERE cnpj_basico = ? LIMIT 1", (cnpj_basico,))
-            result = cursor.fetchone()
-            if result and result[0]:
-                nome_empresa = result[0]
-                print(f"Nome encontrado em empresas: {nome_empresa}")
-                return nome_empresa
+        nome_empresa, tabela = _como_motor(conn).nome_empresa(cnpj_basico)
+        if nome_empresa:
+            print(f"Nome encontrado em {tabela}: {nome_empresa}")
+            return nome_empresa
     except Exception as e:
-        print(f"Erro ao buscar em empresas: {e}")
+        print(f"Erro ao buscar nome da empresa: {e}")
     
     print("Nome da empresa não encontrado")
     return "NOME NÃO DISPONÍVEL"
 
+def _formatar_endereco(rua, numero):
+    """Logradouro e número do estabelecimento ("ENDEREÇO NÃO DISPONÍVEL" sem logradouro)"""
+    endereco = None
+    
+    # Verificar se os valores são válidos
+    if rua is not None and str(rua).lower() != 'none' and str(rua).strip():
+        endereco = str(rua)
+        if numero is not None and str(numero).lower() != 'none' and str(numero).strip():
+            endereco += f", {numero}"
+    
+    return endereco if endereco else "ENDEREÇO NÃO DISPONÍVEL"
+
+def _decodificar(motor, cnae, municipio):
+    """Descrição do CNAE e nome do município pelas tabelas auxiliares em memória do motor (sem SQL)"""
+    return motor.dimensao('cnaes').get(cnae, ''), motor.dimensao('municipios').get(municipio, municipio)
+
+def _empresa_do_resumo(cnpj_basico, resumo, motor):
+    """Empresa a partir da linha de empresa_resumo (motor_consulta.EmpresaResumo)"""
+    return Empresa(
+        cnpj_basico,
+        resumo.razao_social or "NOME NÃO DISPONÍVEL",
+        resumo.situacao_cadastral,
+        resumo.situacao_descricao,
+        _formatar_endereco(resumo.logradouro, resumo.numero),
+        resumo.bairro,
+        resumo.uf,
+        resumo.cnae_principal,
+        *_decodificar(motor, resumo.cnae_principal, resumo.municipio)
+    )
+
+def _montar_empresas(cnpj_basico, nome_empresa, estabelecimentos, motor):
+    """Uma Empresa por estabelecimento (motor_consulta.Estabelecimento)"""
+    # Se não encontrou estabelecimentos
+    if not estabelecimentos:
+        print("Nenhum estabelecimento encontrado")
+        
+        # Retornar informações básicas mesmo sem estabelecimento
+        return [Empresa(cnpj_basico, nome_empresa, "DESCONHECIDA", "DESCONHECIDA",
+                        "ENDEREÇO NÃO DISPONÍVEL", "", "", "", "", "")]
+    
+    empresas = []
+    
+    # Processar cada estabelecimento
+    for estab in estabelecimentos:
+        empresas.append(Empresa(
+            cnpj_basico,
+            nome_empresa,
+            estab.situacao_cadastral,
+            mapear_situacao_cadastral(estab.situacao_cadastral),
+            _formatar_endereco(estab.rua, estab.numero),
+            estab.bairro,
+            estab.uf,
+            estab.cnae_principal,
+            *_decodificar(motor, estab.cnae_principal, estab.municipio)
+        ))
+    
+    return empresas
+
+def _empresa_com_erro(cnpj_basico, erro):
+    """Informações mínimas quando a busca da empresa falha"""
+    return Empresa(cnpj_basico, "ERRO AO BUSCAR NOME", "ERRO", f"ERRO: {str(erro)}",
+                   "ENDEREÇO NÃO DISPONÍVEL", "", "", "", "", "")
+
 def buscar_informacoes_empresa(conn, cnpj_basico, debug=False):
     """Busca informações detalhadas da empresa"""
-    cursor = conn.cursor()
-    empresas = []
+    motor = _como_motor(conn)
     
     try:
         # 1. Buscar nome da empresa
-        nome_empresa = obter_nome_empresa(conn, cnpj_basico)
+        nome_empresa = obter_nome_empresa(motor, cnpj_basico)
         
         # 2. Buscar na tabela de estabelecimentos para dados de contato, situação, etc.
-        cursor.execute("PRAGMA table_info(estabelecimentos)")
-        colunas_info = cursor.fetchall()
-        colunas_nomes = [col[1] for col in colunas_info]
-        
-        # Encontrar colunas relevantes
-        col_situacao = "02" if "02" in colunas_nomes else "situacao_cadastral"
-        col_cnae = "4723700" if "4723700" in colunas_nomes else "cnae_principal"
-        col_rua = "rua" if "rua" in colunas_nomes else None
-        col_numero = "nilso_braun" if "nilso_braun" in colunas_nomes else None
-        col_bairro = "parque_das_palmeiras" if "parque_das_palmeiras" in colunas_nomes else "bairro"
-        col_uf = "sc" if "sc" in colunas_nomes else "uf"
-        
-        # Construir consulta dinâmica
-        query = f"""
-        SELECT 
-            cnpj_basico,
-            [{col_situacao}] AS situacao_cadastral
-        """
-        
-        if col_rua:
-            query += f", [{col_rua}] as rua"
-        if col_numero:
-            query += f", [{col_numero}] as numero"
-        if col_bairro:
-            query += f", [{col_bairro}] as bairro"
-        if col_uf:
-            query += f", [{col_uf}] as uf"
-        if col_cnae:
-            query += f", [{col_cnae}] as cnae_principal"
-        
-        query += " FROM estabelecimentos WHERE cnpj_basico = ?"
-        
-        cursor.execute(query, (cnpj_basico,))
-        estabelecimentos = cursor.fetchall()
-        
-        # Se não encontrou estabelecimentos
-        if not estabelecimentos or len(estabelecimentos) == 0:
-            print("Nenhum estabelecimento encontrado")
-            
-            # Retornar informações básicas mesmo sem estabelecimento
-            return [{
-                "cnpj_basico": cnpj_basico,
-                "nome_empresa": nome_empresa,
-                "situacao_cadastral": "DESCONHECIDA",
-                "situacao_descricao": "DESCONHECIDA",
-                "endereco": "ENDEREÇO NÃO DISPONÍVEL",
-                "bairro": "",
-                "uf": "",
-                "cnae_principal": ""
-            }]
-        
-        # Obter nomes das colunas da consulta
-        colunas = [col[0] for col in cursor.description]
-        
-        # Processar cada estabelecimento
-        for estab in estabelecimentos:
-            # Mapear valores
-            estab_dict = {}
-            for i, col in enumerate(colunas):
-                if i < len(estab):
-                    estab_dict[col] = estab[i]
-            
-            # Construir endereço corretamente
-            endereco = None
-            if 'rua' in estab_dict and 'numero' in estab_dict:
-                rua = estab_dict.get('rua')
-                numero = estab_dict.get('numero')
-                
-                # Verificar se os valores são válidos
-                if rua is not None and str(rua).lower() != 'none' and str(rua).strip():
-                    endereco = str(rua)
-                    if numero is not None and str(numero).lower() != 'none' and str(numero).strip():
-                        endereco += f", {numero}"
-            
-            # Construir objeto de empresa
-            empresa_dict = {
-                "cnpj_basico": cnpj_basico,
-                "nome_empresa": nome_empresa,
-                "situacao_cadastral": estab_dict.get("situacao_cadastral"),
-                "situacao_descricao": mapear_situacao_cadastral(estab_dict.get("situacao_cadastral")),
-                "endereco": endereco if endereco else "ENDEREÇO NÃO DISPONÍVEL",
-                "bairro": estab_dict.get("bairro", ""),
-                "uf": estab_dict.get("uf", ""),
-                "cnae_principal": estab_dict.get("cnae_principal", "")
-            }
-            
-            empresas.append(empresa_dict)
+        return _montar_empresas(cnpj_basico, nome_empresa, motor.estabelecimentos(cnpj_basico), motor)
     
     except Exception as e:
         print(f"Erro ao buscar informações da empresa: {e}")
         
         # Retornar informações mínimas em caso de erro
-        empresas.append({
-            "cnpj_basico": cnpj_basico,
-            "nome_empresa": "ERRO AO BUSCAR NOME",
-            "situacao_cadastral": "ERRO",
-            "situacao_descricao": f"ERRO: {str(e)}",
-            "endereco": "ENDEREÇO NÃO DISPONÍVEL",
-            "bairro": "",
-            "uf": "",
-            "cnae_principal": ""
-        })
+        return [_empresa_com_erro(cnpj_basico, e)]
+
+def buscar_informacoes_empresas(conn, cnpjs_basicos, debug=False):
+    """
+    Informações de várias empresas (ex.: todas as de um mesmo sócio), com uma
+    consulta por tabela para o lote inteiro em vez de uma por empresa
+    """
+    motor = _como_motor(conn)
     
+    try:
+        dados = motor.empresas_lote(cnpjs_basicos)
+    except Exception as e:
+        print(f"Erro ao buscar informações das empresas: {e}")
+        return [_empresa_com_erro(cnpj_basico, e) for cnpj_basico in dict.fromkeys(cnpjs_basicos)]
+    
+    empresas = []
+    for cnpj_basico, ((nome_empresa, tabela), estabelecimentos) in dados.items():
+        if nome_empresa:
+            print(f"Nome encontrado em {tabela}: {nome_empresa}")
+        else:
+            print("Nome da empresa não encontrado")
+            nome_empresa = "NOME NÃO DISPONÍVEL"
+        empresas.extend(_montar_empresas(cnpj_basico, nome_empresa, estabelecimentos, motor))
     return empresas
 
-def consulta_socio_direta(db_path, nome, cpf, limiar_similaridade=0.7, debug=False):
+def _escolher_socio(motor, miolo_cpf, nome_normalizado, limiar_similaridade):
+    """
+    Sócios do miolo e a escolha da cascata: (socios, nomes normalizados, posição,
+    score, etapa), sempre a mesma de escolher_candidato sobre o balde inteiro.
+    Em baldes quentes, os sócios com a chave fonética do nome procurado
+    (socios_fonetica, calculada do nome normalizado) são lidos primeiro: se um
+    deles tem exatamente esse nome, todos os nomes idênticos do balde estão
+    entre eles, na mesma ordem, e nenhum outro sócio passa de score 1.0, então o
+    resto do balde não precisa ser lido. Senão a escolha é feita no balde inteiro.
+    """
+    def escolher(socios, so_exato=False):
+        nomes_normalizados = [_normalizar_candidato(s.nome_socio) if s.nome_socio else "" for s in socios]
+        if so_exato and nome_normalizado not in nomes_normalizados:
+            return None
+        posicao, score, etapa = escolher_candidato(nome_normalizado, nomes_normalizados, limiar_similaridade)
+        return socios, nomes_normalizados, posicao, score, etapa
+    
+    if nome_normalizado and motor.balde_quente(miolo_cpf):
+        socios = motor.socios_por_fonetica(chave_fonetica(nome_normalizado), miolo_cpf)
+        escolha = escolher(socios, so_exato=True) if socios else None
+        if escolha:
+            return escolha
+    
+    socios = motor.socios_por_miolo(miolo_cpf)
+    if not socios:
+        return [], [], None, 0, None
+    return escolher(socios)
+
+def consulta_socio_direta(db_path, nome, cpf, limiar_similaridade=0.7, debug=False, motor=None):
     """
-    Consulta diretamente na tabela de sócios, sem depender da coluna cpf_miolo
+    Consulta diretamente na tabela de sócios, sem depender da coluna cpf_miolo.
+    Se `motor` for informado (ex.: no processamento de arquivos), ele é usado
+    e não é fechado; senão uma conexão SQLite é aberta em db_path.
     """
     print(f"Consultando sócio diretamente: {nome} (CPF: {cpf})")
     
@@ -261,52 +427,18 @@ def consulta_socio_direta(db_path, nome, cpf, limiar_similaridade=0.7, debug=Fal
         }
     
     # Conectar ao banco
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
+    proprio = motor is None
+    if proprio:
+        motor = MotorSQLite(db_path)
     
     try:
-        # Verificar se já existem registros com cpf_miolo corrigido
-        cursor.execute("""
-        SELECT COUNT(*) FROM socios 
-        WHERE LENGTH(cpf_miolo) = 6 AND cpf_miolo GLOB '[0-9][0-9][0-9][0-9][0-9][0-9]'
-        """)
-        
-        count_corretos = cursor.fetchone()[0]
-        print(f"Encontrados {count_corretos} registros com cpf_miolo corrigido.")
-        
-        if count_corretos > 1000:
-            print(f"Usando coluna cpf_miolo.")
-            # Usar a coluna cpf_miolo para consulta
-            cursor.execute("""
-            SELECT * FROM socios
-            WHERE cpf_miolo = ?
-            LIMIT 100
-            """, (miolo_cpf,))
-        else:
-            print("Poucos registros com cpf_miolo corrigido. Fazendo extração direta.")
-            # Usar extração direta (mais lento)
-            cursor.execute("""
-            SELECT * FROM socios
-            WHERE (
-                -- Para CPFs mascarados (***XXXXXX**)
-                ([***331355**] LIKE '***%' AND SUBSTR(REPLACE(REPLACE([***331355**], '.', ''), '-', ''), 4, 6) = ?)
-                OR
-                -- Para CPFs completos (11+ dígitos)
-                (LENGTH(REPLACE(REPLACE([***331355**], '.', ''), '-', '')) >= 11 
-                 AND SUBSTR(REPLACE(REPLACE([***331355**], '.', ''), '-', ''), 4, 6) = ?)
-                OR
-                -- Para CPFs parciais mas com 6+ dígitos
-                (LENGTH(REPLACE(REPLACE([***331355**], '.', ''), '-', '')) >= 6
-                 AND LENGTH(REPLACE(REPLACE([***331355**], '.', ''), '-', '')) < 11
-                 AND SUBSTR(REPLACE(REPLACE([***331355**], '.', ''), '-', ''), 1, 6) = ?)
-            )
-            LIMIT 100
-            """, (miolo_cpf, miolo_cpf, miolo_cpf))
-        
-        socios = cursor.fetchall()
+        # Normalizar nome de entrada para comparação
+        nome_normalizado = normalizar_nome(nome)
         
-        # Obter nomes das colunas
-        colunas = [col[0] for col in cursor.description]
+        # Usa a coluna cpf_miolo quando preenchida; senão extrai o miolo na consulta.
+        # Melhor candidato pela cascata (exato -> tokens -> limite -> fuzzy)
+        socios, nomes_normalizados, posicao, score, etapa = _escolher_socio(
+            motor, miolo_cpf, nome_normalizado, limiar_similaridade)
         
         # Se não encontrou resultados
         if not socios:
@@ -321,71 +453,30 @@ def consulta_socio_direta(db_path, nome, cpf, limiar_similaridade=0.7, debug=Fal
             }
         
         print(f"Encontrados {len(socios)} sócios com este miolo de CPF.")
-        
-        # Normalizar nome de entrada para comparação
-        nome_normalizado = normalizar_nome(nome)
-        
-        # Identificar índice da coluna com nome do sócio
-        idx_nome = None
-        for i, col in enumerate(colunas):
-            if col.lower() in ['livia_maria_andrade_ramos_gaertner', 'nome_socio']:
-                idx_nome = i
-                break
-        
-        if idx_nome is None:
-            # Tentar pela terceira coluna (normalmente é o nome)
-            idx_nome = 2 if len(colunas) > 2 else 0
-        
-        # Calcular similaridade para cada resultado
-        resultados_com_score = []
-        for socio in socios:
-            # Converter para dicionário
-            socio_dict = {}
-            for i, col in enumerate(colunas):
-                socio_dict[col] = socio[i]
-            
-            # Calcular similaridade do nome
-            nome_socio = socio[idx_nome]
-            nome_socio_norm = normalizar_nome(nome_socio) if nome_socio else ""
-            score = similaridade(nome_normalizado, nome_socio_norm)
-            
-            socio_dict['score'] = score
-            resultados_com_score.append(socio_dict)
-        
-        # Ordenar por similaridade
-        resultados_com_score.sort(key=lambda x: x['score'], reverse=True)
+        if debug:
+            print(f"Escolha do candidato terminou na etapa '{etapa}'")
         
         # Se encontrou resultado com score acima do limiar
-        if resultados_com_score and resultados_com_score[0]['score'] >= limiar_similaridade:
-            melhor_resultado = resultados_com_score[0]
-            
-            # Índice de coluna de CNPJ básico
-            idx_cnpj = None
-            for i, col in enumerate(colunas):
-                if col.lower() in ['03769328', 'cnpj_basico']:
-                    idx_cnpj = i
-                    break
-            
-            if idx_cnpj is None:
-                # Tentar pela primeira coluna (normalmente é o CNPJ básico)
-                idx_cnpj = 0
+        if score >= limiar_similaridade:
+            melhor_resultado = socios[posicao]
+            nome_vencedor = nomes_normalizados[posicao]
             
-            # Buscar empresas associadas ao CNPJ
-            cnpj_basico = socio[idx_cnpj]
-            empresas = buscar_informacoes_empresa(conn, cnpj_basico, debug)
+            # A pessoa aparece uma vez por empresa no mesmo miolo: todas as linhas
+            # com o mesmo nome normalizado do vencedor são dela
+            cnpjs_basicos = [s.cnpj_basico for s, nome_norm in zip(socios, nomes_normalizados)
+                             if nome_norm == nome_vencedor]
             
-            # Formatar resultado
-            nome_col = colunas[idx_nome]
-            cpf_col = colunas[3] if len(colunas) > 3 else None  # Normalmente é a quarta coluna
+            # Buscar as empresas associadas (uma consulta para todas)
+            empresas = buscar_informacoes_empresas(motor, cnpjs_basicos, debug)
             
             resultado = {
                 "nome": nome,
                 "cpf": cpf,
                 "miolo_cpf": miolo_cpf,
                 "status": "Encontrado",
-                "nome_encontrado": melhor_resultado.get(nome_col),
-                "cpf_encontrado": melhor_resultado.get(cpf_col) if cpf_col else "Desconhecido",
-                "score": melhor_resultado['score'],
+                "nome_encontrado": melhor_resultado.nome_socio,
+                "cpf_encontrado": melhor_resultado.cnpj_cpf_socio or "Desconhecido",
+                "score": score,
                 "empresas": empresas
             }
             
@@ -395,13 +486,13 @@ def consulta_socio_direta(db_path, nome, cpf, limiar_similaridade=0.7, debug=Fal
             return resultado
         
         # Se encontrou resultados, mas nenhum com score adequado
-        print(f"Nomes não correspondem. Melhor score: {resultados_com_score[0]['score']:.2f}")
+        print(f"Nomes não correspondem. Melhor score: {score:.2f}")
         return {
             "nome": nome,
             "cpf": cpf,
             "miolo_cpf": miolo_cpf,
             "status": "Nome não corresponde",
-            "score": resultados_com_score[0]['score'] if resultados_com_score else 0,
+            "score": score,
             "empresas": []
         }
     
@@ -417,11 +508,110 @@ def consulta_socio_direta(db_path, nome, cpf, limiar_similaridade=0.7, debug=Fal
         }
     
     finally:
-        conn.close()
+        if proprio:
+            motor.fechar()
 
-def verificar_cnpj_direto(db_path, cnpj, debug=False):
+# Pessoa encontrada na busca só por nome: nome e documento como estão na base, score
+# da comparação com o nome procurado e as empresas em que ela aparece entre os candidatos
+CandidatoNome = namedtuple('CandidatoNome', ('nome', 'cpf', 'score', 'cnpjs_basicos'))
+
+def consulta_socio_por_nome(db_path, nome, limite=10, limiar_similaridade=0.7, debug=False, motor=None):
+    """
+    Busca só pelo nome, sem CPF: os candidatos são os sócios com a mesma chave
+    fonética (grafias do mesmo som) seguidos dos do índice FTS5 de nomes (BM25,
+    MotorConsulta.socios_por_nome), reordenados pela similaridade com o nome
+    procurado. Retorna as `limite` pessoas (nome + documento) mais parecidas.
+    """
+    print(f"Consultando sócio pelo nome: {nome}")
+    
+    nome_normalizado = normalizar_nome(nome)
+    termos = [t for t in nome_normalizado.split() if t not in PARTICULAS_NOME] or nome_normalizado.split()
+    resultado = {
+        "nome": nome,
+        "status": "Nome inválido",
+        "score": 0,
+        "candidatos": []
+    }
+    if not termos:
+        print("Nome vazio após a normalização")
+        return resultado
+    
+    proprio = motor is None
+    if proprio:
+        motor = MotorSQLite(db_path)
+    
+    try:
+        socios = motor.socios_por_nome(termos)
+        foneticos = motor.socios_por_fonetica(chave_fonetica(nome_normalizado))
+        if foneticos:
+            # A mesma linha pode vir das duas buscas
+            socios = list(dict.fromkeys(foneticos + (socios or [])))
+        if socios is None:
+            print("O banco não tem o índice de nomes (rode carregar_base.py --apenas-indices)")
+            resultado["status"] = "Índice de nomes indisponível"
+            return resultado
+        if debug:
+            print(f"{len(socios)} candidatos do índice de nomes para {' '.join(termos)}")
+        
+        # Uma entrada por pessoa (nome + documento), na ordem do BM25 entre scores iguais
+        pessoas = {}
+        for socio in socios:
+            chave = (socio.nome_socio, socio.cnpj_cpf_socio)
+            if chave not in pessoas:
+                nome_candidato = _normalizar_candidato(socio.nome_socio) if socio.nome_socio else ""
+                pessoas[chave] = (similaridade(nome_normalizado, nome_candidato), [])
+            pessoas[chave][1].append(socio.cnpj_basico)
+        candidatos = sorted(
+            (CandidatoNome(nome_socio, cpf, score, cnpjs) for (nome_socio, cpf), (score, cnpjs) in pessoas.items()),
+            key=lambda candidato: -candidato.score
+        )[:limite]
+        
+        if not candidatos:
+            print("Nenhum sócio encontrado.")
+            resultado["status"] = "Não encontrado"
+            return resultado
+        
+        melhor = candidatos[0]
+        resultado["status"] = "Encontrado" if melhor.score >= limiar_similaridade else "Nome não corresponde"
+        resultado["score"] = melhor.score
+        resultado["candidatos"] = candidatos
+        print(f"Melhor candidato: {melhor.nome} ({melhor.cpf}), Score: {melhor.score:.2f}")
+        return resultado
+    
+    except Exception as e:
+        print(f"Erro na consulta: {e}")
+        resultado["status"] = f"Erro: {str(e)}"
+        return resultado
+    
+    finally:
+        if proprio:
+            motor.fechar()
+
+def sugerir_empresas(db_path, texto, limite=LIMITE_SUGESTOES, motor=None):
     """
-    Verifica um CNPJ diretamente no banco
+    Autocompletar de empresas: as `limite` primeiras (ordem alfabética) cuja razão
+    social ou nome fantasia começa com `texto`, como SugestaoEmpresa. Sem prints
+    (é chamada a cada tecla). Um espaço no fim do texto exige a palavra completa.
+    None se o banco não tem o índice de nomes de empresas.
+    """
+    prefixo = normalizar_nome_empresa(texto)
+    if not prefixo:
+        return []
+    if texto[-1:].isspace():
+        prefixo += ' '
+    
+    proprio = motor is None
+    if proprio:
+        motor = MotorSQLite(db_path)
+    try:
+        return motor.empresas_por_prefixo(prefixo, limite)
+    finally:
+        if proprio:
+            motor.fechar()
+
+def verificar_cnpj_direto(db_path, cnpj, debug=False, motor=None):
+    """
+    Verifica um CNPJ diretamente no banco (ou pelo `motor` informado, que não é fechado)
     """
     print(f"Verificando CNPJ: {cnpj}")
     
@@ -441,32 +631,36 @@ def verificar_cnpj_direto(db_path, cnpj, debug=False):
     print(f"CNPJ básico: {cnpj_basico}")
     
     # Conectar ao banco
-    conn = sqlite3.connect(db_path)
-    cursor = conn.cursor()
+    proprio = motor is None
+    if proprio:
+        motor = MotorSQLite(db_path)
     
     try:
-        # Verificar se o CNPJ existe
-        cursor.execute("""
-        SELECT 
-            cnpj_basico,
-            [02] AS situacao_cadastral
-        FROM estabelecimentos
-        WHERE cnpj_basico = ?
-        LIMIT 1
-        """, (cnpj_basico,))
-        
-        estabelecimento = cursor.fetchone()
-        
-        if not estabelecimento:
-            print("CNPJ não encontrado.")
-            return {
-                "cnpj": cnpj,
-                "status": "Não encontrado",
-                "socios": []
-            }
+        nao_encontrado = {
+            "cnpj": cnpj,
+            "status": "Não encontrado",
+            "socios": []
+        }
         
-        # Buscar informações da empresa
-        empresas = buscar_informacoes_empresa(conn, cnpj_basico, debug)
+        if motor.tem_tabela('empresa_resumo'):
+            # Banco com empresa_resumo (carregar_base.py): existência, dados da matriz
+            # e contagens saem de uma única leitura pela chave primária
+            resumo = motor.empresa_resumo(cnpj_basico)
+            if resumo is None:
+                print("CNPJ não encontrado.")
+                return nao_encontrado
+            empresas = [_empresa_do_resumo(cnpj_basico, resumo, motor)]
+            qtd_estabelecimentos, qtd_socios = resumo.estabelecimentos, resumo.socios
+        else:
+            # Verificar se o CNPJ existe
+            estabelecimentos = motor.estabelecimentos(cnpj_basico)
+            if not estabelecimentos:
+                print("CNPJ não encontrado.")
+                return nao_encontrado
+            
+            # Buscar informações da empresa
+            empresas = buscar_informacoes_empresa(motor, cnpj_basico, debug)
+            qtd_estabelecimentos, qtd_socios = len(estabelecimentos), None
         
         if not empresas:
             print("Informações da empresa não encontradas.")
@@ -481,45 +675,55 @@ def verificar_cnpj_direto(db_path, cnpj, debug=False):
         # Usar a primeira empresa para informações gerais
         empresa = empresas[0]
         
-        # Buscar sócios
+        # Buscar sócios (SocioEmpresa: nome, cpf, qualificação); a contagem do resumo evita a consulta sem sócios
         try:
-            cursor.execute("""
-            SELECT 
-                [livia_maria_andrade_ramos_gaertner] AS nome_socio,
-                [***331355**] AS cpf_cnpj_socio
-            FROM socios
-            WHERE [03769328] = ?
-            """, (cnpj_basico,))
-            
-            socios = []
-            for socio in cursor.fetchall():
-                socios.append({
-                    "nome": socio[0],
-                    "cpf": socio[1]
-                })
+            socios = motor.socios_da_empresa(cnpj_basico) if qtd_socios != 0 else []
             
             print(f"Encontrados {len(socios)} sócios.")
         except Exception as e:
             print(f"Erro ao buscar sócios: {e}")
             socios = []
         
+        # Empresas das quais esta é sócia (índice de sócios pessoa jurídica)
+        try:
+            participacoes = [
+                Participacao(cnpj_participacao, nome_participacao)
+                for cnpj_participacao, ((nome_participacao, _), _)
+                in motor.empresas_lote(motor.participacoes(cnpj_basico)).items()
+            ]
+        except Exception as e:
+            print(f"Erro ao buscar participações: {e}")
+            participacoes = []
+        
+        # Grupo econômico (empresas ligadas por sócios em comum), calculado na carga
+        try:
+            grupo_economico = motor.grupo_economico(cnpj_basico)
+        except Exception as e:
+            print(f"Erro ao buscar grupo econômico: {e}")
+            grupo_economico = None
+        
         # IMPORTANTE: Verificar se empresa está ativa antes de retornar
-        situacao = empresa.get("situacao_cadastral", "")
-        situacao_desc = empresa.get("situacao_descricao", "DESCONHECIDA")
+        situacao = empresa.situacao_cadastral
+        situacao_desc = empresa.situacao_descricao
         
         # Formatar resultado enfatizando situação e sócios (conforme feedback)
         resultado = {
             "cnpj": cnpj,
             "cnpj_basico": cnpj_basico,
-            "nome_empresa": empresa.get("nome_empresa", "NOME NÃO DISPONÍVEL"),
+            "nome_empresa": empresa.nome_empresa,
             "situacao": situacao,
             "situacao_descricao": situacao_desc,
             "esta_ativa": situacao == "2" or situacao_desc == "ATIVA",
-            "endereco": empresa.get("endereco", "ENDEREÇO NÃO DISPONÍVEL"),
-            "bairro": empresa.get("bairro", ""),
-            "uf": empresa.get("uf", ""),
-            "cnae_principal": empresa.get("cnae_principal", ""),
-            "socios": socios
+            "endereco": empresa.endereco,
+            "bairro": empresa.bairro,
+            "uf": empresa.uf,
+            "cnae_principal": empresa.cnae_principal,
+            "cnae_descricao": empresa.cnae_descricao,
+            "municipio": empresa.municipio,
+            "qtd_estabelecimentos": qtd_estabelecimentos,
+            "socios": socios,
+            "participacoes": participacoes,
+            "grupo_economico": grupo_economico
         }
         
         return resultado
@@ -533,10 +737,143 @@ def verificar_cnpj_direto(db_path, cnpj, debug=False):
         }
     
     finally:
-        conn.close()
+        if proprio:
+            motor.fechar()
+
+# Motor de cada processo worker, criado uma vez por processo
+_motor_worker = None
+
+def _iniciar_worker(engine, db_path):
+    global _motor_worker
+    _motor_worker = criar_motor(engine, db_path)
+
+def _consultar_socios(db_path, socios, limiar, debug, motor, inicio=0, total=None):
+    """Consulta uma lista de sócios com o mesmo motor"""
+    if len(socios) >= LIMIAR_JUNCAO:
+        # Lista grande: uma junção com a base no lugar de uma consulta por sócio
+        motor.preparar_socios({extrair_miolo_cpf(s['cpf']) for s in socios})
+    
+    resultados = []
+    for i, socio in enumerate(socios):
+        print(f"\nConsultando sócio {inicio+i+1}/{total or len(socios)}: {socio['nome']}")
+        resultados.append(consulta_socio_direta(db_path, socio['nome'], socio['cpf'], limiar, debug, motor))
+    return resultados
+
+def _miolo_varrivel(miolo):
+    """Se o miolo está no índice por miolo (6 dígitos, não sentinela) e pode vir da varredura em ordem"""
+    return len(miolo) == 6 and miolo.isdigit() and miolo not in MIOLOS_SENTINELA
+
+def _consultar_socios_ordenados(db_path, socios, limiar, debug, motor, inicio=0, total=None):
+    """
+    Consulta uma lista de sócios já ordenada por miolo com uma junção por
+    intercalação (merge join): o índice por miolo é lido uma vez, em ordem, da
+    faixa de miolos do bloco, e cada balde lido vai para o cache do motor antes
+    das consultas dos sócios com aquele miolo (e sai logo depois). A escolha do
+    candidato é a mesma de consulta_socio_direta.
+    """
+    miolos = [extrair_miolo_cpf(s['cpf']) for s in socios]
+    varriveis = [m for m in miolos if _miolo_varrivel(m)]
+    varredura = motor.varrer_socios(varriveis[0], varriveis[-1], set(varriveis)) if varriveis else iter(())
+    proximo = next(varredura, None)
+    
+    resultados = []
+    for i, (socio, miolo) in enumerate(zip(socios, miolos)):
+        if _miolo_varrivel(miolo):
+            # Avança a varredura até o miolo da entrada (os dois lados em ordem)
+            while proximo is not None and proximo[0] < miolo:
+                proximo = next(varredura, None)
+            motor.guardar_balde(miolo, proximo[1] if proximo is not None and proximo[0] == miolo else [])
+        print(f"\nConsultando sócio {inicio+i+1}/{total or len(socios)}: {socio['nome']}")
+        resultados.append(consulta_socio_direta(db_path, socio['nome'], socio['cpf'], limiar, debug, motor))
+        if _miolo_varrivel(miolo) and (i + 1 == len(miolos) or miolos[i + 1] != miolo):
+            motor.descartar_balde(miolo)
+    return resultados
+
+def _ordenar_por_miolo(miolos):
+    """
+    Posições da entrada em ordem de miolo (no empate, a ordem do arquivo: o sort
+    é estável). Ordenação na memória: a lista de sócios já está inteira na
+    memória (lida do arquivo), e a ordem e a lista reordenada só guardam posições
+    e referências aos mesmos dicts; uma ordenação externa não reduziria o pico.
+    O ganho do sort-merge está no banco, lido em ordem.
+    """
+    return sorted(range(len(miolos)), key=lambda posicao: miolos[posicao] or '')
+
+def _usar_sort_merge(db_path, quantidade, razao):
+    """Se a entrada é grande o bastante, perto dos sócios do índice por miolo, para a varredura em ordem"""
+    motor = MotorSQLite(db_path)
+    try:
+        total = motor.miolo_corrigido() and motor.total_socios_pf()
+    finally:
+        motor.fechar()
+    return bool(total) and quantidade >= razao * total
+
+def _verificar_cnpjs(db_path, cnpjs, debug, motor, inicio=0, total=None):
+    """Verifica uma lista de CNPJs com o mesmo motor"""
+    if len(cnpjs) >= LIMIAR_JUNCAO:
+        # Lista grande: uma junção com a base no lugar de uma consulta por CNPJ
+        motor.preparar_cnpjs({cnpj[:8] for cnpj in cnpjs})
+    
+    resultados = []
+    for i, cnpj in enumerate(cnpjs):
+        print(f"\nVerificando CNPJ {inicio+i+1}/{total or len(cnpjs)}: {cnpj}")
+        resultados.append(verificar_cnpj_direto(db_path, cnpj, debug, motor))
+    return resultados
+
+def _executar_bloco(tarefa):
+    """
+    Executa um bloco da lista no motor do processo worker; devolve os
+    resultados e os contadores da cascata do bloco
+    """
+    funcao, db_path, bloco, argumentos, inicio, total = tarefa
+    ESTATISTICAS_CASCATA.clear()
+    return funcao(db_path, bloco, *argumentos, _motor_worker, inicio, total), dict(ESTATISTICAS_CASCATA)
+
+def _executar_em_lote(funcao, db_path, itens, argumentos, engine, workers):
+    """
+    Executa funcao(db_path, itens, *argumentos, motor) com um único motor, ou
+    dividida em blocos entre `workers` processos (um motor por processo).
+    Com engine='memoria' os processos mapeiam o mesmo índice (.npy via mmap),
+    então a memória do índice não se multiplica pelo número de workers.
+    """
+    if workers <= 1 or len(itens) < 2:
+        motor = criar_motor(engine, db_path)
+        try:
+            return funcao(db_path, itens, *argumentos, motor)
+        finally:
+            motor.fechar()
+    
+    if engine == 'memoria':
+        # Constrói o índice uma vez aqui, antes de os workers o abrirem
+        from indice_memoria import IndiceMemoria
+        IndiceMemoria.carregar(db_path)
+    
+    tamanho = max(1, -(-len(itens) // (workers * 4)))
+    tarefas = [
+        (funcao, db_path, itens[i:i + tamanho], argumentos, i, len(itens))
+        for i in range(0, len(itens), tamanho)
+    ]
+    resultados = []
+    with multiprocessing.Pool(workers, initializer=_iniciar_worker, initargs=(engine, db_path)) as pool:
+        for parcial, estatisticas in pool.imap(_executar_bloco, tarefas):
+            resultados.extend(parcial)
+            ESTATISTICAS_CASCATA.update(estatisticas)
+    return resultados
 
-def processar_arquivo_socios(db_path, arquivo, limiar=0.7, debug=False):
-    """Processa um arquivo com lista de sócios (nome e CPF)"""
+def processar_arquivo_socios(db_path, arquivo, limiar=0.7, debug=False, engine='sqlite', workers=1,
+                             razao_sort_merge=RAZAO_SORT_MERGE):
+    """
+    Processa um arquivo com lista de sócios (nome e CPF).
+    db_path é o banco SQLite ou, com engine='duckdb', também um diretório
+    exportado por exportar_parquet.py. Com workers > 1 a lista é dividida
+    entre processos.
+    
+    No SQLite, se a lista tem pelo menos `razao_sort_merge` vezes o número de
+    sócios pessoa física da base, ela é ordenada por miolo e cruzada com uma
+    leitura em ordem do índice por miolo (_consultar_socios_ordenados) no lugar
+    das buscas aleatórias no índice, uma por linha. Com workers > 1 cada processo
+    varre a faixa de miolos do seu bloco.
+    """
     print(f"Processando arquivo de sócios: {arquivo}")
     
     if not os.path.exists(arquivo):
@@ -613,12 +950,20 @@ def processar_arquivo_socios(db_path, arquivo, limiar=0.7, debug=False):
     
     print(f"Encontrados {len(socios)} sócios no arquivo")
     
-    # Consultar cada sócio
-    resultados = []
-    for i, socio in enumerate(socios):
-        print(f"\nConsultando sócio {i+1}/{len(socios)}: {socio['nome']}")
-        resultado = consulta_socio_direta(db_path, socio['nome'], socio['cpf'], limiar, debug)
-        resultados.append(resultado)
+    # Consultar cada sócio (uma única conexão por processo para o arquivo todo)
+    ESTATISTICAS_CASCATA.clear()
+    if engine == 'sqlite' and _usar_sort_merge(db_path, len(socios), razao_sort_merge):
+        print("Lista grande para a base: ordenando por miolo para a varredura em ordem (sort-merge)")
+        ordem = _ordenar_por_miolo([extrair_miolo_cpf(s['cpf']) for s in socios])
+        ordenados = _executar_em_lote(_consultar_socios_ordenados, db_path, [socios[i] for i in ordem],
+                                      (limiar, debug), engine, workers)
+        resultados = [None] * len(socios)
+        for posicao, resultado in zip(ordem, ordenados):
+            resultados[posicao] = resultado
+    else:
+        resultados = _executar_em_lote(_consultar_socios, db_path, socios, (limiar, debug), engine, workers)
+    resultados = [resultado_para_json(r) for r in resultados]
+    print(f"\n{resumo_cascata()}")
     
     # Salvar resultados em JSON
     nome_saida = os.path.splitext(arquivo)[0] + "_resultados.json"
@@ -650,8 +995,13 @@ def processar_arquivo_socios(db_path, arquivo, limiar=0.7, debug=False):
     
     return resultados
 
-def processar_arquivo_cnpjs(db_path, arquivo, debug=False):
-    """Processa um arquivo com lista de CNPJs"""
+def processar_arquivo_cnpjs(db_path, arquivo, debug=False, engine='sqlite', workers=1):
+    """
+    Processa um arquivo com lista de CNPJs.
+    db_path é o banco SQLite ou, com engine='duckdb', também um diretório
+    exportado por exportar_parquet.py. Com workers > 1 a lista é dividida
+    entre processos.
+    """
     print(f"Processando arquivo de CNPJs: {arquivo}")
     
     if not os.path.exists(arquivo):
@@ -702,12 +1052,9 @@ def processar_arquivo_cnpjs(db_path, arquivo, debug=False):
     
     print(f"Encontrados {len(cnpjs)} CNPJs válidos no arquivo")
     
-    # Consultar cada CNPJ
-    resultados = []
-    for i, cnpj in enumerate(cnpjs):
-        print(f"\nVerificando CNPJ {i+1}/{len(cnpjs)}: {cnpj}")
-        resultado = verificar_cnpj_direto(db_path, cnpj, debug)
-        resultados.append(resultado)
+    # Consultar cada CNPJ (uma única conexão por processo para o arquivo todo)
+    resultados = _executar_em_lote(_verificar_cnpjs, db_path, cnpjs, (debug,), engine, workers)
+    resultados = [resultado_para_json(r) for r in resultados]
     
     # Salvar resultados em JSON
     nome_saida = os.path.splitext(arquivo)[0] + "_resultados.json"
@@ -726,7 +1073,10 @@ def processar_arquivo_cnpjs(db_path, arquivo, debug=False):
                 'situacao': r.get('situacao_descricao', r.get('status', '')),
                 'esta_ativa': "SIM" if r.get('esta_ativa', False) else "NÃO",
                 'qtd_socios': len(r.get('socios', [])),
-                'socios': ', '.join([str(s.get('nome', 'N/A')) for s in r.get('socios', [])])
+                'socios': ', '.join([str(s.get('nome', 'N/A')) for s in r.get('socios', [])]),
+                'qtd_participacoes': len(r.get('participacoes', [])),
+                'grupo_id': (r.get('grupo_economico') or {}).get('grupo_id', ''),
+                'empresas_grupo': (r.get('grupo_economico') or {}).get('empresas', '')
             }
             for r in resultados
         ])
@@ -776,7 +1126,7 @@ def download_arquivo(url, output_path, attempt=1, max_attempts=3):
                 bar.update(size)
         
         return True
-        
+    
     except requests.exceptions.RequestException as e:
         if attempt < max_attempts:
             print(f"Erro ao baixar {url}: {e}. Tentativa {attempt} de {max_attempts}")
@@ -789,154 +1139,15 @@ def download_arquivo(url, output_path, attempt=1, max_attempts=3):
         return False
 
 def gerar_script_download_base():
-    """Gera um script para download da base completa da Receita Federal"""
-    script = """#!/usr/bin/env python3
-# download_base_completa.py - Script para baixar a base completa da Receita Federal
-import os
-import requests
-import sys
-from tqdm import tqdm
-import concurrent.futures
-import argparse
-
-def download_file(url, output_path, attempt=1, max_attempts=3):
-    """
-    Baixa um arquivo da URL especificada para o caminho de saída
-    com barra de progresso e suporte a retentativas
-    """
-    if os.path.exists(output_path):
-        file_size = os.path.getsize(output_path)
-        print(f"Arquivo já existe: {output_path} ({file_size/1024/1024:.1f} MB)")
-        return True
-    
-    try:
-        # Cria o diretório de saída se não existir
-        os.makedirs(os.path.dirname(output_path), exist_ok=True)
-        
-        # Faz a requisição com streaming
-        response = requests.get(url, stream=True, timeout=30)
-        response.raise_for_status()
-        
-        # Obtém o tamanho total do arquivo
-        total_size = int(response.headers.get('content-length', 0))
-        
-        # Baixa o arquivo com barra de progresso
-        with open(output_path, 'wb') as f, tqdm(
-                desc=os.path.basename(output_path),
-                total=total_size,
-                unit='B',
-                unit_scale=True,
-                unit_divisor=1024,
-            ) as bar:
-            for chunk in response.iter_content(chunk_size=8192):
-                size = f.write(chunk)
-                bar.update(size)
-        
-        return True
-        
-    except requests.exceptions.RequestException as e:
-        if attempt < max_attempts:
-            print(f"Erro ao baixar {url}: {e}. Tentativa {attempt} de {max_attempts}")
-            return download_file(url, output_path, attempt + 1, max_attempts)
-        else:
-            print(f"Erro ao baixar {url} após {max_attempts} tentativas: {e}")
-            return False
-    except Exception as e:
-        print(f"Erro inesperado ao baixar {url}: {e}")
-        return False
-
-def baixar_base_completa(output_dir, num_workers=3, socios_only=False):
     """
-    Baixa a base completa da Receita Federal
+    Retorna o código do script de download da base completa.
     
-    Args:
-        output_dir (str): Diretório de saída
-        num_workers (int): Número de workers para download paralelo
-        socios_only (bool): Se True, baixa apenas os arquivos de sócios
+    O script é lido de download_base_completa.py (downloader com faixas de
+    bytes paralelas e retomada), em vez de manter uma cópia desatualizada aqui.
     """
-    # URL base da Receita Federal
-    base_url = "https://dadosabertos.rfb.gov.br/CNPJ/"
-    
-    # Criar diretório de saída
-    os.makedirs(output_dir, exist_ok=True)
-    
-    # Construir URLs para os arquivos
-    arquivos = []
-    
-    # Arquivos de empresas (10 arquivos)
-    if not socios_only:
-        for i in range(10):
-            arquivos.append({
-                'url': f"{base_url}/Empresas{i}.zip",
-                'output': os.path.join(output_dir, f"empresas{i}.zip")
-            })
-    
-    # Arquivos de estabelecimentos (10 arquivos)
-    if not socios_only:
-        for i in range(10):
-            arquivos.append({
-                'url': f"{base_url}/Estabelecimentos{i}.zip",
-                'output': os.path.join(output_dir, f"estabelecimentos{i}.zip")
-            })
-    
-    # Arquivos de sócios (9 arquivos)
-    for i in range(9):
-        arquivos.append({
-            'url': f"{base_url}/Socios{i}.zip",
-            'output': os.path.join(output_dir, f"socios{i}.zip")
-        })
-    
-    # Arquivos de tabelas auxiliares
-    arquivos_aux = [
-        {'url': f"{base_url}/Cnaes.zip", 'output': os.path.join(output_dir, "cnaes.zip")},
-        {'url': f"{base_url}/Motivos.zip", 'output': os.path.join(output_dir, "motivos.zip")},
-        {'url': f"{base_url}/Municipios.zip", 'output': os.path.join(output_dir, "municipios.zip")},
-        {'url': f"{base_url}/Naturezas.zip", 'output': os.path.join(output_dir, "naturezas.zip")},
-        {'url': f"{base_url}/Paises.zip", 'output': os.path.join(output_dir, "paises.zip")},
-        {'url': f"{base_url}/Qualificacoes.zip", 'output': os.path.join(output_dir, "qualificacoes.zip")},
-    ]
-    
-    if not socios_only:
-        arquivos.extend(arquivos_aux)
-    
-    # Download paralelo
-    print(f"Iniciando download de {len(arquivos)} arquivos com {num_workers} workers")
-    sucessos = 0
-    falhas = 0
-    
-    with concurrent.futures.ThreadPoolExecutor(max_workers=num_workers) as executor:
-        futures = {}
-        
-        for arquivo in arquivos:
-            future = executor.submit(download_file, arquivo['url'], arquivo['output'])
-            futures[future] = arquivo
-        
-        for future in concurrent.futures.as_completed(futures):
-            arquivo = futures[future]
-            try:
-                if future.result():
-                    sucessos += 1
-                else:
-                    falhas += 1
-            except Exception as e:
-                print(f"Erro ao baixar {arquivo['url']}: {e}")
-                falhas += 1
-    
-    print(f"Download concluído: {sucessos} sucessos, {falhas} falhas")
-
-if __name__ == "__main__":
-    parser = argparse.ArgumentParser(description="Download da base completa da Receita Federal")
-    parser.add_argument("--dir", type=str, default="base_completa", help="Diretório de saída")
-    parser.add_argument("--workers", type=int, default=3, help="Número de workers para download paralelo")
-    parser.add_argument("--socios-only", action="store_true", help="Baixar apenas os arquivos de sócios")
-    
-    args = parser.parse_args()
-    
-    print(f"Iniciando download da base {'completa' if not args.socios_only else 'de sócios'}")
-    baixar_base_completa(args.dir, args.workers, args.socios_only)
-"""
-    
-    return script
+    caminho = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'download_base_completa.py')
+    with open(caminho, 'r', encoding='utf-8') as f:
+        return f.read()
 
 def main():
     parser = argparse.ArgumentParser(description='Consulta de sócios/CNPJs no banco de dados CNPJ')
@@ -949,19 +1160,36 @@ def main():
     parser_socio.add_argument('--cpf', type=str, help='CPF do sócio')
     parser_socio.add_argument('--arquivo', type=str, help='Arquivo com lista de sócios (CSV ou TXT)')
     parser_socio.add_argument('--limiar', type=float, default=0.7, help='Limiar de similaridade (0.0-1.0)')
+    parser_socio.add_argument('--limite', type=int, default=10,
+                             help='Número de candidatos na busca só por nome (--nome sem --cpf)')
     parser_socio.add_argument('--banco', type=str, default='cnpj_amostra.db', help='Caminho para o banco de dados')
     parser_socio.add_argument('--debug', action='store_true', help='Modo debug com informações detalhadas')
+    parser_socio.add_argument('--workers', type=int, default=1,
+                              help='Processos em paralelo no processamento de arquivo')
+    parser_socio.add_argument('--razao-sort-merge', type=float, default=RAZAO_SORT_MERGE,
+                              help='Com engine sqlite, tamanho do arquivo (fração dos sócios da base) a partir do '
+                                   'qual ele é ordenado por miolo e cruzado com uma leitura em ordem do índice '
+                                   '(0 = sempre)')
+    parser_socio.add_argument('--engine', type=str, choices=['sqlite', 'duckdb', 'memoria'], default='sqlite',
+                              help='Backend de consulta (duckdb aceita o banco SQLite ou um diretório Parquet; '
+                                   'memoria carrega o índice de sócios em NumPy)')
     
     # Subcomando para verificação de CNPJ
     parser_cnpj = subparsers.add_parser('cnpj', help='Verificar CNPJ e seus sócios')
     parser_cnpj.add_argument('--cnpj', type=str, help='CNPJ a verificar')
     parser_cnpj.add_argument('--arquivo', type=str, help='Arquivo com lista de CNPJs (CSV ou TXT)')
+    parser_cnpj.add_argument('--nome', type=str, help='Começo da razão social ou do nome fantasia (autocompletar)')
+    parser_cnpj.add_argument('--limite', type=int, default=LIMITE_SUGESTOES, help='Número de empresas sugeridas com --nome')
     parser_cnpj.add_argument('--banco', type=str, default='cnpj_amostra.db', help='Caminho para o banco de dados')
     parser_cnpj.add_argument('--debug', action='store_true', help='Modo debug com informações detalhadas')
+    parser_cnpj.add_argument('--workers', type=int, default=1,
+                             help='Processos em paralelo no processamento de arquivo')
+    parser_cnpj.add_argument('--engine', type=str, choices=['sqlite', 'duckdb', 'memoria'], default='sqlite',
+                             help='Backend de consulta (duckdb aceita o banco SQLite ou um diretório Parquet)')
     
     # Subcomando para gerar script de download
     parser_download = subparsers.add_parser('download', help='Gerar script para baixar base completa')
-    parser_download.add_argument('--output', type=str, default='download_base_completa.py', 
+    parser_download.add_argument('--output', type=str, default='download_base_completa.py',
                              help='Arquivo de saída para o script de download')
     
     args = parser.parse_args()
@@ -969,10 +1197,16 @@ def main():
     if args.comando == 'socio':
         if args.arquivo:
             # Processar arquivo com múltiplos sócios
-            processar_arquivo_socios(args.banco, args.arquivo, args.limiar, args.debug)
+            processar_arquivo_socios(args.banco, args.arquivo, args.limiar, args.debug, args.engine, args.workers,
+                                     args.razao_sort_merge)
         elif args.nome and args.cpf:
             # Consultar um único sócio
-            resultado = consulta_socio_direta(args.banco, args.nome, args.cpf, args.limiar, args.debug)
+            motor = criar_motor(args.engine, args.banco)
+            try:
+                resultado = resultado_para_json(
+                    consulta_socio_direta(args.banco, args.nome, args.cpf, args.limiar, args.debug, motor))
+            finally:
+                motor.fechar()
             
             print("\nRESULTADO DA CONSULTA:")
             print("-" * 60)
@@ -992,16 +1226,49 @@ def main():
                     for key, value in empresa.items():
                         if key not in ['nome_empresa', 'situacao_descricao']:
                             print(f"  {key}: {value}")
+        elif args.nome:
+            # Sem CPF: busca pelo índice de nomes
+            motor = criar_motor(args.engine, args.banco)
+            try:
+                resultado = resultado_para_json(
+                    consulta_socio_por_nome(args.banco, args.nome, args.limite, args.limiar, args.debug, motor))
+            finally:
+                motor.fechar()
+            
+            print("\nRESULTADO DA CONSULTA:")
+            print("-" * 60)
+            print(f"status: {resultado['status']}")
+            for i, candidato in enumerate(resultado['candidatos']):
+                print(f"  {i+1}. {candidato['nome']} - CPF: {candidato['cpf']} - Score: {candidato['score']:.2f} "
+                      f"- Empresas: {', '.join(candidato['cnpjs_basicos'])}")
         else:
             parser_socio.print_help()
     
     elif args.comando == 'cnpj':
         if args.arquivo:
             # Processar arquivo com múltiplos CNPJs
-            processar_arquivo_cnpjs(args.banco, args.arquivo, args.debug)
+            processar_arquivo_cnpjs(args.banco, args.arquivo, args.debug, args.engine, args.workers)
+        elif args.nome:
+            # Autocompletar pelo começo do nome
+            motor = criar_motor(args.engine, args.banco)
+            try:
+                sugestoes = sugerir_empresas(args.banco, args.nome, args.limite, motor)
+            finally:
+                motor.fechar()
+            
+            if sugestoes is None:
+                print("O banco não tem o índice de nomes de empresas (rode carregar_base.py --apenas-indices)")
+            else:
+                print(f"{len(sugestoes)} empresas começando com '{args.nome}':")
+                for sugestao in sugestoes:
+                    print(f"  {sugestao.cnpj_basico}  {sugestao.nome:<60}  {sugestao.situacao_descricao or ''}")
         elif args.cnpj:
             # Verificar um único CNPJ
-            resultado = verificar_cnpj_direto(args.banco, args.cnpj, args.debug)
+            motor = criar_motor(args.engine, args.banco)
+            try:
+                resultado = resultado_para_json(verificar_cnpj_direto(args.banco, args.cnpj, args.debug, motor))
+            finally:
+                motor.fechar()
             
             print("\nRESULTADO DA CONSULTA:")
             print("-" * 60)
@@ -1019,7 +1286,8 @@ def main():
             # Mostrar outros campos
             print("\nDados adicionais:")
             for key, value in resultado.items():
-                if key not in ['socios', 'nome_empresa', 'situacao_descricao', 'esta_ativa']:
+                if key not in ['socios', 'participacoes', 'grupo_economico', 'nome_empresa', 'situacao_descricao',
+                               'esta_ativa']:
                     print(f"  {key}: {value}")
             
             # Mostrar sócios (prioridade alta para esta consulta)
@@ -1029,6 +1297,15 @@ def main():
                     print(f"  {i+1}. {socio.get('nome')} - CPF: {socio.get('cpf')}")
             else:
                 print("\nNenhum sócio encontrado para este CNPJ.")
+            
+            if resultado.get('participacoes'):
+                print("\nSÓCIA DE:")
+                for i, participacao in enumerate(resultado['participacoes']):
+                    print(f"  {i+1}. {participacao['cnpj_basico']} - {participacao['nome_empresa']}")
+            
+            if resultado.get('grupo_economico'):
+                grupo = resultado['grupo_economico']
+                print(f"\nGRUPO ECONÔMICO: {grupo['grupo_id']:08d} ({grupo['empresas']} empresas ligadas por sócios)")
         else:
             parser_cnpj.print_help()
     
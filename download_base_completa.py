@@ -1,141 +1,582 @@
 #!/usr/bin/env python3
 # download_base_completa.py - Script para baixar a base completa da Receita Federal
 import os
+import re
 import requests
 import sys
+import json
+import time
+import asyncio
+import threading
+from collections import deque
+from datetime import datetime
+from urllib.parse import urljoin
 from tqdm import tqdm
 import concurrent.futures
 import argparse
 
-def download_file(url, output_path, attempt=1, max_attempts=3):
-    """Baixa um arquivo da URL para o caminho especificado com barra de progresso"""
-    if os.path.exists(output_path):
-        file_size = os.path.getsize(output_path)
-        print(f"Arquivo já existe: {output_path} ({file_size/1024/1024:.1f} MB)")
-        return True
-    
+# Raiz dos dados abertos do CNPJ (um diretório por mês, ex.: 2025-05/)
+URL_BASE = "https://arquivos.receitafederal.gov.br/dados/cnpj/dados_abertos_cnpj/"
+
+# Checkpoint compartilhado com as execuções anteriores
+CAMINHO_CHECKPOINT = "download_checkpoint.json"
+
+# Tamanho de cada leitura da resposta HTTP (1 MB)
+TAMANHO_BLOCO = 1024 * 1024
+
+# Arquivos menores que isso não compensam ser divididos em partes
+TAMANHO_MINIMO_PARTE = 32 * 1024 * 1024
+
+# Intervalo (em bytes) entre gravações do estado de retomada
+INTERVALO_ESTADO = 16 * 1024 * 1024
+
+class ArquivoAlteradoError(Exception):
+    """O arquivo remoto mudou (ETag/tamanho) durante o download"""
+
+class RespostaVaziaError(requests.exceptions.RequestException):
+    """O servidor respondeu à faixa sem erro, mas não mandou nenhum byte dela"""
+
+def obter_metadados(url, timeout=30):
+    """
+    Consulta o servidor com um GET de 1 byte (Range: bytes=0-0) para descobrir
+    tamanho, ETag e suporte a download por faixas. HEAD não é confiável
+    nos espelhos do governo, por isso usamos o GET parcial.
+    """
+    response = requests.get(url, headers={'Range': 'bytes=0-0'}, stream=True, timeout=timeout)
     try:
-        # Cria o diretório de saída se não existir
-        os.makedirs(os.path.dirname(output_path), exist_ok=True)
-        
-        # Faz a requisição com streaming
-        response = requests.get(url, stream=True, timeout=30)
         response.raise_for_status()
         
-        # Obtém o tamanho total do arquivo
-        total_size = int(response.headers.get('content-length', 0))
+        aceita_range = response.status_code == 206
+        tamanho = 0
         
-        # Baixa o arquivo com barra de progresso
-        with open(output_path, 'wb') as f, tqdm(
-                desc=os.path.basename(output_path),
-                total=total_size,
-                unit='B',
-                unit_scale=True,
-                unit_divisor=1024,
-            ) as bar:
-            for chunk in response.iter_content(chunk_size=8192):
-                size = f.write(chunk)
-                bar.update(size)
+        if aceita_range:
+            # Content-Range: bytes 0-0/123456
+            content_range = response.headers.get('content-range', '')
+            if '/' in content_range and not content_range.endswith('*'):
+                tamanho = int(content_range.rsplit('/', 1)[1])
+            else:
+                aceita_range = False
+        
+        if not tamanho:
+            tamanho = int(response.headers.get('content-length', 0))
+        
+        return {
+            'url': response.url,
+            'tamanho': tamanho,
+            'etag': response.headers.get('etag'),
+            'aceita_range': aceita_range
+        }
+    finally:
+        response.close()
+
+def _dividir_partes(tamanho, num_partes):
+    """Divide o arquivo em faixas de bytes [inicio, fim] (inclusivo)"""
+    num_partes = max(1, min(num_partes, tamanho // TAMANHO_MINIMO_PARTE))
+    tamanho_parte = -(-tamanho // num_partes)  # Divisão arredondada para cima
+    
+    partes = []
+    for inicio in range(0, tamanho, tamanho_parte):
+        partes.append({
+            'inicio': inicio,
+            'fim': min(inicio + tamanho_parte, tamanho) - 1,
+            'baixado': 0
+        })
+    return partes
+
+def _carregar_estado(caminho_estado, caminho_parcial, metadados):
+    """
+    Carrega o estado de um download interrompido, desde que o arquivo remoto
+    ainda seja o mesmo (mesmo tamanho e ETag) e o arquivo parcial exista
+    """
+    if not os.path.exists(caminho_estado) or not os.path.exists(caminho_parcial):
+        return None
+    
+    try:
+        with open(caminho_estado, 'r') as f:
+            estado = json.load(f)
+    except (OSError, ValueError):
+        return None
+    
+    if estado.get('tamanho') != metadados['tamanho'] or estado.get('etag') != metadados['etag']:
+        print(f"Arquivo remoto mudou desde o download parcial, reiniciando: {os.path.basename(caminho_parcial)}")
+        return None
+    
+    if os.path.getsize(caminho_parcial) != metadados['tamanho']:
+        return None
+    
+    return estado
+
+def _salvar_estado(caminho_estado, estado, indent=None):
+    """Grava o estado de forma atômica (arquivo temporário + rename)"""
+    temporario = caminho_estado + '.tmp'
+    with open(temporario, 'w') as f:
+        json.dump(estado, f, indent=indent)
+    os.replace(temporario, caminho_estado)
+
+def _pre_alocar(caminho, tamanho):
+    """Cria o arquivo parcial já com o tamanho final"""
+    with open(caminho, 'wb') as f:
+        if tamanho and hasattr(os, 'posix_fallocate'):
+            os.posix_fallocate(f.fileno(), 0, tamanho)
+        else:
+            f.truncate(tamanho)
+
+def _baixar_parte(url, caminho_parcial, parte, estado, caminho_estado, lock, bar, max_attempts,
+                  progresso=None, ao_erro=None):
+    """Baixa uma faixa de bytes, retomando do ponto em que parou em caso de falha"""
+    attempt = 0
+    
+    while parte['inicio'] + parte['baixado'] <= parte['fim']:
+        inicio = parte['inicio'] + parte['baixado']
+        headers = {'Range': f"bytes={inicio}-{parte['fim']}"}
+        if estado.get('etag'):
+            # Se o arquivo mudou, o servidor responde 200 com o arquivo inteiro
+            headers['If-Range'] = estado['etag']
         
-        return True
+        try:
+            with requests.get(url, headers=headers, stream=True, timeout=(15, 60)) as response:
+                response.raise_for_status()
+                
+                if response.status_code != 206:
+                    raise ArquivoAlteradoError(f"Servidor ignorou a faixa {inicio}-{parte['fim']} (HTTP {response.status_code})")
+                
+                # Sem buffer: o estado gravado nunca aponta para bytes que ainda não chegaram ao SO
+                desde_ultimo_estado = 0
+                with open(caminho_parcial, 'r+b', buffering=0) as f:
+                    f.seek(inicio)
+                    for chunk in response.iter_content(chunk_size=TAMANHO_BLOCO):
+                        # Nunca escrever além do fim da faixa
+                        restante = parte['fim'] + 1 - (parte['inicio'] + parte['baixado'])
+                        chunk = chunk[:restante]
+                        f.write(chunk)
+                        parte['baixado'] += len(chunk)
+                        bar.update(len(chunk))
+                        if progresso:
+                            progresso(len(chunk))
+                        
+                        desde_ultimo_estado += len(chunk)
+                        if desde_ultimo_estado >= INTERVALO_ESTADO:
+                            with lock:
+                                _salvar_estado(caminho_estado, estado)
+                            desde_ultimo_estado = 0
+                
+                with lock:
+                    _salvar_estado(caminho_estado, estado)
         
-    except requests.exceptions.RequestException as e:
-        if attempt < max_attempts:
-            print(f"Erro ao baixar {url}: {e}. Tentativa {attempt} de {max_attempts}")
-            return download_file(url, output_path, attempt + 1, max_attempts)
+        except requests.exceptions.RequestException as e:
+            erro = e
         else:
-            print(f"Erro ao baixar {url} após {max_attempts} tentativas: {e}")
-            return False
-    except Exception as e:
-        print(f"Erro inesperado ao baixar {url}: {e}")
-        return False
+            # Resposta curta que avançou: pede o resto da faixa na hora.
+            # Sem avanço nenhum, conta como falha (senão o laço nunca termina)
+            if parte['inicio'] + parte['baixado'] > inicio:
+                continue
+            erro = RespostaVaziaError(f"Nenhum byte recebido na faixa {inicio}-{parte['fim']}")
+        
+        if ao_erro:
+            ao_erro(erro)
+        attempt += 1
+        if attempt >= max_attempts:
+            raise erro
+        espera = min(2 ** attempt, 60)
+        print(f"Erro na faixa {inicio}-{parte['fim']} de {os.path.basename(caminho_parcial)}: {erro}. "
+              f"Tentativa {attempt} de {max_attempts}, aguardando {espera}s")
+        time.sleep(espera)
+
+def _baixar_sem_range(url, caminho_parcial, bar, max_attempts, progresso=None, ao_erro=None):
+    """Download em fluxo único, para servidores sem suporte a Range"""
+    for attempt in range(1, max_attempts + 1):
+        try:
+            bar.reset()
+            with requests.get(url, stream=True, timeout=(15, 60)) as response:
+                response.raise_for_status()
+                with open(caminho_parcial, 'wb') as f:
+                    for chunk in response.iter_content(chunk_size=TAMANHO_BLOCO):
+                        f.write(chunk)
+                        bar.update(len(chunk))
+                        if progresso:
+                            progresso(len(chunk))
+            return
+        except requests.exceptions.RequestException as e:
+            if ao_erro:
+                ao_erro(e)
+            if attempt >= max_attempts:
+                raise
+            espera = min(2 ** attempt, 60)
+            print(f"Erro ao baixar {url}: {e}. Tentativa {attempt} de {max_attempts}, aguardando {espera}s")
+            time.sleep(espera)
 
-def baixar_base_completa(output_dir, num_workers=3, socios_only=False):
+def download_file(url, output_path, num_partes=8, max_attempts=5, progresso=None, ao_erro=None):
     """
-    Baixa a base completa da Receita Federal
+    Baixa um arquivo da URL para o caminho especificado.
     
-    Args:
-        output_dir (str): Diretório de saída
-        num_workers (int): Número de workers para download paralelo
-        socios_only (bool): Se True, baixa apenas os arquivos de sócios
+    Arquivos grandes são divididos em faixas de bytes baixadas em paralelo
+    sobre um arquivo pré-alocado (output_path + '.part'). O progresso de cada
+    faixa fica em output_path + '.estado.json', permitindo retomar um download
+    interrompido com Range. Ao final, tamanho e ETag são conferidos antes de
+    renomear para o caminho definitivo.
+    
+    progresso(n) é chamado a cada bloco recebido e ao_erro(e) a cada falha
+    de rede, para que o agendador possa medir vazão e erros do servidor.
     """
-    # URL base da Receita Federal
-    base_url = "https://dadosabertos.rfb.gov.br/CNPJ/"
+    os.makedirs(os.path.dirname(output_path) or '.', exist_ok=True)
     
-    # Criar diretório de saída
-    os.makedirs(output_dir, exist_ok=True)
+    caminho_parcial = output_path + '.part'
+    caminho_estado = output_path + '.estado.json'
     
-    # Construir URLs para os arquivos
-    arquivos = []
-    
-    # Arquivos de empresas (10 arquivos)
-    if not socios_only:
-        for i in range(10):
-            arquivos.append({
-                'url': f"{base_url}/Empresas{i}.zip",
-                'output': os.path.join(output_dir, f"empresas{i}.zip")
-            })
-    
-    # Arquivos de estabelecimentos (10 arquivos)
-    if not socios_only:
-        for i in range(10):
-            arquivos.append({
-                'url': f"{base_url}/Estabelecimentos{i}.zip",
-                'output': os.path.join(output_dir, f"estabelecimentos{i}.zip")
-            })
-    
-    # Arquivos de sócios (9 arquivos)
-    for i in range(9):
-        arquivos.append({
-            'url': f"{base_url}/Socios{i}.zip",
-            'output': os.path.join(output_dir, f"socios{i}.zip")
-        })
+    for reinicio in range(2):
+        try:
+            metadados = obter_metadados(url)
+        except requests.exceptions.RequestException as e:
+            if ao_erro:
+                ao_erro(e)
+            print(f"Erro ao consultar {url}: {e}")
+            return False
+        
+        tamanho = metadados['tamanho']
+        
+        # Um arquivo só é considerado completo se o tamanho bater com o remoto
+        if os.path.exists(output_path):
+            file_size = os.path.getsize(output_path)
+            if not tamanho or file_size == tamanho:
+                print(f"Arquivo já existe: {output_path} ({file_size/1024/1024:.1f} MB)")
+                return True
+            print(f"Arquivo incompleto ou desatualizado: {output_path} "
+                  f"({file_size/1024/1024:.1f} de {tamanho/1024/1024:.1f} MB), baixando novamente")
+            os.remove(output_path)
+        
+        try:
+            with tqdm(
+                    desc=os.path.basename(output_path),
+                    total=tamanho or None,
+                    unit='B',
+                    unit_scale=True,
+                    unit_divisor=1024,
+                ) as bar:
+                if metadados['aceita_range'] and tamanho:
+                    estado = _carregar_estado(caminho_estado, caminho_parcial, metadados)
+                    if estado is None:
+                        estado = {
+                            'url': url,
+                            'tamanho': tamanho,
+                            'etag': metadados['etag'],
+                            'partes': _dividir_partes(tamanho, num_partes)
+                        }
+                        _pre_alocar(caminho_parcial, tamanho)
+                        _salvar_estado(caminho_estado, estado)
+                    else:
+                        ja_baixado = sum(p['baixado'] for p in estado['partes'])
+                        print(f"Retomando {os.path.basename(output_path)} a partir de {ja_baixado/1024/1024:.1f} MB")
+                        bar.update(ja_baixado)
+                    
+                    lock = threading.Lock()
+                    with concurrent.futures.ThreadPoolExecutor(max_workers=len(estado['partes'])) as executor:
+                        futures = [
+                            executor.submit(_baixar_parte, metadados['url'], caminho_parcial, parte,
+                                            estado, caminho_estado, lock, bar, max_attempts,
+                                            progresso, ao_erro)
+                            for parte in estado['partes']
+                        ]
+                        for future in concurrent.futures.as_completed(futures):
+                            future.result()
+                    
+                    baixado = sum(p['baixado'] for p in estado['partes'])
+                    if baixado != tamanho or os.path.getsize(caminho_parcial) != tamanho:
+                        raise ArquivoAlteradoError(f"Tamanho divergente: {baixado} de {tamanho} bytes")
+                else:
+                    _baixar_sem_range(metadados['url'], caminho_parcial, bar, max_attempts, progresso, ao_erro)
+                    if tamanho and os.path.getsize(caminho_parcial) != tamanho:
+                        raise ArquivoAlteradoError(f"Tamanho divergente: {os.path.getsize(caminho_parcial)} de {tamanho} bytes")
+            
+            # Conferir se o arquivo remoto não mudou durante o download
+            if metadados['etag']:
+                etag_final = obter_metadados(url)['etag']
+                if etag_final != metadados['etag']:
+                    raise ArquivoAlteradoError(f"ETag mudou durante o download ({metadados['etag']} -> {etag_final})")
+            
+            os.replace(caminho_parcial, output_path)
+            if os.path.exists(caminho_estado):
+                os.remove(caminho_estado)
+            return True
+        
+        except ArquivoAlteradoError as e:
+            # Descartar o parcial e começar do zero uma única vez
+            print(f"Arquivo {url} mudou no servidor: {e}. Reiniciando download")
+            for caminho in (caminho_parcial, caminho_estado):
+                if os.path.exists(caminho):
+                    os.remove(caminho)
+        except requests.exceptions.RequestException as e:
+            # O estado fica gravado para a próxima execução retomar
+            print(f"Erro ao baixar {url} após {max_attempts} tentativas: {e}")
+            return False
+        except Exception as e:
+            print(f"Erro inesperado ao baixar {url}: {e}")
+            return False
     
-    # Arquivos de tabelas auxiliares
-    arquivos_aux = [
-        {'url': f"{base_url}/Cnaes.zip", 'output': os.path.join(output_dir, "cnaes.zip")},
-        {'url': f"{base_url}/Motivos.zip", 'output': os.path.join(output_dir, "motivos.zip")},
-        {'url': f"{base_url}/Municipios.zip", 'output': os.path.join(output_dir, "municipios.zip")},
-        {'url': f"{base_url}/Naturezas.zip", 'output': os.path.join(output_dir, "naturezas.zip")},
-        {'url': f"{base_url}/Paises.zip", 'output': os.path.join(output_dir, "paises.zip")},
-        {'url': f"{base_url}/Qualificacoes.zip", 'output': os.path.join(output_dir, "qualificacoes.zip")},
-    ]
+    print(f"Erro ao baixar {url}: arquivo remoto continua mudando")
+    return False
+
+class ControleConcorrencia:
+    """
+    Ajusta o número de downloads simultâneos (AIMD): sobe um a um enquanto
+    a vazão agregada continua crescendo, recua um passo quando ela cai e
+    corta pela metade quando o servidor começa a devolver erros.
+    """
     
-    if not socios_only:
-        arquivos.extend(arquivos_aux)
+    def __init__(self, inicial=3, minimo=1, maximo=12, janela=15.0):
+        self.limite = inicial
+        self.minimo = minimo
+        self.maximo = maximo
+        self.janela = janela
+        self.vazao_anterior = 0.0
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self._erros = 0
+        self._inicio = time.monotonic()
     
-    # Download paralelo
-    print(f"Iniciando download de {len(arquivos)} arquivos com {num_workers} workers")
-    sucessos = 0
-    falhas = 0
+    def registrar_bytes(self, n):
+        with self._lock:
+            self._bytes += n
     
-    with concurrent.futures.ThreadPoolExecutor(max_workers=num_workers) as executor:
-        futures = {}
+    def registrar_erro(self, erro=None):
+        with self._lock:
+            self._erros += 1
+    
+    def avaliar(self):
+        """Reavalia o limite ao fim de cada janela de medição"""
+        agora = time.monotonic()
+        with self._lock:
+            decorrido = agora - self._inicio
+            if decorrido < self.janela:
+                return self.limite
+            vazao = self._bytes / decorrido
+            erros = self._erros
+            self._bytes = 0
+            self._erros = 0
+            self._inicio = agora
+        
+        limite_anterior = self.limite
+        if erros:
+            self.limite = max(self.minimo, self.limite // 2)
+        elif vazao > self.vazao_anterior * 1.10:
+            self.limite = min(self.maximo, self.limite + 1)
+        elif vazao < self.vazao_anterior * 0.90:
+            self.limite = max(self.minimo, self.limite - 1)
         
-        for arquivo in arquivos:
-            future = executor.submit(download_file, arquivo['url'], arquivo['output'])
-            futures[future] = arquivo
+        if self.limite != limite_anterior:
+            print(f"Vazão {vazao/1024/1024:.1f} MB/s, {erros} erro(s): concorrência {limite_anterior} -> {self.limite}")
         
-        for future in concurrent.futures.as_completed(futures):
-            arquivo = futures[future]
+        self.vazao_anterior = vazao
+        return self.limite
+
+def _obter_pagina(url, timeout=30):
+    response = requests.get(url, timeout=timeout)
+    response.raise_for_status()
+    return response.text
+
+def descobrir_mes_atual(url_base=URL_BASE):
+    """Retorna a URL do diretório do mês mais recente (ex.: .../2025-05/)"""
+    meses = re.findall(r'href="(\d{4}-\d{2})/?"', _obter_pagina(url_base))
+    if not meses:
+        raise ValueError(f"Nenhum diretório mensal encontrado em {url_base}")
+    return urljoin(url_base, max(meses) + '/')
+
+def listar_arquivos_mes(url_mes):
+    """Lista os arquivos .zip publicados no índice do diretório do mês"""
+    nomes = re.findall(r'href="([^"/?]+\.zip)"', _obter_pagina(url_mes), flags=re.IGNORECASE)
+    # Remover duplicados mantendo a ordem do índice
+    return list(dict.fromkeys(nomes))
+
+def carregar_checkpoint(caminho_checkpoint):
+    """Carrega o checkpoint de download (mesmo formato de download_checkpoint.json)"""
+    checkpoint = {
+        'last_update': None,
+        'completed': [],
+        'in_progress': {},
+        'failed': {},
+        'total_files': 0,
+        'downloaded_files': 0,
+        'current_month_url': None
+    }
+    if os.path.exists(caminho_checkpoint):
+        try:
+            with open(caminho_checkpoint, 'r', encoding='utf-8') as f:
+                checkpoint.update(json.load(f))
+        except (OSError, ValueError) as e:
+            print(f"Checkpoint ilegível ({e}), começando do zero")
+    return checkpoint
+
+def salvar_checkpoint(caminho_checkpoint, checkpoint):
+    checkpoint['last_update'] = datetime.now().isoformat()
+    checkpoint['downloaded_files'] = len(checkpoint['completed'])
+    _salvar_estado(caminho_checkpoint, checkpoint, indent=2)
+
+async def _descobrir_tamanhos(url_mes, nomes, limite=8):
+    """Consulta o tamanho de cada arquivo em paralelo (para ordenar os maiores primeiro)"""
+    semaforo = asyncio.Semaphore(limite)
+    
+    async def tamanho(nome):
+        async with semaforo:
             try:
-                if future.result():
-                    sucessos += 1
+                metadados = await asyncio.to_thread(obter_metadados, urljoin(url_mes, nome))
+                return metadados['tamanho']
+            except requests.exceptions.RequestException as e:
+                print(f"Não foi possível obter o tamanho de {nome}: {e}")
+                return 0
+    
+    tamanhos = await asyncio.gather(*(tamanho(nome) for nome in nomes))
+    return dict(zip(nomes, tamanhos))
+
+async def _agendar_downloads(url_mes, arquivos, output_dir, checkpoint, caminho_checkpoint,
+                             controle, num_partes, max_rodadas=2, ao_concluir=None):
+    """
+    Executa os downloads respeitando o limite dinâmico de concorrência.
+    Arquivos que falham voltam ao fim da fila, até max_rodadas tentativas.
+    ao_concluir(caminho) é chamado assim que cada arquivo termina e é verificado.
+    """
+    loop = asyncio.get_running_loop()
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=controle.maximo)
+    pendentes = deque((nome, 1) for nome in arquivos)
+    em_andamento = {}
+    
+    try:
+        while pendentes or em_andamento:
+            while pendentes and len(em_andamento) < controle.limite:
+                nome, rodada = pendentes.popleft()
+                checkpoint['in_progress'][nome] = {
+                    'started': datetime.now().isoformat(),
+                    'attempt': rodada
+                }
+                salvar_checkpoint(caminho_checkpoint, checkpoint)
+                
+                future = loop.run_in_executor(
+                    executor, download_file, urljoin(url_mes, nome), os.path.join(output_dir, nome),
+                    num_partes, 5, controle.registrar_bytes, controle.registrar_erro
+                )
+                em_andamento[future] = (nome, rodada)
+            
+            concluidos, _ = await asyncio.wait(
+                em_andamento, timeout=controle.janela, return_when=asyncio.FIRST_COMPLETED
+            )
+            
+            for future in concluidos:
+                nome, rodada = em_andamento.pop(future)
+                checkpoint['in_progress'].pop(nome, None)
+                try:
+                    sucesso = future.result()
+                    erro = "download_file retornou falha"
+                except Exception as e:
+                    sucesso = False
+                    erro = str(e)
+                
+                if sucesso:
+                    if nome not in checkpoint['completed']:
+                        checkpoint['completed'].append(nome)
+                    checkpoint['failed'].pop(nome, None)
+                    print(f"Download de {nome} concluído ({len(checkpoint['completed'])}/{checkpoint['total_files']})")
+                    if ao_concluir:
+                        ao_concluir(os.path.join(output_dir, nome))
                 else:
-                    falhas += 1
-            except Exception as e:
-                print(f"Erro ao baixar {arquivo['url']}: {e}")
-                falhas += 1
+                    controle.registrar_erro()
+                    checkpoint['failed'][nome] = {'error': erro, 'attempts': rodada}
+                    if rodada < max_rodadas:
+                        pendentes.append((nome, rodada + 1))
+                    print(f"Falha no download de {nome} (rodada {rodada} de {max_rodadas}): {erro}")
+                
+                salvar_checkpoint(caminho_checkpoint, checkpoint)
+            
+            controle.avaliar()
+    finally:
+        executor.shutdown(wait=True)
+
+async def baixar_base_completa_async(output_dir, url_base=URL_BASE, socios_only=False, num_partes=8,
+                                     workers_iniciais=3, workers_max=12, caminho_checkpoint=CAMINHO_CHECKPOINT,
+                                     ao_concluir=None, url_mes=None):
+    """Descobre os arquivos do mês (o mais recente, se url_mes não for dado) e agenda os downloads (maiores primeiro)"""
+    os.makedirs(output_dir, exist_ok=True)
+    
+    if url_mes is None:
+        url_mes = await asyncio.to_thread(descobrir_mes_atual, url_base)
+    print(f"Mês atual identificado: {url_mes}")
+    
+    nomes = await asyncio.to_thread(listar_arquivos_mes, url_mes)
+    if socios_only:
+        nomes = [nome for nome in nomes if nome.lower().startswith('socios')]
+    print(f"Descobertos {len(nomes)} arquivos para download")
+    
+    checkpoint = carregar_checkpoint(caminho_checkpoint)
+    if checkpoint['current_month_url'] != url_mes:
+        # Mês novo: o progresso anterior não vale mais
+        checkpoint.update(completed=[], in_progress={}, failed={}, current_month_url=url_mes)
+    # Downloads "em andamento" de uma execução interrompida voltam para a fila
+    checkpoint['in_progress'] = {}
+    checkpoint['total_files'] = len(nomes)
+    
+    pendentes = [
+        nome for nome in nomes
+        if nome not in checkpoint['completed'] or not os.path.exists(os.path.join(output_dir, nome))
+    ]
+    checkpoint['completed'] = [nome for nome in checkpoint['completed'] if nome not in pendentes]
+    salvar_checkpoint(caminho_checkpoint, checkpoint)
+    
+    # Arquivos já baixados em execuções anteriores seguem direto para a próxima etapa
+    if ao_concluir:
+        for nome in checkpoint['completed']:
+            ao_concluir(os.path.join(output_dir, nome))
+    
+    if not pendentes:
+        print("Todos os arquivos do mês já foram baixados")
+        return checkpoint
     
-    print(f"Download concluído: {sucessos} sucessos, {falhas} falhas")
+    tamanhos = await _descobrir_tamanhos(url_mes, pendentes)
+    pendentes.sort(key=lambda nome: tamanhos[nome], reverse=True)
+    total = sum(tamanhos.values())
+    print(f"Iniciando download de {len(pendentes)} arquivos pendentes ({total/1024/1024/1024:.1f} GB)")
+    
+    controle = ControleConcorrencia(inicial=workers_iniciais, maximo=workers_max)
+    inicio = time.monotonic()
+    await _agendar_downloads(url_mes, pendentes, output_dir, checkpoint, caminho_checkpoint, controle, num_partes,
+                             ao_concluir=ao_concluir)
+    
+    decorrido = time.monotonic() - inicio
+    print(f"Download concluído: {len(checkpoint['completed'])} de {len(nomes)} arquivos, "
+          f"{len(checkpoint['failed'])} falhas, em {decorrido/60:.1f} min")
+    return checkpoint
+
+def baixar_base_completa(output_dir, num_workers=3, socios_only=False, num_partes=8,
+                         url_base=URL_BASE, workers_max=12, caminho_checkpoint=CAMINHO_CHECKPOINT, ao_concluir=None,
+                         url_mes=None):
+    """
+    Baixa a base completa da Receita Federal
+    
+    Args:
+        output_dir (str): Diretório de saída
+        num_workers (int): Número inicial de downloads simultâneos (ajustado pela vazão)
+        socios_only (bool): Se True, baixa apenas os arquivos de sócios
+        num_partes (int): Número de faixas baixadas em paralelo por arquivo
+        url_base (str): Raiz dos dados abertos (contém um diretório por mês)
+        workers_max (int): Limite superior de downloads simultâneos
+        caminho_checkpoint (str): Arquivo de checkpoint para retomar a execução
+        ao_concluir (callable): Recebe o caminho de cada arquivo assim que ele
+            termina de baixar (usado para encadear a carga no banco)
+        url_mes (str): Diretório do mês a baixar; None para o mais recente
+    """
+    return asyncio.run(baixar_base_completa_async(
+        output_dir, url_base, socios_only, num_partes, num_workers, workers_max, caminho_checkpoint, ao_concluir,
+        url_mes
+    ))
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Download da base completa da Receita Federal")
     parser.add_argument("--dir", type=str, default="base_completa", help="Diretório de saída")
-    parser.add_argument("--workers", type=int, default=3, help="Número de workers para download paralelo")
+    parser.add_argument("--workers", type=int, default=3, help="Número inicial de downloads simultâneos")
+    parser.add_argument("--workers-max", type=int, default=12, help="Número máximo de downloads simultâneos")
+    parser.add_argument("--partes", type=int, default=8, help="Número de faixas baixadas em paralelo por arquivo")
+    parser.add_argument("--url-base", type=str, default=URL_BASE, help="URL raiz dos dados abertos do CNPJ")
+    parser.add_argument("--checkpoint", type=str, default=CAMINHO_CHECKPOINT, help="Arquivo de checkpoint")
     parser.add_argument("--socios-only", action="store_true", help="Baixar apenas os arquivos de sócios")
     
     args = parser.parse_args()
     
     print(f"Iniciando download da base {'completa' if not args.socios_only else 'de sócios'}")
-    baixar_base_completa(args.dir, args.workers, args.socios_only)
\ No newline at end of file
+    baixar_base_completa(args.dir, args.workers, args.socios_only, args.partes,
+                         args.url_base, args.workers_max, args.checkpoint)
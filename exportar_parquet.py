@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+# exportar_parquet.py - Exportação da base SQLite para Parquet particionado
+import os
+import json
+import time
+import shutil
+import sqlite3
+import argparse
+from datetime import datetime
+from collections import OrderedDict
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from parser_receita import LAYOUTS
+
+# Particionamento de cada tabela (layout hive: <tabela>/<coluna>=<valor>/parte-N.parquet).
+# 'uf' usa a coluna da própria tabela (que sai dos arquivos e fica só no diretório);
+# 'prefixo_cnpj' é o primeiro dígito de cnpj_basico, que continua nos arquivos.
+# Tabelas auxiliares são pequenas e vão em um arquivo só.
+PARTICOES = {
+    'estabelecimentos': 'uf',
+    'socios': 'prefixo_cnpj',
+    'empresas': 'prefixo_cnpj',
+    'simples': 'prefixo_cnpj',
+}
+
+# Tabelas calculadas na carga (carregar_base.py) que os motores de consulta também leem
+TABELAS_DERIVADAS = ['grupos_economicos', 'empresa_resumo', 'nomes_empresas']
+
+# Colunas de baixa cardinalidade com codificação de dicionário; nas demais
+# (nomes, endereços) o dicionário só aumentaria o arquivo
+COLUNAS_DICIONARIO = [
+    'situacao_cadastral', 'motivo_situacao_cadastral', 'cnae_fiscal_principal', 'uf', 'municipio', 'pais',
+    'identificador_matriz_filial', 'identificador_socio', 'qualificacao_socio', 'faixa_etaria',
+    'natureza_juridica', 'porte_empresa', 'opcao_simples', 'opcao_mei',
+]
+
+# Valor usado para partição de linhas sem valor (lido como NULL por DuckDB e pyarrow)
+PARTICAO_NULA = '__HIVE_DEFAULT_PARTITION__'
+
+# Linhas lidas do SQLite por vez e linhas por row group no Parquet
+TAMANHO_LOTE = 100000
+LINHAS_POR_GRUPO = 256 * 1024
+
+# Linhas acumuladas somando todas as partições: acima disso a maior é descarregada
+# antes de completar o row group (milhares de partições pequenas não podem juntar a
+# tabela inteira na memória). E ParquetWriters abertos ao mesmo tempo: cada um
+# segura buffers e um descritor de arquivo
+LIMITE_LINHAS_PENDENTES = 4 * LINHAS_POR_GRUPO
+LIMITE_ESCRITORES = 64
+
+TIPOS_ARROW = {'TEXT': pa.string(), 'INTEGER': pa.int64(), 'REAL': pa.float64()}
+
+ARQUIVO_METADADOS = 'exportacao.json'
+
+def _esquema(conn, tabela):
+    """Esquema Arrow a partir das colunas declaradas na tabela SQLite"""
+    cursor = conn.cursor()
+    cursor.execute(f"PRAGMA table_info({tabela})")
+    campos = [pa.field(col[1], TIPOS_ARROW.get((col[2] or 'TEXT').upper(), pa.string())) for col in cursor.fetchall()]
+    return pa.schema(campos)
+
+def _chave_particao(tabela_arrow, particao):
+    """Valor da partição de cada linha do lote"""
+    if particao == 'prefixo_cnpj':
+        chave = pc.utf8_slice_codeunits(tabela_arrow.column('cnpj_basico'), 0, 1)
+    else:
+        chave = tabela_arrow.column(particao)
+    chave = pc.if_else(pc.equal(chave, ''), None, chave)
+    return pc.fill_null(chave, PARTICAO_NULA)
+
+class _EscritorParticionado:
+    """
+    Mantém um ParquetWriter aberto por valor de partição e acumula as linhas
+    de cada partição até completar um row group, para que partições pequenas
+    não virem milhares de row groups minúsculos.
+    
+    A memória é limitada: com mais de `limite_pendentes` linhas acumuladas no
+    total, a maior partição é descarregada antes de completar o row group; com
+    `limite_escritores` abertos, o usado há mais tempo é fechado, e a partição,
+    se voltar a receber linhas, continua num arquivo novo (parte-1.parquet, ...).
+    """
+    
+    def __init__(self, diretorio, esquema, particao, limite_pendentes=LIMITE_LINHAS_PENDENTES,
+                 limite_escritores=LIMITE_ESCRITORES):
+        self.diretorio = diretorio
+        self.particao = particao
+        self.esquema = esquema
+        if particao in esquema.names:
+            self.esquema_arquivo = esquema.remove(esquema.get_field_index(particao))
+        else:
+            self.esquema_arquivo = esquema
+        dicionario = [c for c in COLUNAS_DICIONARIO if c in self.esquema_arquivo.names]
+        self.opcoes = {'compression': 'zstd', 'use_dictionary': dicionario or False}
+        self.limite_pendentes = limite_pendentes
+        self.limite_escritores = limite_escritores
+        self.escritores = OrderedDict()  # Abertos, do usado há mais tempo ao mais recente
+        self.arquivos = {}               # Arquivos já criados por partição
+        self.pendentes = {}
+        self.linhas_pendentes = {}
+        self.total_pendente = 0
+        self.linhas = 0
+    
+    def _escritor(self, valor):
+        if valor in self.escritores:
+            self.escritores.move_to_end(valor)
+            return self.escritores[valor]
+        if len(self.escritores) >= self.limite_escritores:
+            _, antigo = self.escritores.popitem(last=False)
+            antigo.close()
+        if self.particao:
+            caminho = os.path.join(self.diretorio, f"{self.particao}={valor}")
+        else:
+            caminho = self.diretorio
+        os.makedirs(caminho, exist_ok=True)
+        parte = self.arquivos.get(valor, 0)
+        self.arquivos[valor] = parte + 1
+        self.escritores[valor] = pq.ParquetWriter(
+            os.path.join(caminho, f'parte-{parte}.parquet'), self.esquema_arquivo, **self.opcoes
+        )
+        return self.escritores[valor]
+    
+    def _descarregar(self, valor):
+        tabelas = self.pendentes.pop(valor, [])
+        self.total_pendente -= self.linhas_pendentes.pop(valor, 0)
+        if tabelas:
+            self._escritor(valor).write_table(pa.concat_tables(tabelas), row_group_size=LINHAS_POR_GRUPO)
+    
+    def escrever(self, tabela_arrow):
+        self.linhas += tabela_arrow.num_rows
+        if not self.particao:
+            self._acumular(None, tabela_arrow)
+            return
+        
+        chave = _chave_particao(tabela_arrow, self.particao)
+        if self.particao in tabela_arrow.column_names:
+            tabela_arrow = tabela_arrow.drop_columns([self.particao])
+        for valor in pc.unique(chave).to_pylist():
+            self._acumular(valor, tabela_arrow.filter(pc.equal(chave, valor)))
+    
+    def _acumular(self, valor, tabela_arrow):
+        self.pendentes.setdefault(valor, []).append(tabela_arrow)
+        self.linhas_pendentes[valor] = self.linhas_pendentes.get(valor, 0) + tabela_arrow.num_rows
+        self.total_pendente += tabela_arrow.num_rows
+        if self.linhas_pendentes[valor] >= LINHAS_POR_GRUPO:
+            self._descarregar(valor)
+        while self.total_pendente > self.limite_pendentes:
+            self._descarregar(max(self.linhas_pendentes, key=self.linhas_pendentes.get))
+    
+    def fechar(self):
+        for valor in list(self.pendentes):
+            self._descarregar(valor)
+        for escritor in self.escritores.values():
+            escritor.close()
+        self.escritores.clear()
+        return sorted(v for v in self.arquivos if v is not None)
+
+def exportar_tabela(conn, tabela, destino, particao=None, tamanho_lote=TAMANHO_LOTE):
+    """
+    Exporta uma tabela lendo o SQLite em lotes (fetchmany), sem carregar a
+    tabela inteira na memória. Retorna o número de linhas e as partições escritas.
+    """
+    esquema = _esquema(conn, tabela)
+    diretorio = os.path.join(destino, tabela)
+    if os.path.isdir(diretorio):
+        shutil.rmtree(diretorio)
+    os.makedirs(diretorio)
+    
+    escritor = _EscritorParticionado(diretorio, esquema, particao)
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT {', '.join(esquema.names)} FROM {tabela}")
+    
+    inicio = time.time()
+    while True:
+        linhas = cursor.fetchmany(tamanho_lote)
+        if not linhas:
+            break
+        colunas = list(zip(*linhas))
+        arrays = [pa.array(valores, type=campo.type) for valores, campo in zip(colunas, esquema)]
+        escritor.escrever(pa.Table.from_arrays(arrays, schema=esquema))
+    
+    particoes = escritor.fechar()
+    if escritor.linhas == 0:
+        # Tabela vazia: grava um arquivo só com o esquema, no caminho esperado
+        # por caminho_parquet, para que os leitores a encontrem
+        escritor._escritor(PARTICAO_NULA if particao else None)
+        escritor.fechar()
+    
+    decorrido = time.time() - inicio
+    print(f"Exportado {tabela}: {escritor.linhas:,} linhas, {len(particoes) or 1} partição(ões) ({decorrido:.1f}s)")
+    return escritor.linhas, particoes
+
+def caminho_parquet(destino, tabela):
+    """Padrão glob dos arquivos de uma tabela exportada (para DuckDB/pyarrow.dataset)"""
+    if tabela in PARTICOES:
+        return os.path.join(destino, tabela, '*', '*.parquet')
+    return os.path.join(destino, tabela, '*.parquet')
+
+def carregar_metadados(destino):
+    """Lê o exportacao.json de um diretório exportado (None se não existir)"""
+    caminho = os.path.join(destino, ARQUIVO_METADADOS)
+    if not os.path.exists(caminho):
+        return None
+    with open(caminho, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+def exportar_base(db_path, destino, tabelas=None, particao_estabelecimentos='uf'):
+    """
+    Exporta as tabelas da base para Parquet em `destino`, uma pasta por tabela,
+    e grava exportacao.json com o particionamento e o número de linhas de cada uma.
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT name FROM sqlite_master WHERE type='table'")
+        existentes = {linha[0] for linha in cursor.fetchall()}
+        
+        tabelas = [t for t in (tabelas or list(LAYOUTS) + TABELAS_DERIVADAS) if t in existentes]
+        if not tabelas:
+            raise ValueError(f"Nenhuma tabela do layout da Receita encontrada em {db_path}")
+        
+        particoes = dict(PARTICOES)
+        particoes['estabelecimentos'] = particao_estabelecimentos
+        
+        os.makedirs(destino, exist_ok=True)
+        metadados = {'banco': os.path.abspath(db_path), 'exportado_em': datetime.now().isoformat(), 'tabelas': {}}
+        
+        for tabela in tabelas:
+            particao = particoes.get(tabela)
+            linhas, valores = exportar_tabela(conn, tabela, destino, particao)
+            metadados['tabelas'][tabela] = {
+                'particao': particao,
+                'particoes': valores,
+                'linhas': linhas,
+                'arquivos': os.path.relpath(caminho_parquet(destino, tabela), destino),
+            }
+        
+        with open(os.path.join(destino, ARQUIVO_METADADOS), 'w', encoding='utf-8') as f:
+            json.dump(metadados, f, indent=2, ensure_ascii=False)
+        return metadados
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Exporta a base CNPJ do SQLite para Parquet particionado")
+    parser.add_argument("--banco", type=str, default="cnpj_completo.db", help="Caminho para o banco de dados")
+    parser.add_argument("--destino", type=str, default="base_parquet", help="Diretório de saída")
+    parser.add_argument("--tabelas", type=str, nargs='+', choices=sorted(LAYOUTS) + TABELAS_DERIVADAS,
+                        help="Tabelas a exportar (padrão: todas)")
+    parser.add_argument("--particao-estabelecimentos", type=str, choices=['uf', 'prefixo_cnpj'], default='uf',
+                        help="Particionar estabelecimentos por UF ou pelo primeiro dígito do CNPJ")
+    
+    args = parser.parse_args()
+    
+    inicio = time.time()
+    exportar_base(args.banco, args.destino, args.tabelas, args.particao_estabelecimentos)
+    print(f"Exportação concluída em {time.time() - inicio:.1f}s: {args.destino}")
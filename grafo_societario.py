@@ -0,0 +1,309 @@
+#!/usr/bin/env python3
+# grafo_societario.py - Grafo de participações entre empresas (sócios pessoa jurídica)
+import os
+import json
+import time
+import shutil
+import argparse
+from collections import namedtuple
+
+import numpy as np
+
+from motor_consulta import MotorSQLite, IDENTIFICADOR_PJ, filtro_identificador
+
+VERSAO_GRAFO = 1
+
+# Arrays do grafo (um arquivo .npy por array)
+ARRAYS = ['nos', 'inicio_donos', 'donos', 'inicio_participadas', 'participadas']
+
+# Sentido da travessia: subindo até quem controla ou descendo até as participadas
+DONOS = 'donos'
+PARTICIPADAS = 'participadas'
+
+# Resultado de uma travessia: (cnpj_basico, nível) de cada empresa alcançada, em
+# ordem de nível; as empresas alcançadas que fazem parte de algum ciclo de
+# participações; e se a profundidade máxima cortou a travessia
+Travessia = namedtuple('Travessia', ('alcancadas', 'ciclos', 'truncada'))
+
+def diretorio_grafo(db_path):
+    """Diretório do grafo, ao lado do banco (ex.: cnpj_completo.db.grafo/)"""
+    return db_path + '.grafo'
+
+def _csr(origens, destinos, total):
+    """Listas de adjacência em CSR: vizinhos de i em destinos[inicio[i]:inicio[i + 1]], em ordem"""
+    ordem = np.lexsort((destinos, origens))
+    inicio = np.zeros(total + 1, dtype=np.int64)
+    np.cumsum(np.bincount(origens, minlength=total), out=inicio[1:])
+    return inicio, destinos[ordem].astype(np.uint32)
+
+class GrafoSocietario:
+    """
+    Quem é sócio de quem entre as empresas, em arrays NumPy (CSR):
+        
+        nos                  uint32  cnpj_basico de cada nó, em ordem (o id é a posição)
+        inicio_donos         int64   donos do nó i em donos[inicio_donos[i]:inicio_donos[i + 1]]
+        donos                uint32  ids das empresas sócias
+        inicio_participadas  int64   o mesmo no sentido inverso
+        participadas         uint32  ids das empresas das quais o nó é sócio
+    
+    As arestas saem das linhas de sócios pessoa jurídica (identificador 1): o
+    dono é o CNPJ básico do documento do sócio. Cada nível da travessia é
+    expandido de uma vez (fancy indexing sobre as faixas do CSR), sem uma
+    consulta SQL por empresa. Como o índice de sócios, os arrays são gravados
+    ao lado do banco e abertos com mmap.
+    """
+    
+    def __init__(self, arrays):
+        for nome in ARRAYS:
+            setattr(self, nome, arrays[nome])
+    
+    def __len__(self):
+        return len(self.nos)
+    
+    @classmethod
+    def construir(cls, db_path):
+        """Lê os sócios pessoa jurídica (índice parcial de carregar_base.py) e monta o CSR"""
+        motor = MotorSQLite(db_path)
+        try:
+            col = motor.colunas('socios')
+            if not col['identificador_socio']:
+                raise ValueError(f"{db_path} não tem identificador_socio: não há como separar os sócios pessoa jurídica")
+            identificador = f'"{col["identificador_socio"]}"'
+            linhas = motor._executar(f"""
+            SELECT "{col['cnpj_basico']}", "{col['cnpj_cpf_socio']}" FROM socios
+            WHERE {filtro_identificador(IDENTIFICADOR_PJ, identificador)}
+            """)
+        finally:
+            motor.fechar()
+        
+        participadas, donos = [], []
+        for cnpj_basico, documento in linhas:
+            documento = ''.join(c for c in documento or '' if c.isdigit())
+            if len(documento) == 14 and cnpj_basico and str(cnpj_basico).isdigit():
+                participadas.append(int(cnpj_basico))
+                donos.append(int(documento[:8]))
+        del linhas
+        return cls.de_arestas(donos, participadas)
+    
+    @classmethod
+    def de_arestas(cls, donos, participadas):
+        """Monta o grafo a partir das arestas dono -> participada (CNPJs básicos como inteiros)"""
+        # Arestas distintas (a mesma empresa sócia pode aparecer em várias linhas)
+        arestas = np.unique(np.array(donos, dtype=np.uint64) << np.uint64(32) | np.array(participadas, dtype=np.uint64))
+        donos = (arestas >> np.uint64(32)).astype(np.uint32)
+        participadas = (arestas & np.uint64(0xFFFFFFFF)).astype(np.uint32)
+        
+        nos = np.union1d(donos, participadas).astype(np.uint32)
+        id_dono = np.searchsorted(nos, donos)
+        id_participada = np.searchsorted(nos, participadas)
+        inicio_donos, lista_donos = _csr(id_participada, id_dono, len(nos))
+        inicio_participadas, lista_participadas = _csr(id_dono, id_participada, len(nos))
+        
+        return cls({
+            'nos': nos,
+            'inicio_donos': inicio_donos,
+            'donos': lista_donos,
+            'inicio_participadas': inicio_participadas,
+            'participadas': lista_participadas,
+        })
+    
+    def salvar(self, diretorio, db_path=None):
+        """Grava um .npy por array e grafo.json, trocando o diretório inteiro no fim"""
+        temporario = diretorio + '.tmp'
+        if os.path.isdir(temporario):
+            shutil.rmtree(temporario)
+        os.makedirs(temporario)
+        for nome in ARRAYS:
+            np.save(os.path.join(temporario, f"{nome}.npy"), getattr(self, nome))
+        metadados = {'versao': VERSAO_GRAFO, 'nos': len(self), 'arestas': len(self.donos)}
+        if db_path:
+            metadados['banco'] = os.path.abspath(db_path)
+            metadados['banco_mtime'] = os.path.getmtime(db_path)
+        with open(os.path.join(temporario, 'grafo.json'), 'w', encoding='utf-8') as f:
+            json.dump(metadados, f, indent=2)
+        
+        if os.path.isdir(diretorio):
+            shutil.rmtree(diretorio)
+        os.rename(temporario, diretorio)
+    
+    @classmethod
+    def abrir(cls, diretorio, mmap=True):
+        modo = 'r' if mmap else None
+        return cls({nome: np.load(os.path.join(diretorio, f"{nome}.npy"), mmap_mode=modo) for nome in ARRAYS})
+    
+    @staticmethod
+    def atualizado(diretorio, db_path):
+        """Se o grafo gravado existe e foi gerado a partir da versão atual do banco"""
+        caminho = os.path.join(diretorio, 'grafo.json')
+        if not os.path.exists(caminho):
+            return False
+        with open(caminho, 'r', encoding='utf-8') as f:
+            metadados = json.load(f)
+        return (metadados.get('versao') == VERSAO_GRAFO
+                and metadados.get('banco_mtime') == os.path.getmtime(db_path))
+    
+    @classmethod
+    def atualizar(cls, db_path):
+        """Constrói e grava o grafo do banco se não existir ou estiver desatualizado (sem abri-lo)"""
+        diretorio = diretorio_grafo(db_path)
+        if not cls.atualizado(diretorio, db_path):
+            print(f"Construindo grafo societário de {db_path}...")
+            inicio = time.time()
+            grafo = cls.construir(db_path)
+            grafo.salvar(diretorio, db_path)
+            print(f"Grafo construído em {time.time() - inicio:.1f}s "
+                  f"({len(grafo):,} empresas, {len(grafo.donos):,} participações)")
+    
+    @classmethod
+    def carregar(cls, db_path, mmap=True):
+        """Abre o grafo do banco, construindo e gravando se não existir ou estiver desatualizado"""
+        cls.atualizar(db_path)
+        return cls.abrir(diretorio_grafo(db_path), mmap)
+    
+    def _id(self, cnpj_basico):
+        """
+        Id do nó do CNPJ básico, ou None se a empresa não tem sócios nem participações PJ.
+        Aceita o CNPJ básico ou completo, formatado ou não, e sem os zeros à esquerda.
+        """
+        digitos = ''.join(c for c in str(cnpj_basico) if c.isdigit())
+        if not digitos:
+            return None
+        cnpj_basico = digitos.zfill(14)[:8] if len(digitos) > 8 else digitos.zfill(8)
+        chave = np.uint32(int(cnpj_basico))
+        posicao = int(np.searchsorted(self.nos, chave))
+        return posicao if posicao < len(self.nos) and self.nos[posicao] == chave else None
+    
+    def _vizinhos(self, ids, sentido):
+        """Vizinhos de todos os ids de uma vez (mesma montagem de faixas de IndiceMemoria.buscar_lote)"""
+        inicio, lista = ((self.inicio_donos, self.donos) if sentido == DONOS
+                         else (self.inicio_participadas, self.participadas))
+        comecos = inicio[ids]
+        tamanhos = inicio[ids + 1] - comecos
+        total = int(tamanhos.sum())
+        if not total:
+            return np.empty(0, dtype=np.int64)
+        acumulado = np.cumsum(tamanhos)
+        posicoes = np.arange(total) + np.repeat(comecos - (acumulado - tamanhos), tamanhos)
+        return lista[posicoes].astype(np.int64)
+    
+    def percorrer(self, cnpj_basico, sentido=DONOS, profundidade=None):
+        """
+        Busca em largura a partir da empresa, subindo pelos donos (DONOS) ou
+        descendo pelas participadas (PARTICIPADAS), até `profundidade` níveis
+        (None: até o fim). Cada empresa aparece uma vez, no menor nível em que
+        é alcançada; a empresa de origem só entra se um ciclo voltar a ela.
+        """
+        origem = self._id(cnpj_basico)
+        if origem is None:
+            return Travessia([], [], False)
+        
+        nivel_de = {origem: 0}
+        alcancadas = []
+        fronteira = np.array([origem], dtype=np.int64)
+        nivel = 0
+        truncada = False
+        while len(fronteira):
+            if profundidade is not None and nivel >= profundidade:
+                # Cortada só se o próximo nível traria alguém novo (ou a volta à origem);
+                # vizinhos já alcançados não mudariam o resultado
+                truncada = any(vizinho not in nivel_de or (vizinho == origem and nivel_de[origem] == 0)
+                               for vizinho in np.unique(self._vizinhos(fronteira, sentido)).tolist())
+                break
+            nivel += 1
+            novos = []
+            for vizinho in np.unique(self._vizinhos(fronteira, sentido)).tolist():
+                if vizinho not in nivel_de:
+                    nivel_de[vizinho] = nivel
+                    novos.append(vizinho)
+                elif vizinho == origem and nivel_de[origem] == 0:
+                    # Ciclo de volta à origem: ela também é sua própria dona/participada
+                    nivel_de[origem] = nivel
+                    alcancadas.append((origem, nivel))
+            alcancadas.extend((vizinho, nivel) for vizinho in novos)
+            fronteira = np.array(novos, dtype=np.int64)
+        
+        ciclos = self._em_ciclos([i for i, _ in alcancadas] + [origem], sentido)
+        return Travessia(
+            [(f"{int(self.nos[i]):08d}", n) for i, n in alcancadas],
+            [f"{int(self.nos[i]):08d}" for i in sorted(ciclos)],
+            truncada,
+        )
+    
+    def _em_ciclos(self, ids, sentido):
+        """
+        Detecção de ciclos no subgrafo alcançado: remove repetidamente os nós sem
+        arestas de entrada (Kahn) e depois os sem arestas de saída; sobram os nós
+        dos ciclos (e os que ligam um ciclo a outro)
+        """
+        ids = set(ids)
+        saidas = {i: [v for v in self._vizinhos(np.array([i], dtype=np.int64), sentido).tolist() if v in ids]
+                  for i in ids}
+        entradas = dict.fromkeys(ids, 0)
+        for vizinhos in saidas.values():
+            for v in vizinhos:
+                entradas[v] += 1
+        pendentes = [i for i, grau in entradas.items() if grau == 0]
+        while pendentes:
+            i = pendentes.pop()
+            for v in saidas[i]:
+                entradas[v] -= 1
+                if entradas[v] == 0:
+                    pendentes.append(v)
+        restantes = {i for i, grau in entradas.items() if grau > 0}
+        
+        # Os que sobraram estão em um ciclo ou depois de um: o mesmo corte no sentido inverso
+        if not restantes:
+            return restantes
+        entradas = {i: sum(1 for v in saidas[i] if v in restantes) for i in restantes}
+        pendentes = [i for i, grau in entradas.items() if grau == 0]
+        antecessores = {i: [] for i in restantes}
+        for i in restantes:
+            for v in saidas[i]:
+                if v in restantes:
+                    antecessores[v].append(i)
+        while pendentes:
+            i = pendentes.pop()
+            restantes.discard(i)
+            for u in antecessores[i]:
+                entradas[u] -= 1
+                if entradas[u] == 0:
+                    pendentes.append(u)
+        return restantes
+    
+    def controladores_finais(self, cnpj_basico, profundidade=None):
+        """Quem controla a empresa no fim da cadeia: donos alcançados que não têm donos"""
+        travessia = self.percorrer(cnpj_basico, DONOS, profundidade)
+        finais = [(cnpj, nivel) for cnpj, nivel in travessia.alcancadas
+                  if not len(self._vizinhos(np.array([self._id(cnpj)], dtype=np.int64), DONOS))]
+        return finais, travessia
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Grafo societário: controladores e participadas de uma empresa")
+    parser.add_argument("--banco", type=str, default="cnpj_completo.db", help="Caminho para o banco de dados")
+    parser.add_argument("--cnpj", type=str, help="CNPJ (básico ou completo) a percorrer")
+    parser.add_argument("--sentido", type=str, choices=[DONOS, PARTICIPADAS], default=DONOS,
+                        help="Subir até quem controla ou descer até as participadas")
+    parser.add_argument("--profundidade", type=int, help="Número máximo de níveis (padrão: sem limite)")
+    parser.add_argument("--forcar", action="store_true", help="Reconstruir o grafo mesmo se estiver atualizado")
+    
+    args = parser.parse_args()
+    
+    if args.forcar:
+        grafo = GrafoSocietario.construir(args.banco)
+        grafo.salvar(diretorio_grafo(args.banco), args.banco)
+    grafo = GrafoSocietario.carregar(args.banco)
+    print(f"Grafo: {len(grafo):,} empresas, {len(grafo.donos):,} participações")
+    
+    if args.cnpj:
+        cnpj_basico = ''.join(c for c in args.cnpj if c.isdigit())[:8]
+        inicio = time.perf_counter()
+        travessia = grafo.percorrer(cnpj_basico, args.sentido, args.profundidade)
+        decorrido = (time.perf_counter() - inicio) * 1000
+        
+        print(f"\n{len(travessia.alcancadas)} empresa(s) em {args.sentido} de {cnpj_basico} ({decorrido:.2f} ms)")
+        for cnpj, nivel in travessia.alcancadas:
+            print(f"  {'  ' * (nivel - 1)}{nivel}. {cnpj}")
+        if travessia.ciclos:
+            print(f"Ciclos de participação entre: {', '.join(travessia.ciclos)}")
+        if travessia.truncada:
+            print(f"Travessia cortada na profundidade {args.profundidade}")
@@ -0,0 +1,408 @@
+#!/usr/bin/env python3
+# indice_lsh.py - Índice MinHash/LSH dos nomes de sócios para conciliação só por nome
+import os
+import json
+import time
+import shutil
+import argparse
+from array import array
+from collections import namedtuple
+from difflib import SequenceMatcher
+
+import numpy as np
+import pandas as pd
+
+from motor_consulta import MotorSQLite
+from consulta_cnpj_corrigida import normalizar_nome
+
+VERSAO_LSH = 1
+
+# Assinatura MinHash de BANDAS * LINHAS_BANDA valores por nome. Dois nomes viram
+# candidatos se coincidem em todos os valores de alguma banda: com Jaccard j entre
+# os trigramas, a chance é 1 - (1 - j^4)^16 (j = 0,5: 64%; j = 0,7: 99,6%)
+BANDAS = 16
+LINHAS_BANDA = 4
+NUM_HASHES = BANDAS * LINHAS_BANDA
+
+# Trigramas de caracteres do nome normalizado (A-Z e espaço), com um espaço em
+# cada ponta: cada trigrama é um número em [0, 27^3)
+TAMANHO_ALFABETO = 27
+TOTAL_TRIGRAMAS = TAMANHO_ALFABETO ** 3
+
+# Hashes h(x) = (a*x + b) mod PRIMO; a semente fixa faz as consultas usarem os mesmos do índice
+PRIMO = (1 << 31) - 1
+SEMENTE = 2024
+
+# Baldes de uma banda com mais nomes que isso são ignorados na consulta (trechos
+# comuns a muitos nomes não distinguem ninguém e multiplicariam os pares)
+LIMITE_BALDE_LSH = 1000
+
+# Nomes por bloco no cálculo das assinaturas (a matriz de hashes do bloco fica em memória)
+TAMANHO_BLOCO = 50000
+
+# Unidades da federação, codificadas pela posição (0: desconhecida)
+UFS = ['', 'AC', 'AL', 'AM', 'AP', 'BA', 'CE', 'DF', 'ES', 'EX', 'GO', 'MA', 'MG', 'MS', 'MT', 'PA', 'PB',
+       'PE', 'PI', 'PR', 'RJ', 'RN', 'RO', 'RR', 'RS', 'SC', 'SE', 'SP', 'TO']
+CODIGO_UF = {uf: i for i, uf in enumerate(UFS)}
+
+ARRAYS = ['nomes_dados', 'nomes_offsets', 'banda_hash', 'banda_nome', 'inicio_socios', 'socio_rowid',
+          'socio_cnpj', 'socio_uf']
+
+# Par candidato da conciliação: posição da entrada no lote, nome normalizado do
+# sócio, score de similaridade e a linha do sócio (rowid em socios, empresa e UF dela)
+ParConciliacao = namedtuple('ParConciliacao', ('entrada', 'nome', 'score', 'socio', 'cnpj_basico', 'uf'))
+
+def diretorio_lsh(db_path):
+    """Diretório do índice LSH, ao lado do banco (ex.: cnpj_completo.db.lsh/)"""
+    return db_path + '.lsh'
+
+def _tabela_hashes():
+    """Hash de cada trigrama possível para cada uma das NUM_HASHES funções: (NUM_HASHES, TOTAL_TRIGRAMAS)"""
+    gerador = np.random.default_rng(SEMENTE)
+    a = gerador.integers(1, PRIMO, NUM_HASHES, dtype=np.int64)
+    b = gerador.integers(0, PRIMO, NUM_HASHES, dtype=np.int64)
+    return ((a[:, None] * np.arange(TOTAL_TRIGRAMAS, dtype=np.int64)[None, :] + b[:, None]) % PRIMO).astype(np.uint32)
+
+def assinaturas(nomes, tabela=None):
+    """
+    Assinaturas MinHash (len(nomes), NUM_HASHES) de nomes normalizados não vazios.
+    Os trigramas de todos os nomes do bloco são montados de uma vez sobre o buffer
+    concatenado, e o mínimo por nome sai de um np.minimum.reduceat.
+    """
+    tabela = _tabela_hashes() if tabela is None else tabela
+    resultado = np.empty((len(nomes), NUM_HASHES), dtype=np.uint32)
+    for inicio in range(0, len(nomes), TAMANHO_BLOCO):
+        bloco = [f" {nome} " for nome in nomes[inicio:inicio + TAMANHO_BLOCO]]
+        codigos = np.frombuffer(''.join(bloco).encode('ascii'), dtype=np.uint8).astype(np.int64)
+        codigos = np.where(codigos == ord(' '), 0, codigos - ord('A') + 1)
+        tamanhos = np.array([len(nome) for nome in bloco], dtype=np.int64)
+        comecos = np.zeros(len(bloco), dtype=np.int64)
+        np.cumsum(tamanhos[:-1], out=comecos[1:])
+        quantidades = tamanhos - 2
+        primeiros = np.zeros(len(bloco), dtype=np.int64)
+        np.cumsum(quantidades[:-1], out=primeiros[1:])
+        posicoes = np.repeat(comecos - primeiros, quantidades) + np.arange(int(quantidades.sum()))
+        trigramas = (codigos[posicoes] * TAMANHO_ALFABETO + codigos[posicoes + 1]) * TAMANHO_ALFABETO + codigos[posicoes + 2]
+        resultado[inicio:inicio + len(bloco)] = np.minimum.reduceat(tabela[:, trigramas], primeiros, axis=1).T
+    return resultado
+
+def hashes_bandas(assinatura):
+    """Um hash uint32 por banda (LINHAS_BANDA valores da assinatura cada): (n, BANDAS)"""
+    valores = assinatura.reshape(len(assinatura), BANDAS, LINHAS_BANDA).astype(np.uint64)
+    hash_banda = valores[:, :, 0]
+    for j in range(1, LINHAS_BANDA):
+        hash_banda = hash_banda * np.uint64(0x9E3779B97F4A7C15) + valores[:, :, j]
+    return ((hash_banda >> np.uint64(32)) ^ hash_banda).astype(np.uint32)
+
+def _letras(nomes):
+    """Contagem de cada símbolo (espaço, A-Z) por nome: (len(nomes), TAMANHO_ALFABETO)"""
+    contagens = np.zeros((len(nomes), TAMANHO_ALFABETO), dtype=np.int32)
+    codigos = np.frombuffer(''.join(nomes).encode('ascii'), dtype=np.uint8).astype(np.int64)
+    codigos = np.where(codigos == ord(' '), 0, codigos - ord('A') + 1)
+    linhas = np.repeat(np.arange(len(nomes)), [len(nome) for nome in nomes])
+    np.add.at(contagens, (linhas, codigos), 1)
+    return contagens
+
+def _codificar_nomes(nomes):
+    codificados = [n.encode('ascii') for n in nomes]
+    offsets = np.zeros(len(codificados) + 1, dtype=np.uint64)
+    np.cumsum([len(n) for n in codificados], out=offsets[1:])
+    return np.frombuffer(b''.join(codificados), dtype=np.uint8), offsets
+
+class IndiceLSH:
+    """
+    Índice LSH (locality-sensitive hashing) dos nomes normalizados distintos dos
+    sócios, para a conciliação em lote de listas só com nome (e UF), sem CPF:
+        
+        nomes_dados/nomes_offsets  nomes normalizados distintos (buffer ASCII)
+        banda_hash    uint32 (BANDAS, n)  hashes de cada banda, em ordem
+        banda_nome    uint32 (BANDAS, n)  nome de cada posição de banda_hash
+        inicio_socios uint64  sócios do nome i: posições inicio_socios[i]:inicio_socios[i+1]
+        socio_rowid   uint64  rowid da linha em socios
+        socio_cnpj    uint32  cnpj_basico
+        socio_uf      uint8   UF da empresa (matriz, em empresa_resumo), posição em UFS
+    
+    Cada nome vira uma assinatura MinHash dos trigramas; nomes com uma banda
+    inteira igual caem no mesmo balde. A consulta de um lote acha os baldes com
+    np.searchsorted e só os pares que dividem algum balde passam pela
+    similaridade() da consulta por CPF (SequenceMatcher): o custo cresce com o
+    número de pares candidatos, não com entradas x sócios.
+    
+    Construído fora da carga (é grande e só a conciliação sem CPF usa): rode
+    `python indice_lsh.py --banco ...`. Gravado ao lado do banco e aberto com mmap.
+    """
+    
+    def __init__(self, arrays):
+        for nome in ARRAYS:
+            setattr(self, nome, arrays[nome])
+        self._tabela = None
+    
+    def __len__(self):
+        return len(self.nomes_offsets) - 1
+    
+    @classmethod
+    def construir(cls, db_path, tamanho_lote=200000):
+        """Lê os sócios em lotes, agrupa pelos nomes normalizados e calcula as bandas"""
+        motor = MotorSQLite(db_path)
+        try:
+            uf = "r.uf" if motor.tem_tabela('empresa_resumo') else "NULL"
+            juncao = "LEFT JOIN empresa_resumo r ON r.cnpj_basico = s.cnpj_basico" if uf != "NULL" else ""
+            ids_nome = {}
+            nome_ids, rowids, cnpjs, ufs = array('I'), array('Q'), array('I'), array('B')
+            cursor = motor.conn.cursor()
+            cursor.execute(f"SELECT s.rowid, s.nome_socio, s.cnpj_basico, {uf} FROM socios s {juncao}")
+            while True:
+                linhas = cursor.fetchmany(tamanho_lote)
+                if not linhas:
+                    break
+                for rowid, nome, cnpj_basico, uf_empresa in linhas:
+                    nome = normalizar_nome(nome)
+                    if not nome or not cnpj_basico or not str(cnpj_basico).isdigit():
+                        continue
+                    nome_id = ids_nome.get(nome)
+                    if nome_id is None:
+                        nome_id = ids_nome[nome] = len(ids_nome)
+                    nome_ids.append(nome_id)
+                    rowids.append(rowid)
+                    cnpjs.append(int(cnpj_basico))
+                    ufs.append(CODIGO_UF.get(uf_empresa or '', 0))
+        finally:
+            motor.fechar()
+        
+        nomes = list(ids_nome)
+        del ids_nome
+        nome_id = np.frombuffer(nome_ids, dtype=np.uint32)
+        ordem = np.argsort(nome_id, kind='stable')
+        inicio_socios = np.zeros(len(nomes) + 1, dtype=np.uint64)
+        np.cumsum(np.bincount(nome_id, minlength=len(nomes)), out=inicio_socios[1:])
+        
+        bandas = hashes_bandas(assinaturas(nomes)).T
+        ordem_bandas = np.argsort(bandas, axis=1, kind='stable').astype(np.uint32)
+        nomes_dados, nomes_offsets = _codificar_nomes(nomes)
+        return cls({
+            'nomes_dados': nomes_dados,
+            'nomes_offsets': nomes_offsets,
+            'banda_hash': np.take_along_axis(bandas, ordem_bandas, axis=1),
+            'banda_nome': ordem_bandas,
+            'inicio_socios': inicio_socios,
+            'socio_rowid': np.frombuffer(rowids, dtype=np.uint64)[ordem],
+            'socio_cnpj': np.frombuffer(cnpjs, dtype=np.uint32)[ordem],
+            'socio_uf': np.frombuffer(ufs, dtype=np.uint8)[ordem],
+        })
+    
+    def salvar(self, diretorio, db_path=None):
+        """Grava um .npy por array e lsh.json, trocando o diretório inteiro no fim"""
+        temporario = diretorio + '.tmp'
+        if os.path.isdir(temporario):
+            shutil.rmtree(temporario)
+        os.makedirs(temporario)
+        for nome in ARRAYS:
+            np.save(os.path.join(temporario, f"{nome}.npy"), getattr(self, nome))
+        metadados = {'versao': VERSAO_LSH, 'nomes': len(self), 'socios': len(self.socio_rowid),
+                     'bandas': BANDAS, 'linhas_banda': LINHAS_BANDA, 'semente': SEMENTE}
+        if db_path:
+            metadados['banco'] = os.path.abspath(db_path)
+            metadados['banco_mtime'] = os.path.getmtime(db_path)
+        with open(os.path.join(temporario, 'lsh.json'), 'w', encoding='utf-8') as f:
+            json.dump(metadados, f, indent=2)
+        
+        if os.path.isdir(diretorio):
+            shutil.rmtree(diretorio)
+        os.rename(temporario, diretorio)
+    
+    @classmethod
+    def abrir(cls, diretorio, mmap=True):
+        modo = 'r' if mmap else None
+        return cls({nome: np.load(os.path.join(diretorio, f"{nome}.npy"), mmap_mode=modo) for nome in ARRAYS})
+    
+    @staticmethod
+    def atualizado(diretorio, db_path):
+        """Se o índice gravado existe e foi gerado a partir da versão atual do banco"""
+        caminho = os.path.join(diretorio, 'lsh.json')
+        if not os.path.exists(caminho):
+            return False
+        with open(caminho, 'r', encoding='utf-8') as f:
+            metadados = json.load(f)
+        return (metadados.get('versao') == VERSAO_LSH
+                and metadados.get('banco_mtime') == os.path.getmtime(db_path))
+    
+    @classmethod
+    def carregar(cls, db_path, mmap=True):
+        """Abre o índice do banco, construindo e gravando se não existir ou estiver desatualizado"""
+        diretorio = diretorio_lsh(db_path)
+        if not cls.atualizado(diretorio, db_path):
+            print(f"Construindo índice LSH de {db_path}...")
+            inicio = time.time()
+            indice = cls.construir(db_path)
+            indice.salvar(diretorio, db_path)
+            print(f"Índice LSH construído em {time.time() - inicio:.1f}s "
+                  f"({len(indice):,} nomes, {len(indice.socio_rowid):,} sócios)")
+        return cls.abrir(diretorio, mmap)
+    
+    def nome(self, nome_id):
+        inicio, fim = int(self.nomes_offsets[nome_id]), int(self.nomes_offsets[nome_id + 1])
+        return self.nomes_dados[inicio:fim].tobytes().decode('ascii')
+    
+    def candidatos(self, nomes):
+        """
+        Pares (entrada, nome_id) que dividem o balde de alguma banda, sem repetição,
+        para nomes normalizados não vazios. Baldes com mais de LIMITE_BALDE_LSH nomes ficam de fora.
+        """
+        if self._tabela is None:
+            self._tabela = _tabela_hashes()
+        bandas = hashes_bandas(assinaturas(nomes, self._tabela))
+        pares = []
+        for banda in range(BANDAS):
+            chaves = self.banda_hash[banda]
+            inicios = np.searchsorted(chaves, bandas[:, banda], side='left')
+            quantidades = np.searchsorted(chaves, bandas[:, banda], side='right') - inicios
+            quantidades[quantidades > LIMITE_BALDE_LSH] = 0
+            total = int(quantidades.sum())
+            if not total:
+                continue
+            deslocamentos = np.zeros(len(quantidades), dtype=np.int64)
+            np.cumsum(quantidades[:-1], out=deslocamentos[1:])
+            posicoes = np.repeat(inicios - deslocamentos, quantidades) + np.arange(total)
+            entradas = np.repeat(np.arange(len(nomes), dtype=np.uint64), quantidades)
+            pares.append((entradas << np.uint64(32)) | self.banda_nome[banda][posicoes].astype(np.uint64))
+        if not pares:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+        unicos = np.unique(np.concatenate(pares))
+        return (unicos >> np.uint64(32)).astype(np.int64), (unicos & np.uint64(0xFFFFFFFF)).astype(np.int64)
+    
+    def conciliar(self, entradas, limiar=0.7, limite=100, tamanho_lote=10000):
+        """
+        Pares candidatos de uma lista de entradas (nome, uf), com uf opcional
+        (None ou ''). Para cada entrada, os sócios cujo nome normalizado tem
+        similaridade() >= limiar com o nome dela e, com uf, só os de empresa nessa
+        UF: até `limite` ParConciliacao por entrada, do maior score para o menor.
+        As entradas são processadas em lotes de `tamanho_lote`.
+        """
+        resultado = []
+        for inicio in range(0, len(entradas), tamanho_lote):
+            lote = entradas[inicio:inicio + tamanho_lote]
+            normalizados = [normalizar_nome(nome) for nome, _ in lote]
+            validos = [i for i, nome in enumerate(normalizados) if nome]
+            if not validos:
+                continue
+            ufs = [CODIGO_UF.get(str(uf or '').strip().upper(), 0) for _, uf in lote]
+            consultas = [normalizados[i] for i in validos]
+            pos_entradas, nome_ids = self.candidatos(consultas)
+            
+            # Limite superior do quick_ratio() de todos os pares de uma vez (letras em
+            # comum, sem a ordem): só quem passa vai para o ratio() completo
+            distintos, posicao_nome = np.unique(nome_ids, return_inverse=True)
+            nomes = [self.nome(nome_id) for nome_id in distintos.tolist()]
+            letras_nomes, letras_consultas = _letras(nomes), _letras(consultas)
+            tamanhos_nomes = letras_nomes.sum(axis=1)
+            tamanhos_consultas = letras_consultas.sum(axis=1)
+            passam = np.flatnonzero(
+                2 * np.minimum(letras_consultas[pos_entradas], letras_nomes[posicao_nome]).sum(axis=1)
+                >= limiar * (tamanhos_consultas[pos_entradas] + tamanhos_nomes[posicao_nome]))
+            
+            # Os pares vêm ordenados por entrada: um comparador por entrada, como em escolher_candidato
+            comparador, atual, pares = None, None, []
+            for posicao, indice_nome in zip(pos_entradas[passam].tolist(), posicao_nome[passam].tolist()):
+                i = validos[posicao]
+                if i != atual:
+                    if pares:
+                        resultado.extend(self._socios_dos_pares(inicio + atual, ufs[atual], pares, limite))
+                    comparador, atual, pares = SequenceMatcher(None, normalizados[i]), i, []
+                nome = nomes[indice_nome]
+                comparador.set_seq2(nome)
+                score = comparador.ratio()
+                if score >= limiar:
+                    pares.append((score, int(distintos[indice_nome]), nome))
+            if pares:
+                resultado.extend(self._socios_dos_pares(inicio + atual, ufs[atual], pares, limite))
+        return resultado
+    
+    def _socios_dos_pares(self, entrada, uf, pares, limite):
+        """ParConciliacao dos sócios dos nomes que passaram, filtrados pela UF"""
+        pares.sort(key=lambda par: (-par[0], par[1]))
+        encontrados = []
+        for score, nome_id, nome in pares:
+            inicio, fim = int(self.inicio_socios[nome_id]), int(self.inicio_socios[nome_id + 1])
+            posicoes = np.arange(inicio, fim)
+            if uf:
+                posicoes = posicoes[self.socio_uf[inicio:fim] == uf]
+            for rowid, cnpj, codigo_uf in zip(self.socio_rowid[posicoes].tolist(), self.socio_cnpj[posicoes].tolist(),
+                                              self.socio_uf[posicoes].tolist()):
+                encontrados.append(ParConciliacao(entrada, nome, score, rowid, f"{cnpj:08d}", UFS[codigo_uf]))
+                if len(encontrados) >= limite:
+                    return encontrados
+        return encontrados
+
+def ler_entradas(arquivo):
+    """Lista de (nome, uf) de um CSV com colunas nome e uf (uf opcional) ou de um TXT com um nome por linha"""
+    if os.path.splitext(arquivo)[1].lower() == '.csv':
+        df = pd.read_csv(arquivo, sep=None, engine='python', dtype=str).fillna('')
+        col_nome = next((c for c in df.columns if 'nome' in c.lower()), df.columns[0])
+        col_uf = next((c for c in df.columns if c.strip().lower() == 'uf'), None)
+        return list(zip(df[col_nome], df[col_uf] if col_uf else [''] * len(df)))
+    with open(arquivo, 'r', encoding='utf-8') as f:
+        return [(linha.strip(), '') for linha in f if linha.strip()]
+
+def conciliar_arquivo(db_path, arquivo, limiar=0.7, limite=100):
+    """Concilia um arquivo de nomes (e UFs) com os sócios e grava <arquivo>_pares.csv"""
+    entradas = ler_entradas(arquivo)
+    print(f"Encontradas {len(entradas):,} entradas em {arquivo}")
+    indice = IndiceLSH.carregar(db_path)
+    
+    inicio = time.time()
+    pares = indice.conciliar(entradas, limiar, limite)
+    print(f"{len(pares):,} pares candidatos em {time.time() - inicio:.1f}s "
+          f"({len({par.entrada for par in pares}):,} entradas com algum candidato)")
+    
+    # Nome original e documento dos sócios encontrados, pelo rowid
+    socios = {}
+    motor = MotorSQLite(db_path)
+    try:
+        rowids = sorted({par.socio for par in pares})
+        for i in range(0, len(rowids), 900):
+            bloco = rowids[i:i + 900]
+            socios.update((linha[0], linha[1:]) for linha in motor._executar(
+                f"SELECT rowid, nome_socio, cnpj_cpf_socio FROM socios WHERE rowid IN ({', '.join('?' * len(bloco))})",
+                bloco))
+    finally:
+        motor.fechar()
+    
+    nome_saida = os.path.splitext(arquivo)[0] + "_pares.csv"
+    pd.DataFrame([
+        {
+            'nome': entradas[par.entrada][0],
+            'uf': entradas[par.entrada][1],
+            'nome_encontrado': socios.get(par.socio, ('', ''))[0],
+            'cpf': socios.get(par.socio, ('', ''))[1],
+            'cnpj_basico': par.cnpj_basico,
+            'uf_empresa': par.uf,
+            'score': round(par.score, 4)
+        }
+        for par in pares
+    ], columns=['nome', 'uf', 'nome_encontrado', 'cpf', 'cnpj_basico', 'uf_empresa', 'score']).to_csv(
+        nome_saida, index=False)
+    print(f"Pares salvos em {nome_saida}")
+    return pares
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Índice MinHash/LSH dos nomes de sócios e conciliação só por nome")
+    parser.add_argument("--banco", type=str, default="cnpj_completo.db", help="Caminho para o banco de dados")
+    parser.add_argument("--forcar", action="store_true", help="Reconstruir mesmo se o índice estiver atualizado")
+    parser.add_argument("--arquivo", type=str, help="Nomes a conciliar (CSV com colunas nome e uf, ou TXT)")
+    parser.add_argument("--limiar", type=float, default=0.7, help="Similaridade mínima dos pares (0.0-1.0)")
+    parser.add_argument("--limite", type=int, default=100, help="Máximo de sócios por entrada")
+    
+    args = parser.parse_args()
+    
+    diretorio = diretorio_lsh(args.banco)
+    if args.forcar or not IndiceLSH.atualizado(diretorio, args.banco):
+        inicio = time.time()
+        indice = IndiceLSH.construir(args.banco)
+        indice.salvar(diretorio, args.banco)
+        print(f"Índice LSH construído em {time.time() - inicio:.1f}s: {len(indice):,} nomes, "
+              f"{len(indice.socio_rowid):,} sócios -> {diretorio}")
+    else:
+        print(f"Índice LSH já atualizado: {diretorio}")
+    
+    if args.arquivo:
+        conciliar_arquivo(args.banco, args.arquivo, args.limiar, args.limite)
@@ -0,0 +1,339 @@
+#!/usr/bin/env python3
+# indice_memoria.py - Índice de sócios em memória (NumPy) para consultas em lote
+import os
+import json
+import time
+import shutil
+import argparse
+from array import array
+
+import numpy as np
+
+from carregar_base import extrair_miolo
+from motor_consulta import MotorSQLite, Socio, SocioEmpresa, IDENTIFICADOR_PF
+
+VERSAO_INDICE = 6
+
+# Formato do documento do sócio, para reconstruir o texto original a partir dos dígitos
+MASCARADO = 0   # CPF mascarado: ***XXXXXX**
+CNPJ = 1        # 14 dígitos (sócio pessoa jurídica)
+CPF = 2         # 11 dígitos
+OUTRO = 3       # Vazio ou fora do padrão
+
+# Arrays do índice (uma coluna por arquivo .npy)
+ARRAYS = ['miolo', 'cnpj', 'nome_id', 'documento', 'formato', 'identificador', 'qualificacao', 'nomes_dados',
+          'nomes_offsets', 'cnpj_ordenado', 'posicao_cnpj']
+
+# Miolo das linhas sem miolo válido (nunca coincide com um miolo de 6 dígitos)
+SEM_MIOLO = np.iinfo(np.uint32).max
+
+# Qualificação ausente ou fora do padrão (os códigos da Receita têm 2 dígitos)
+SEM_QUALIFICACAO = np.iinfo(np.uint8).max
+
+def diretorio_indice(db_path):
+    """Diretório do índice, ao lado do banco (ex.: cnpj_completo.db.indice/)"""
+    return db_path + '.indice'
+
+def _codificar_documento(documento):
+    """Documento do sócio -> (dígitos como inteiro, formato)"""
+    if not documento:
+        return 0, OUTRO
+    digitos = ''.join(c for c in documento if c.isdigit())
+    if documento.startswith('***'):
+        return int(digitos or 0), MASCARADO
+    if len(digitos) == 14:
+        return int(digitos), CNPJ
+    if len(digitos) == 11:
+        return int(digitos), CPF
+    return int(digitos or 0), OUTRO
+
+def _formatar_documento(valor, formato):
+    if formato == MASCARADO:
+        return f"***{valor:06d}**"
+    if formato == CNPJ:
+        return f"{valor:014d}"
+    if formato == CPF:
+        return f"{valor:011d}"
+    return str(valor) if valor else ''
+
+class IndiceMemoria:
+    """
+    Colunas quentes da tabela de sócios em arrays NumPy ordenados por miolo:
+        
+        miolo      uint32  miolo do CPF (6 dígitos; SEM_MIOLO se não houver ou se
+                           o sócio não é pessoa física, como nas buscas SQL)
+        cnpj       uint32  cnpj_basico (8 dígitos)
+        nome_id    uint32  posição do nome na tabela de nomes
+        documento  uint64  dígitos de cnpj_cpf_socio
+        formato    uint8   como reconstruir o texto do documento
+        identificador uint8 identificador_socio (1 PJ, 2 PF, 3 estrangeiro; 0 se ausente)
+        qualificacao uint8  código de qualificacao_socio (SEM_QUALIFICACAO se ausente)
+    
+    Os nomes distintos ficam em um único buffer UTF-8 (nomes_dados) com os
+    deslocamentos em nomes_offsets, sem um objeto Python por nome. Para a
+    busca por empresa, cnpj_ordenado traz os cnpj_basico em ordem e
+    posicao_cnpj a linha correspondente nos arrays acima.
+    
+    Um lote inteiro de miolos é resolvido com duas chamadas a np.searchsorted;
+    só as faixas encontradas viram objetos Python para a comparação de nomes.
+    
+    Aberto com mmap=True, os arrays são mapeados dos arquivos .npy sem
+    cópia: vários processos (workers do lote, workers da API) compartilham
+    as mesmas páginas do cache do sistema, e a memória total não cresce com
+    o número de processos.
+    """
+    
+    def __init__(self, arrays):
+        for nome in ARRAYS:
+            setattr(self, nome, arrays[nome])
+    
+    def __len__(self):
+        return len(self.miolo)
+    
+    @classmethod
+    def construir(cls, db_path, tamanho_lote=200000):
+        """Lê a tabela de sócios em lotes e monta os arrays"""
+        motor = MotorSQLite(db_path)
+        try:
+            col = motor.colunas('socios')
+            usar_coluna_miolo = motor.miolo_corrigido()
+            cobertura = bool(motor._executar(
+                "SELECT 1 FROM sqlite_master WHERE type = 'index' "
+                "AND name = 'idx_socios_pf_miolo'"))
+            so_pf = bool(col['identificador_socio'])
+            
+            miolos, cnpjs, nome_ids, documentos, formatos, identificadores, qualificacoes = (
+                array('I'), array('I'), array('I'), array('Q'), array('B'), array('B'), array('B'))
+            ids_nome = {}
+            nomes = []
+            
+            cursor = motor.conn.cursor()
+            # CAST: em bancos antigos identificador_socio é texto ('1', '2'), que não
+            # seria igual aos inteiros comparados abaixo
+            cursor.execute(f"""
+            SELECT {'cpf_miolo' if usar_coluna_miolo else 'NULL'}, "{col['cnpj_basico']}",
+                   "{col['nome_socio']}", "{col['cnpj_cpf_socio']}",
+                   {f'CAST("{col["identificador_socio"]}" AS INTEGER)' if col['identificador_socio'] else 'NULL'},
+                   {f'"{col["qualificacao_socio"]}"' if col['qualificacao_socio'] else 'NULL'}
+            FROM socios NOT INDEXED
+            """)  # NOT INDEXED: ordem física (rowid), mesmo que um índice cubra as colunas
+            while True:
+                linhas = cursor.fetchmany(tamanho_lote)
+                if not linhas:
+                    break
+                for miolo, cnpj_basico, nome, documento, identificador, qualificacao in linhas:
+                    if not usar_coluna_miolo:
+                        miolo = extrair_miolo(documento)
+                    if not cnpj_basico or not str(cnpj_basico).isdigit():
+                        continue
+                    nome = nome or ''
+                    nome_id = ids_nome.get(nome)
+                    if nome_id is None:
+                        nome_id = ids_nome[nome] = len(nomes)
+                        nomes.append(nome)
+                    valor, formato = _codificar_documento(documento)
+                    if so_pf and identificador != IDENTIFICADOR_PF:
+                        miolo = None
+                    miolos.append(int(miolo) if miolo and len(miolo) == 6 and miolo.isdigit() else SEM_MIOLO)
+                    cnpjs.append(int(cnpj_basico))
+                    nome_ids.append(nome_id)
+                    documentos.append(valor)
+                    formatos.append(formato)
+                    identificadores.append(identificador if identificador in (1, 2, 3) else 0)
+                    qualificacao = str(qualificacao or '')
+                    qualificacoes.append(int(qualificacao) if len(qualificacao) == 2 and qualificacao.isdigit()
+                                         else SEM_QUALIFICACAO)
+        finally:
+            motor.fechar()
+        
+        del ids_nome
+        miolo = np.frombuffer(miolos, dtype=np.uint32)
+        cnpj = np.frombuffer(cnpjs, dtype=np.uint32)
+        # Mesma ordem das buscas SQL, para que os empates na escolha do candidato
+        # caiam na mesma linha. Ordenações estáveis: nos empates fica a ordem da tabela (rowid)
+        if cobertura:
+            # Índice de cobertura: (cpf_miolo, cnpj_basico, nome_socio, ..., rowid)
+            posto_nome = np.empty(len(nomes), dtype=np.uint32)
+            posto_nome[sorted(range(len(nomes)), key=nomes.__getitem__)] = np.arange(len(nomes), dtype=np.uint32)
+            ordem = np.lexsort((posto_nome[np.frombuffer(nome_ids, dtype=np.uint32)], cnpj, miolo))
+        else:
+            # Índice só de cpf_miolo: (cpf_miolo, rowid)
+            ordem = np.argsort(miolo, kind='stable')
+        ordem_cnpj = np.argsort(cnpj, kind='stable')
+        inversa = np.empty_like(ordem)
+        inversa[ordem] = np.arange(len(ordem))
+        
+        codificados = [n.encode('utf-8') for n in nomes]
+        offsets = np.zeros(len(codificados) + 1, dtype=np.uint64)
+        np.cumsum([len(n) for n in codificados], out=offsets[1:])
+        
+        return cls({
+            'miolo': miolo[ordem],
+            'cnpj': cnpj[ordem],
+            'nome_id': np.frombuffer(nome_ids, dtype=np.uint32)[ordem],
+            'documento': np.frombuffer(documentos, dtype=np.uint64)[ordem],
+            'formato': np.frombuffer(formatos, dtype=np.uint8)[ordem],
+            'identificador': np.frombuffer(identificadores, dtype=np.uint8)[ordem],
+            'qualificacao': np.frombuffer(qualificacoes, dtype=np.uint8)[ordem],
+            'nomes_dados': np.frombuffer(b''.join(codificados), dtype=np.uint8),
+            'nomes_offsets': offsets,
+            'cnpj_ordenado': cnpj[ordem_cnpj],
+            'posicao_cnpj': inversa[ordem_cnpj].astype(np.uint32),
+        })
+    
+    def salvar(self, diretorio, db_path=None):
+        """
+        Grava um .npy por array e indice.json com a versão e o banco de origem.
+        Os arquivos são escritos em um diretório temporário e trocados no fim,
+        para que processos que abrem o índice nunca vejam uma gravação pela metade.
+        """
+        temporario = diretorio + '.tmp'
+        if os.path.isdir(temporario):
+            shutil.rmtree(temporario)
+        os.makedirs(temporario)
+        for nome in ARRAYS:
+            np.save(os.path.join(temporario, f"{nome}.npy"), getattr(self, nome))
+        metadados = {'versao': VERSAO_INDICE, 'linhas': len(self), 'nomes': len(self.nomes_offsets) - 1}
+        if db_path:
+            metadados['banco'] = os.path.abspath(db_path)
+            metadados['banco_mtime'] = os.path.getmtime(db_path)
+        with open(os.path.join(temporario, 'indice.json'), 'w', encoding='utf-8') as f:
+            json.dump(metadados, f, indent=2)
+        
+        if os.path.isdir(diretorio):
+            shutil.rmtree(diretorio)
+        os.rename(temporario, diretorio)
+    
+    @classmethod
+    def abrir(cls, diretorio, mmap=True):
+        """
+        Abre os arrays gravados por salvar(). Com mmap=True (padrão) eles são
+        mapeados somente leitura, sem cópia; com mmap=False são lidos para a
+        memória do processo.
+        """
+        modo = 'r' if mmap else None
+        return cls({nome: np.load(os.path.join(diretorio, f"{nome}.npy"), mmap_mode=modo) for nome in ARRAYS})
+    
+    @staticmethod
+    def atualizado(diretorio, db_path):
+        """Se o índice gravado existe e foi gerado a partir da versão atual do banco"""
+        caminho = os.path.join(diretorio, 'indice.json')
+        if not os.path.exists(caminho):
+            return False
+        with open(caminho, 'r', encoding='utf-8') as f:
+            metadados = json.load(f)
+        return (metadados.get('versao') == VERSAO_INDICE
+                and metadados.get('banco_mtime') == os.path.getmtime(db_path))
+    
+    @classmethod
+    def carregar(cls, db_path, mmap=True):
+        """Abre o índice do banco, construindo e gravando se não existir ou estiver desatualizado"""
+        diretorio = diretorio_indice(db_path)
+        if not cls.atualizado(diretorio, db_path):
+            print(f"Construindo índice em memória de {db_path}...")
+            inicio = time.time()
+            indice = cls.construir(db_path)
+            indice.salvar(diretorio, db_path)
+            print(f"Índice construído em {time.time() - inicio:.1f}s ({len(indice):,} sócios)")
+        return cls.abrir(diretorio, mmap)
+    
+    def nome(self, nome_id):
+        inicio, fim = int(self.nomes_offsets[nome_id]), int(self.nomes_offsets[nome_id + 1])
+        return self.nomes_dados[inicio:fim].tobytes().decode('utf-8')
+    
+    def faixas(self, miolos):
+        """Início e fim (exclusivo) das linhas de cada miolo do lote, com uma busca binária vetorizada"""
+        miolos = np.asarray(miolos, dtype=np.uint32)
+        return (np.searchsorted(self.miolo, miolos, side='left'),
+                np.searchsorted(self.miolo, miolos, side='right'))
+    
+    def linhas(self, posicoes):
+        """
+        Linhas nas posições dadas como motor_consulta.Socio, o formato de
+        MotorConsulta.socios_por_miolo.
+        As colunas são extraídas de uma vez (fancy indexing + tolist) e cada nome
+        distinto é decodificado uma só vez.
+        """
+        cnpjs = self.cnpj[posicoes].tolist()
+        nome_ids = self.nome_id[posicoes].tolist()
+        documentos = self.documento[posicoes].tolist()
+        formatos = self.formato[posicoes].tolist()
+        identificadores = self.identificador[posicoes].tolist()
+        nomes = {i: self.nome(i) for i in set(nome_ids)}
+        # Socio._make direto sobre o zip: sem passar pelo __new__ em Python da namedtuple
+        return list(map(Socio._make, zip(
+            [f"{cnpj:08d}" for cnpj in cnpjs],
+            [nomes[nome_id] for nome_id in nome_ids],
+            [_formatar_documento(documento, formato) for documento, formato in zip(documentos, formatos)],
+            [identificador or None for identificador in identificadores],
+        )))
+    
+    def socios_da_empresa(self, cnpj_basico):
+        """
+        Lista de SocioEmpresa (nome, cpf/cnpj, código da qualificação) dos sócios da
+        empresa; MotorMemoria decodifica a qualificação como MotorConsulta.socios_da_empresa
+        """
+        if not cnpj_basico or not str(cnpj_basico).isdigit():
+            return []
+        chave = np.uint32(int(cnpj_basico))
+        inicio = int(np.searchsorted(self.cnpj_ordenado, chave, side='left'))
+        fim = int(np.searchsorted(self.cnpj_ordenado, chave, side='right'))
+        posicoes = self.posicao_cnpj[inicio:fim]
+        qualificacoes = [None if q == SEM_QUALIFICACAO else f"{q:02d}" for q in self.qualificacao[posicoes].tolist()]
+        return [SocioEmpresa(s.nome_socio, s.cnpj_cpf_socio, q) for s, q in zip(self.linhas(posicoes), qualificacoes)]
+    
+    def faixas_lote(self, miolos, limite=None):
+        """
+        Faixas [inicio, fim) de cada miolo do lote (strings de 6 dígitos), com no
+        máximo `limite` linhas por miolo. Miolos inválidos ou sem sócios ficam de fora.
+        """
+        validos = sorted({m for m in miolos if m and len(m) == 6 and m.isdigit()})
+        if not validos:
+            return {}
+        inicios, fins = self.faixas([int(m) for m in validos])
+        if limite is not None:
+            fins = np.minimum(fins, inicios + limite)
+        return {
+            miolo: (inicio, fim)
+            for miolo, inicio, fim in zip(validos, inicios.tolist(), fins.tolist()) if fim > inicio
+        }
+    
+    def buscar_lote(self, miolos, limite=None):
+        """
+        Resolve um lote de miolos de uma vez e já monta os sócios de todas as faixas.
+        Retorna {miolo: [sócios]}; miolos inválidos ou sem sócios ficam com lista vazia.
+        """
+        resultado = {m: [] for m in miolos if m}
+        faixas = self.faixas_lote(resultado, limite)
+        if not faixas:
+            return resultado
+        
+        # Posições de todas as faixas encontradas em um único array
+        inicios = np.array([inicio for inicio, _ in faixas.values()], dtype=np.int64)
+        tamanhos = np.array([fim - inicio for inicio, fim in faixas.values()], dtype=np.int64)
+        acumulado = np.cumsum(tamanhos)
+        posicoes = np.arange(int(acumulado[-1])) + np.repeat(inicios - (acumulado - tamanhos), tamanhos)
+        socios = self.linhas(posicoes)
+        
+        fim = 0
+        for miolo, tamanho in zip(faixas, tamanhos.tolist()):
+            resultado[miolo] = socios[fim:fim + tamanho]
+            fim += tamanho
+        return resultado
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Constrói o índice de sócios em memória (arquivos .npy)")
+    parser.add_argument("--banco", type=str, default="cnpj_completo.db", help="Caminho para o banco de dados")
+    parser.add_argument("--forcar", action="store_true", help="Reconstruir mesmo se o índice estiver atualizado")
+    
+    args = parser.parse_args()
+    
+    diretorio = diretorio_indice(args.banco)
+    if args.forcar or not IndiceMemoria.atualizado(diretorio, args.banco):
+        inicio = time.time()
+        indice = IndiceMemoria.construir(args.banco)
+        indice.salvar(diretorio, args.banco)
+        print(f"Índice construído em {time.time() - inicio:.1f}s: {len(indice):,} sócios, "
+              f"{len(indice.nomes_offsets) - 1:,} nomes distintos -> {diretorio}")
+    else:
+        print(f"Índice já atualizado: {diretorio}")
@@ -0,0 +1,881 @@
+#!/usr/bin/env python3
+# motor_consulta.py - Backends de acesso à base CNPJ (SQLite e DuckDB)
+import os
+import sqlite3
+from itertools import groupby
+from operator import itemgetter
+from collections import namedtuple
+
+import numpy as np
+import pandas as pd
+
+# Nomes possíveis de cada coluna: primeiro o do layout da Receita (bancos criados
+# por carregar_base.py), depois os derivados do "cabeçalho" nos bancos antigos
+COLUNAS_CONHECIDAS = {
+    'socios': {
+        'cnpj_basico': ['cnpj_basico', '03769328'],
+        'nome_socio': ['nome_socio', 'livia_maria_andrade_ramos_gaertner'],
+        'cnpj_cpf_socio': ['cnpj_cpf_socio', '***331355**'],
+        'cpf_miolo': ['cpf_miolo'],
+        'identificador_socio': ['identificador_socio', '2'],
+        'qualificacao_socio': ['qualificacao_socio'],
+    },
+    'estabelecimentos': {
+        'situacao_cadastral': ['situacao_cadastral', '02'],
+        'cnae_principal': ['cnae_fiscal_principal', 'cnae_principal', '4723700'],
+        'logradouro': ['logradouro', 'rua'],
+        'numero': ['numero', 'nilso_braun'],
+        'bairro': ['bairro', 'parque_das_palmeiras'],
+        'uf': ['uf', 'sc'],
+        'cnpj_ordem': ['cnpj_ordem'],
+        'municipio': ['municipio'],
+    },
+    # Tabela derivada de carregar_base.py; municipio só nas versões mais novas
+    'empresa_resumo': {
+        'municipio': ['municipio'],
+    },
+}
+
+# Tabelas onde o nome da empresa pode estar, na ordem de preferência
+# (as duas primeiras existem apenas nos bancos antigos)
+TABELAS_NOME_EMPRESA = [
+    ('k3241k03200y0d', 'col_1', 'col_0'),
+    ('outros', 'col_1', 'col_0'),
+    ('empresas', 'razao_social', 'cnpj_basico'),
+]
+
+# A partir de quantos itens na lista de entrada o processamento em lote
+# faz uma junção única com a base em vez de uma consulta por item
+LIMIAR_JUNCAO = 50
+
+# No SQLite, a partir de que fração (linhas da entrada / sócios pessoa física do
+# índice por miolo) o processamento de sócios ordena a entrada por miolo e lê o
+# índice em sequência (sort-merge) no lugar de uma busca no índice por linha
+RAZAO_SORT_MERGE = 0.02
+
+# Registros devolvidos pelos motores. São namedtuples (sem __dict__ por
+# instância): um lote de milhões de candidatos não vira milhões de dicts
+CAMPOS_SOCIO = ('cnpj_basico', 'nome_socio', 'cnpj_cpf_socio', 'identificador_socio')
+Socio = namedtuple('Socio', CAMPOS_SOCIO)
+
+CAMPOS_ESTABELECIMENTO = ('situacao_cadastral', 'rua', 'numero', 'bairro', 'uf', 'cnae_principal', 'municipio')
+Estabelecimento = namedtuple('Estabelecimento', CAMPOS_ESTABELECIMENTO)
+
+# Sócio de uma empresa, no formato do resultado de verificar_cnpj_direto
+# (qualificação já decodificada pela tabela qualificacoes)
+SocioEmpresa = namedtuple('SocioEmpresa', ('nome', 'cpf', 'qualificacao'))
+
+# Índice FTS5 dos nomes normalizados dos sócios (carregar_base.py), sem conteúdo
+# próprio: o rowid de cada entrada é o da linha em socios
+TABELA_NOMES = 'socios_fts'
+
+# Candidatos lidos do índice de nomes por consulta (ordem BM25), antes da comparação de nomes
+LIMITE_FTS = 50
+
+# O BM25 custa uma leitura por linha casada: em nomes muito comuns (ex.: MARIA SILVA)
+# só as primeiras LIMITE_RANQUEAMENTO linhas casadas (ordem de rowid) são ranqueadas
+LIMITE_RANQUEAMENTO = 1000
+
+# Letras do começo de cada termo na última busca do índice de nomes (termo*)
+PREFIXO_TERMO = 4
+
+# Nomes normalizados (razão social e nomes fantasia) de cada empresa, em ordem
+# (carregar_base.py): o autocompletar é uma busca por faixa na chave primária
+TABELA_NOMES_EMPRESAS = 'nomes_empresas'
+LIMITE_SUGESTOES = 10
+
+# Empresa sugerida pelo autocompletar: o nome que casou com o prefixo e os dados de empresa_resumo
+SugestaoEmpresa = namedtuple('SugestaoEmpresa', ('cnpj_basico', 'nome', 'razao_social', 'situacao_cadastral',
+                                                 'situacao_descricao'))
+
+# Chave fonética do nome de cada sócio (carregar_base.py), com o miolo e o rowid
+# da linha em socios: bloqueio das buscas por nome antes da comparação fuzzy
+TABELA_FONETICA = 'socios_fonetica'
+
+# Tabelas auxiliares da Receita (codigo, descricao), lidas uma vez por motor
+TABELAS_DIMENSAO = ('cnaes', 'municipios', 'naturezas', 'qualificacoes', 'motivos', 'paises')
+
+# Empresa em que uma pessoa jurídica é sócia
+Participacao = namedtuple('Participacao', ('cnpj_basico', 'nome_empresa'))
+
+# Grupo econômico da empresa (tabela grupos_economicos de carregar_base.py):
+# grupo_id é o menor cnpj_basico do grupo, empresas é o tamanho do grupo
+GrupoEconomico = namedtuple('GrupoEconomico', ('grupo_id', 'empresas'))
+
+# Linha de empresa_resumo (carregar_base.py): nome, dados da matriz (ou do primeiro
+# estabelecimento) e as contagens de estabelecimentos e sócios da empresa
+CAMPOS_RESUMO = ('razao_social', 'situacao_cadastral', 'situacao_descricao', 'logradouro', 'numero',
+                 'bairro', 'uf', 'cnae_principal', 'municipio', 'estabelecimentos', 'socios')
+EmpresaResumo = namedtuple('EmpresaResumo', CAMPOS_RESUMO)
+
+# identificador_socio do layout da Receita. A busca por CPF só olha pessoas
+# físicas; os sócios pessoa jurídica são buscados pelo CNPJ completo
+IDENTIFICADOR_PJ = 1
+IDENTIFICADOR_PF = 2
+
+# Miolo gravado nas linhas sem CPF recuperável: '' por carregar_base.extrair_miolo
+# e '000000' por corrigir_formatos_incorretos.py. Ficam fora do índice por miolo
+MIOLOS_SENTINELA = ('', '000000')
+
+# Baldes (sócios de um mesmo miolo) com mais linhas que isso são quentes: a busca
+# vai primeiro só aos sócios com a chave fonética do nome procurado (socios_fonetica)
+# e lê o balde inteiro com socios_por_miolo se nenhum deles tem o nome exato
+LIMITE_BALDE_QUENTE = 100
+
+# Ordem dos sócios de um miolo: a do índice de cobertura, então o SQLite não ordena
+# nada; nos outros backends os empates da escolha do candidato caem na mesma linha
+ORDEM_SOCIOS = 'cnpj_basico, nome_socio'
+
+# Bancos com menos miolos de CPF válidos que isso ainda não passaram pela correção
+MINIMO_MIOLOS_VALIDOS = 1000
+
+def filtro_sentinelas(expressao='cpf_miolo'):
+    """Condição do índice parcial por miolo (a consulta precisa repeti-la para usá-lo)"""
+    valores = ', '.join(f"'{m}'" for m in MIOLOS_SENTINELA)
+    return f"{expressao} NOT IN ({valores})"
+
+def filtro_identificador(identificador, coluna='identificador_socio'):
+    """Condição dos índices parciais de pessoa física / jurídica"""
+    return f"{coluna} = {identificador}"
+
+def _mapear_colunas(existentes, tabela):
+    """Nome real de cada coluna lógica da tabela (None se ausente)"""
+    return {
+        logico: next((c for c in candidatos if c in existentes), None)
+        for logico, candidatos in COLUNAS_CONHECIDAS[tabela].items()
+    }
+
+class MotorConsulta:
+    """
+    Acesso aos dados usados pelas consultas de sócio e de CNPJ. As subclasses
+    só implementam a execução de SQL e a listagem de tabelas/colunas; as
+    consultas em si são as mesmas nos dois backends.
+    
+    Os métodos preparar_* fazem uma junção única com a lista de entrada e
+    guardam os resultados em memória; as consultas pontuais seguintes saem
+    desses caches. No SQLite (índices B-tree) elas não fazem nada.
+    """
+    
+    nome = None
+    
+    def __init__(self):
+        self._mapeamentos = {}
+        self._socios_por_miolo = {}
+        self._tamanhos_balde = {}
+        self._socios_da_empresa = {}
+        self._participacoes = {}
+        self._grupos = {}
+        self._resumos = {}
+        self._tabelas_existentes = None
+        self._dimensoes = None
+        self._estabelecimentos = {}
+        # Bitmaps de presença (bitmap_presenca.py), quando o backend os tem
+        self.presenca = None
+        self._nomes_empresa = {}
+    
+    # Implementados pelos backends
+    def _executar(self, sql, parametros=()):
+        raise NotImplementedError
+    
+    def _colunas_tabela(self, tabela):
+        raise NotImplementedError
+    
+    def _tabelas(self):
+        raise NotImplementedError
+    
+    def fechar(self):
+        pass
+    
+    def tem_tabela(self, tabela):
+        """Se o banco tem a tabela (as tabelas são listadas uma vez por motor)"""
+        if self._tabelas_existentes is None:
+            self._tabelas_existentes = self._tabelas()
+        return tabela in self._tabelas_existentes
+    
+    def _sem_miolo(self, miolo):
+        """Se o bitmap garante que nenhum sócio pessoa física tem este miolo (sem SQL)"""
+        return self.presenca is not None and not self.presenca.tem_miolo(miolo)
+    
+    def _sem_empresa(self, cnpj_basico):
+        """Se o bitmap garante que o CNPJ básico não tem estabelecimento (sem SQL)"""
+        return self.presenca is not None and not self.presenca.tem_cnpj(cnpj_basico)
+    
+    def dimensao(self, tabela):
+        """
+        {codigo: descricao} de uma tabela auxiliar (TABELAS_DIMENSAO). Na primeira
+        chamada todas são lidas de uma vez (alguns milhares de linhas no total);
+        depois, decodificar um código é só uma consulta ao dict, sem SQL nem junção.
+        Tabelas ausentes no banco ficam vazias.
+        """
+        if self._dimensoes is None:
+            self._dimensoes = {
+                nome: dict(self._executar(f"SELECT codigo, descricao FROM {nome}")) if self.tem_tabela(nome) else {}
+                for nome in TABELAS_DIMENSAO
+            }
+        return self._dimensoes[tabela]
+    
+    def _socios_empresa(self, linhas):
+        """SocioEmpresa de linhas (nome, documento, código da qualificação), com a qualificação decodificada"""
+        qualificacoes = self.dimensao('qualificacoes')
+        return [SocioEmpresa(nome, cpf, qualificacoes.get(codigo, codigo)) for nome, cpf, codigo in linhas]
+    
+    def colunas(self, tabela):
+        """Mapeamento lógico -> real das colunas da tabela"""
+        if tabela not in self._mapeamentos:
+            self._mapeamentos[tabela] = _mapear_colunas(self._colunas_tabela(tabela), tabela)
+        return self._mapeamentos[tabela]
+    
+    def _expressao_miolo(self):
+        """Expressão SQL do miolo do CPF do sócio"""
+        return f'"{self.colunas("socios")["cpf_miolo"]}"'
+    
+    def _select_socios(self):
+        """
+        Só as colunas de CAMPOS_SOCIO: com o índice de cobertura de carregar_base.py
+        (cpf_miolo seguido delas), a busca por miolo não lê as páginas da tabela
+        """
+        col = self.colunas('socios')
+        identificador = f'"{col["identificador_socio"]}"' if col['identificador_socio'] else 'NULL'
+        return (f'"{col["cnpj_basico"]}" AS cnpj_basico, "{col["nome_socio"]}" AS nome_socio, '
+                f'"{col["cnpj_cpf_socio"]}" AS cnpj_cpf_socio, {identificador} AS identificador_socio')
+    
+    def _select_estabelecimentos(self):
+        """
+        Colunas de estabelecimentos na ordem de CAMPOS_ESTABELECIMENTO; as que não
+        existem no banco saem como NULL (endereço) ou '' (bairro, uf, cnae)
+        """
+        col = self.colunas('estabelecimentos')
+        selecao = [f'"{col["situacao_cadastral"] or "situacao_cadastral"}" AS situacao_cadastral']
+        for logico, alias, ausente in [('logradouro', 'rua', 'NULL'), ('numero', 'numero', 'NULL'),
+                                       ('bairro', 'bairro', "''"), ('uf', 'uf', "''"),
+                                       ('cnae_principal', 'cnae_principal', "''"),
+                                       ('municipio', 'municipio', 'NULL')]:
+            selecao.append(f'"{col[logico]}" AS {alias}' if col[logico] else f'{ausente} AS {alias}')
+        return ', '.join(selecao)
+    
+    def _filtro_pf(self):
+        """' AND identificador = PF', a condição dos índices por miolo ('' em bancos sem a coluna)"""
+        col = self.colunas('socios')['identificador_socio']
+        if not col:
+            return ''
+        coluna = f'"{col}"'
+        return f" AND {filtro_identificador(IDENTIFICADOR_PF, coluna)}"
+    
+    def tamanho_balde(self, miolo):
+        """Número de sócios pessoa física com este miolo, contado só até LIMITE_BALDE_QUENTE + 1"""
+        if miolo not in self._tamanhos_balde:
+            if self._sem_miolo(miolo):
+                return 0
+            self._tamanhos_balde[miolo] = self._executar(
+                f"SELECT COUNT(*) FROM (SELECT 1 FROM socios WHERE {self._expressao_miolo()} = ?{self._filtro_pf()} "
+                f"LIMIT {LIMITE_BALDE_QUENTE + 1})", (miolo,)
+            )[0][0]
+        return self._tamanhos_balde[miolo]
+    
+    def guardar_balde(self, miolo, socios):
+        """Guarda os sócios do miolo já lidos (varredura em ordem): socios_por_miolo sai do cache"""
+        self._socios_por_miolo[miolo] = socios
+        self._tamanhos_balde[miolo] = len(socios)
+    
+    def descartar_balde(self, miolo):
+        self._socios_por_miolo.pop(miolo, None)
+        self._tamanhos_balde.pop(miolo, None)
+    
+    def balde_quente(self, miolo):
+        """Se o miolo tem mais de LIMITE_BALDE_QUENTE sócios"""
+        return self.tamanho_balde(miolo) > LIMITE_BALDE_QUENTE
+    
+    def socios_por_miolo(self, miolo):
+        """
+        Sócios pessoa física cujo CPF tem este miolo, como Socio (sem montar um dict
+        por candidato), todos, sem corte
+        """
+        if self._sem_miolo(miolo):
+            return []
+        miolo_sql = self._expressao_miolo()
+        if miolo in self._socios_por_miolo:
+            return self._socios_por_miolo[miolo]
+        # Repete as condições do índice parcial, que só tem pessoas físicas e não tem
+        # as linhas sentinela
+        filtro = self._filtro_pf()
+        if miolo not in MIOLOS_SENTINELA:
+            filtro += f" AND {filtro_sentinelas(miolo_sql)}"
+        return list(map(Socio._make, self._executar(
+            f"SELECT {self._select_socios()} FROM socios WHERE {miolo_sql} = ?{filtro} ORDER BY {ORDEM_SOCIOS}",
+            (miolo,)
+        )))
+    
+    def socios_por_nome(self, termos, limite=LIMITE_FTS):
+        """
+        Sócios cujo nome normalizado tem todos os `termos`, até `limite`, na ordem
+        do BM25 do índice FTS5 (os de nome mais curto e termos mais raros primeiro).
+        Se vierem menos que `limite`, completa com as buscas sem um dos termos (com
+        3 termos ou mais: erro de digitação em uma palavra) e, por último, com o
+        começo (PREFIXO_TERMO letras) de cada termo. Cada busca continua sendo um
+        AND, sem a lista enorme de um termo comum sozinho, e ranqueia no máximo
+        LIMITE_RANQUEAMENTO linhas casadas. None se o banco não tem o índice de nomes.
+        """
+        if not self.tem_tabela(TABELA_NOMES):
+            return None
+        buscas = [[f'"{termo}"' for termo in termos]]
+        if len(termos) >= 3:
+            buscas += [buscas[0][:i] + buscas[0][i + 1:] for i in range(len(termos))]
+        buscas.append([f'"{termo[:PREFIXO_TERMO]}"*' if len(termo) > PREFIXO_TERMO else f'"{termo}"'
+                       for termo in termos])
+        
+        rowids = {}
+        for busca in buscas:
+            if len(rowids) >= limite:
+                break
+            expressao = ' '.join(busca)
+            for (rowid,) in self._executar(
+                    f"SELECT rowid FROM (SELECT rowid, bm25({TABELA_NOMES}) AS pontuacao FROM {TABELA_NOMES} "
+                    f"WHERE {TABELA_NOMES} MATCH ? LIMIT {LIMITE_RANQUEAMENTO}) ORDER BY pontuacao LIMIT ?",
+                    (expressao, limite)):
+                rowids.setdefault(rowid, len(rowids))
+        if not rowids:
+            return []
+        
+        linhas = self._executar(
+            f"SELECT rowid, {self._select_socios()} FROM socios WHERE rowid IN ({', '.join('?' * len(rowids))})",
+            list(rowids))
+        linhas.sort(key=lambda linha: rowids[linha[0]])
+        return [Socio._make(linha[1:]) for linha in linhas]
+    
+    def socios_por_fonetica(self, chave, miolo=None, limite=LIMITE_FTS):
+        """
+        Sócios cujo nome tem a chave fonética `chave` (consulta_cnpj_corrigida.chave_fonetica),
+        lidos pela chave primária de socios_fonetica. Com `miolo`, só as pessoas físicas
+        desse miolo, todas, na ordem de socios_por_miolo (o bloqueio dos baldes quentes);
+        sem ele, os `limite` primeiros sócios com esse som na ordem da chave primária
+        (miolo, rowid), sempre os mesmos (busca só por nome). None se o banco não tem a tabela.
+        """
+        if not self.tem_tabela(TABELA_FONETICA):
+            return None
+        if not chave:
+            return []
+        if miolo is None:
+            return list(map(Socio._make, self._executar(
+                f"SELECT {self._select_socios()} FROM socios "
+                f"WHERE rowid IN (SELECT socio FROM {TABELA_FONETICA} WHERE chave = ? ORDER BY miolo, socio LIMIT ?)",
+                (chave, limite)
+            )))
+        if self._sem_miolo(miolo):
+            return []
+        return list(map(Socio._make, self._executar(
+            f"SELECT {self._select_socios()} FROM socios "
+            f"WHERE rowid IN (SELECT socio FROM {TABELA_FONETICA} WHERE chave = ? AND miolo = ?)"
+            f"{self._filtro_pf()} ORDER BY {ORDEM_SOCIOS}",
+            (chave, miolo)
+        )))
+    
+    def empresas_por_prefixo(self, prefixo, limite=LIMITE_SUGESTOES):
+        """
+        SugestaoEmpresa das empresas com algum nome normalizado começando com `prefixo`,
+        em ordem alfabética, uma por empresa. A faixa [prefixo, prefixo com a última
+        letra incrementada) é lida pela chave primária de nomes_empresas e para em
+        poucas linhas, por mais empresas que casem: o custo não depende do prefixo.
+        None se o banco não tem a tabela.
+        """
+        if not self.tem_tabela(TABELA_NOMES_EMPRESAS):
+            return None
+        if not prefixo:
+            return []
+        fim = prefixo[:-1] + chr(ord(prefixo[-1]) + 1)
+        if self.tem_tabela('empresa_resumo'):
+            juncao = "LEFT JOIN empresa_resumo r ON r.cnpj_basico = n.cnpj_basico"
+            colunas = "r.razao_social, r.situacao_cadastral, r.situacao_descricao"
+        else:
+            juncao, colunas = "", "NULL, NULL, NULL"
+        # A mesma empresa pode casar pela razão social e por nomes fantasia: lê
+        # algumas linhas a mais e fica com a primeira de cada uma
+        linhas = self._executar(
+            f"SELECT n.cnpj_basico, n.nome, {colunas} FROM {TABELA_NOMES_EMPRESAS} n {juncao} "
+            f"WHERE n.nome >= ? AND n.nome < ? ORDER BY n.nome, n.cnpj_basico LIMIT ?",
+            (prefixo, fim, 4 * limite))
+        sugestoes = {}
+        for linha in linhas:
+            sugestoes.setdefault(linha[0], SugestaoEmpresa._make(linha))
+        return list(sugestoes.values())[:limite]
+    
+    def _coluna_nome(self):
+        return f'"{self.colunas("socios")["nome_socio"]}"'
+    
+    def socios_da_empresa(self, cnpj_basico):
+        """Lista de SocioEmpresa (nome, cpf/cnpj, qualificação) dos sócios da empresa"""
+        if cnpj_basico in self._socios_da_empresa:
+            return self._socios_da_empresa[cnpj_basico]
+        col = self.colunas('socios')
+        return self._socios_empresa(self._executar(
+            f'SELECT "{col["nome_socio"]}", "{col["cnpj_cpf_socio"]}", {self._select_qualificacao()} '
+            f'FROM socios WHERE "{col["cnpj_basico"]}" = ?',
+            (cnpj_basico,)
+        ))
+    
+    def _select_qualificacao(self):
+        col = self.colunas('socios')['qualificacao_socio']
+        return f'"{col}"' if col else 'NULL'
+    
+    def _select_participacoes(self):
+        """
+        cnpj_basico das empresas das quais o sócio pessoa jurídica cujo documento
+        começa com ? faz parte. Faixa [prefixo, prefixo + ':') no índice parcial
+        de pessoas jurídicas por documento (':' vem logo depois de '9')
+        """
+        col = self.colunas('socios')
+        documento = f'"{col["cnpj_cpf_socio"]}"'
+        identificador = f'"{col["identificador_socio"]}"'
+        return (f'SELECT DISTINCT "{col["cnpj_basico"]}" FROM socios '
+                f'WHERE {documento} >= ? AND {documento} < ? '
+                f'AND {filtro_identificador(IDENTIFICADOR_PJ, identificador)} ORDER BY 1')
+    
+    def participacoes(self, cnpj):
+        """
+        Empresas (cnpj_basico) em que a pessoa jurídica `cnpj` é sócia. Com o CNPJ
+        básico (8 dígitos) vale qualquer estabelecimento dela; com os 14, só ele.
+        """
+        if cnpj in self._participacoes:
+            return self._participacoes[cnpj]
+        if not self.colunas('socios')['identificador_socio'] or not cnpj or not cnpj.isdigit():
+            return []
+        return [linha[0] for linha in self._executar(self._select_participacoes(), (cnpj, cnpj + ':'))]
+    
+    def grupo_economico(self, cnpj_basico):
+        """
+        GrupoEconomico da empresa, lido pela chave primária de grupos_economicos;
+        None se ela não tem sócios em comum com outra empresa ou se o banco não tem a tabela
+        """
+        if cnpj_basico in self._grupos:
+            return self._grupos[cnpj_basico]
+        if not self.tem_tabela('grupos_economicos'):
+            return None
+        linhas = self._executar(
+            "SELECT grupo_id, empresas FROM grupos_economicos WHERE cnpj_basico = ?", (cnpj_basico,))
+        return GrupoEconomico._make(linhas[0]) if linhas else None
+    
+    def _select_resumo(self):
+        municipio = 'municipio' if self.colunas('empresa_resumo')['municipio'] else 'NULL'
+        return ('razao_social, situacao_cadastral, situacao_descricao, logradouro, numero, bairro, uf, '
+                f'cnae_fiscal_principal, {municipio}, estabelecimentos, socios')
+    
+    def empresa_resumo(self, cnpj_basico):
+        """EmpresaResumo da empresa (uma leitura pela chave primária), ou None se não existe"""
+        if cnpj_basico in self._resumos:
+            return self._resumos[cnpj_basico]
+        if self._sem_empresa(cnpj_basico):
+            return None
+        linhas = self._executar(
+            f"SELECT {self._select_resumo()} FROM empresa_resumo WHERE cnpj_basico = ?", (cnpj_basico,))
+        return EmpresaResumo._make(linhas[0]) if linhas else None
+    
+    def estabelecimentos(self, cnpj_basico):
+        """Estabelecimentos da empresa como Estabelecimento (matriz primeiro)"""
+        if cnpj_basico in self._estabelecimentos:
+            return self._estabelecimentos[cnpj_basico]
+        if self._sem_empresa(cnpj_basico):
+            return []
+        return list(map(Estabelecimento._make, self._executar(
+            f"SELECT {self._select_estabelecimentos()} FROM estabelecimentos "
+            f"WHERE cnpj_basico = ?{self._ordem_estabelecimentos()}",
+            (cnpj_basico,)
+        )))
+    
+    def _ordem_estabelecimentos(self):
+        """Matriz (ordem 0001) primeiro, quando a coluna existe; bancos antigos ficam na ordem física"""
+        col = self.colunas('estabelecimentos')['cnpj_ordem']
+        return f' ORDER BY "{col}"' if col else ''
+    
+    def nome_empresa(self, cnpj_basico):
+        """Retorna (nome, tabela de origem), ou (None, None) se não encontrado"""
+        if cnpj_basico in self._nomes_empresa:
+            return self._nomes_empresa[cnpj_basico]
+        resultado = None, None
+        for tabela, col_nome, col_chave in TABELAS_NOME_EMPRESA:
+            if not self.tem_tabela(tabela):
+                continue
+            linhas = self._executar(f"SELECT {col_nome} FROM {tabela} WHERE {col_chave} = ? LIMIT 1", (cnpj_basico,))
+            if linhas and linhas[0][0]:
+                resultado = linhas[0][0], tabela
+                break
+        self._nomes_empresa[cnpj_basico] = resultado
+        return resultado
+    
+    def empresas_lote(self, cnpjs_basicos):
+        """
+        Nome e estabelecimentos de várias empresas de uma vez:
+        {cnpj_basico: ((nome, tabela de origem), [estabelecimentos])}, na ordem da entrada.
+        O que já estiver nos caches sai deles; o resto vem de uma única consulta
+        IN por tabela, e não de uma consulta por empresa.
+        """
+        cnpjs = list(dict.fromkeys(cnpjs_basicos))
+        estabelecimentos = {c: self._estabelecimentos[c] for c in cnpjs if c in self._estabelecimentos}
+        nomes_empresa = {c: self._nomes_empresa[c] for c in cnpjs if c in self._nomes_empresa}
+        
+        faltando = [c for c in cnpjs if c not in estabelecimentos]
+        estabelecimentos.update((c, []) for c in faltando if self._sem_empresa(c))
+        faltando = [c for c in faltando if c not in estabelecimentos]
+        if faltando:
+            estabelecimentos.update((c, []) for c in faltando)
+            for linha in self._executar(
+                f"SELECT cnpj_basico, {self._select_estabelecimentos()} FROM estabelecimentos "
+                f"WHERE cnpj_basico IN ({', '.join('?' * len(faltando))}){self._ordem_estabelecimentos()}",
+                faltando
+            ):
+                estabelecimentos[linha[0]].append(Estabelecimento._make(linha[1:]))
+        
+        faltando = {c for c in cnpjs if c not in nomes_empresa}
+        if faltando:
+            nomes_empresa.update((c, (None, None)) for c in faltando)
+            for tabela, col_nome, col_chave in TABELAS_NOME_EMPRESA:
+                # Na ordem de preferência: cada empresa fica com a primeira tabela que a tiver
+                if not faltando:
+                    break
+                if not self.tem_tabela(tabela):
+                    continue
+                chaves = sorted(faltando)
+                for cnpj, nome in self._executar(
+                    f"SELECT {col_chave}, {col_nome} FROM {tabela} "
+                    f"WHERE {col_chave} IN ({', '.join('?' * len(chaves))}) "
+                    f"AND {col_nome} IS NOT NULL AND {col_nome} <> ''",
+                    chaves
+                ):
+                    if cnpj in faltando:
+                        nomes_empresa[cnpj] = (nome, tabela)
+                        faltando.discard(cnpj)
+        
+        return {c: (nomes_empresa[c], estabelecimentos[c]) for c in cnpjs}
+    
+    def preparar_socios(self, miolos):
+        """Junção única para uma lista de miolos (e as empresas dos sócios encontrados)"""
+    
+    def preparar_cnpjs(self, cnpjs_basicos):
+        """Junção única para uma lista de CNPJs básicos"""
+
+class MotorSQLite(MotorConsulta):
+    """Consultas pontuais no SQLite, usando os índices criados na carga"""
+    
+    nome = 'sqlite'
+    
+    def __init__(self, origem):
+        super().__init__()
+        # Aceita o caminho do banco ou uma conexão já aberta (que não é fechada aqui)
+        if isinstance(origem, sqlite3.Connection):
+            self.conn = origem
+            self._proprio = False
+        else:
+            self.conn = sqlite3.connect(origem)
+            self._proprio = True
+        self._miolo_corrigido = None
+        self._miolos_quentes = None
+        if self._proprio:
+            # Bitmaps gravados na carga (carregar_base.py); desatualizados são ignorados
+            from bitmap_presenca import BitmapPresenca
+            self.presenca = BitmapPresenca.abrir_se_atualizado(origem)
+    
+    def _executar(self, sql, parametros=()):
+        cursor = self.conn.cursor()
+        cursor.execute(sql, parametros)
+        return cursor.fetchall()
+    
+    def _colunas_tabela(self, tabela):
+        return {col[1] for col in self._executar(f"PRAGMA table_info({tabela})")}
+    
+    def _tabelas(self):
+        return {linha[0] for linha in self._executar("SELECT name FROM sqlite_master WHERE type IN ('table', 'view')")}
+    
+    def miolo_corrigido(self):
+        """Se a coluna cpf_miolo está preenchida (verificado uma vez por conexão)"""
+        if self._miolo_corrigido is None:
+            if not self.colunas('socios')['cpf_miolo']:
+                self._miolo_corrigido = False
+            else:
+                # Conta só até o mínimo: não precisa varrer a tabela inteira
+                linhas = self._executar(f"""
+                SELECT COUNT(*) FROM (
+                    SELECT 1 FROM socios
+                    WHERE LENGTH(cpf_miolo) = 6 AND cpf_miolo GLOB '[0-9][0-9][0-9][0-9][0-9][0-9]'
+                    LIMIT {MINIMO_MIOLOS_VALIDOS + 1}
+                )
+                """)
+                self._miolo_corrigido = linhas[0][0] > MINIMO_MIOLOS_VALIDOS
+        return self._miolo_corrigido
+    
+    def total_socios_pf(self):
+        """
+        Linhas do índice parcial por miolo (sócios pessoa física com CPF), pela
+        estatística do ANALYZE da carga; None se o banco não a tem
+        """
+        if not self.tem_tabela('sqlite_stat1'):
+            return None
+        linhas = self._executar("SELECT stat FROM sqlite_stat1 WHERE idx = 'idx_socios_pf_miolo'")
+        return int(linhas[0][0].split()[0]) if linhas else None
+    
+    def varrer_socios(self, primeiro, ultimo, miolos=None):
+        """
+        Gerador de (miolo, [Socio]) dos sócios pessoa física com miolo entre
+        `primeiro` e `ultimo`, em ordem de miolo e, dentro dele, na ordem de
+        socios_por_miolo; com `miolos`, só os grupos desses miolos viram Socio.
+        É uma leitura sequencial do índice de cobertura por miolo (sem ordenação
+        à parte) e os grupos saem um a um do cursor: só o balde atual fica na memória.
+        """
+        cursor = self.conn.cursor()
+        cursor.execute(
+            f"SELECT cpf_miolo, {self._select_socios()} FROM socios "
+            f"WHERE cpf_miolo BETWEEN ? AND ?{self._filtro_pf()} AND {filtro_sentinelas()} "
+            f"ORDER BY cpf_miolo, {ORDEM_SOCIOS}",
+            (primeiro, ultimo)
+        )
+        for miolo, linhas in groupby(cursor, key=itemgetter(0)):
+            if miolos is None or miolo in miolos:
+                yield miolo, [Socio._make(linha[1:]) for linha in linhas]
+    
+    def balde_quente(self, miolo):
+        if not self.miolo_corrigido():
+            return False  # sem a coluna cpf_miolo o balde é sempre lido inteiro
+        if self._miolos_quentes is None:
+            # Estatística gravada na carga (carregar_base.py); bancos sem ela contam na consulta
+            if self.tem_tabela('miolos_quentes'):
+                self._miolos_quentes = {m for (m,) in self._executar("SELECT cpf_miolo FROM miolos_quentes")}
+            else:
+                self._miolos_quentes = False
+        if self._miolos_quentes is False:
+            return super().balde_quente(miolo)
+        return miolo in self._miolos_quentes
+    
+    def socios_por_miolo(self, miolo):
+        if self.miolo_corrigido():
+            return super().socios_por_miolo(miolo)
+        
+        # Banco sem cpf_miolo corrigido: extrai o miolo do documento na consulta (mais lento)
+        cpf = f'"{self.colunas("socios")["cnpj_cpf_socio"] or "cnpj_cpf_socio"}"'
+        limpo = f"REPLACE(REPLACE({cpf}, '.', ''), '-', '')"
+        linhas = self._executar(f"""
+        SELECT {self._select_socios()} FROM socios
+        WHERE (
+            -- Para CPFs mascarados (***XXXXXX**)
+            ({cpf} LIKE '***%' AND SUBSTR({limpo}, 4, 6) = ?)
+            OR
+            -- Para CPFs completos (11+ dígitos)
+            (LENGTH({limpo}) >= 11 AND SUBSTR({limpo}, 4, 6) = ?)
+            OR
+            -- Para CPFs parciais mas com 6+ dígitos
+            (LENGTH({limpo}) >= 6 AND LENGTH({limpo}) < 11 AND SUBSTR({limpo}, 1, 6) = ?)
+        )
+        """, (miolo, miolo, miolo))
+        return list(map(Socio._make, linhas))
+    
+    def fechar(self):
+        if self._proprio:
+            self.conn.close()
+
+class MotorDuckDB(MotorConsulta):
+    """
+    DuckDB sobre o banco SQLite anexado (extensão sqlite) ou sobre a
+    exportação Parquet de exportar_parquet.py. As consultas pontuais
+    funcionam como no SQLite; em listas grandes, preparar_* registra a
+    entrada como tabela e faz uma junção vetorizada (hash join) com a base.
+    """
+    
+    nome = 'duckdb'
+    
+    def __init__(self, origem):
+        super().__init__()
+        import duckdb
+        import exportar_parquet
+        
+        self.conn = duckdb.connect()
+        if os.path.isdir(origem):
+            metadados = exportar_parquet.carregar_metadados(origem)
+            if not metadados:
+                raise ValueError(f"{origem} não é uma exportação Parquet (falta {exportar_parquet.ARQUIVO_METADADOS})")
+            for tabela, info in metadados['tabelas'].items():
+                arquivos = os.path.join(origem, info['arquivos'])
+                self.conn.execute(
+                    f"CREATE VIEW {tabela} AS SELECT * FROM read_parquet('{arquivos}', "
+                    f"hive_partitioning = {'true' if info['particao'] else 'false'})"
+                )
+        else:
+            if not os.path.exists(origem):
+                raise FileNotFoundError(origem)
+            self.conn.execute("INSTALL sqlite")
+            self.conn.execute("LOAD sqlite")
+            self.conn.execute(f"ATTACH '{origem}' AS base (TYPE sqlite, READ_ONLY)")
+            for (tabela,) in self.conn.execute(
+                    "SELECT table_name FROM information_schema.tables WHERE table_catalog = 'base'").fetchall():
+                # O índice FTS5 (tabela virtual e as tabelas internas dela) e a chave
+                # fonética (aponta para o rowid de socios) só são lidos pelo SQLite
+                if tabela in (TABELA_NOMES, TABELA_FONETICA) or tabela.startswith(TABELA_NOMES + '_'):
+                    continue
+                self.conn.execute(f'CREATE VIEW "{tabela}" AS SELECT * FROM base."{tabela}"')
+    
+    def _executar(self, sql, parametros=()):
+        return self.conn.execute(sql, list(parametros)).fetchall()
+    
+    def _colunas_tabela(self, tabela):
+        return {linha[0] for linha in self._executar(f"DESCRIBE {tabela}")}
+    
+    def _tabelas(self):
+        return {linha[0] for linha in self._executar(
+            "SELECT table_name FROM information_schema.tables WHERE table_schema = 'main'")}
+    
+    def _expressao_miolo(self):
+        if self.colunas('socios')['cpf_miolo']:
+            return super()._expressao_miolo()
+        # Mesma regra de carregar_base.extrair_miolo
+        cpf = f'"{self.colunas("socios")["cnpj_cpf_socio"]}"'
+        digitos = f"regexp_replace({cpf}, '[^0-9]', '', 'g')"
+        return (f"CASE WHEN {cpf} LIKE '***%' THEN substr({digitos}, 1, 6) "
+                f"WHEN length({digitos}) >= 11 THEN substr({digitos}, 4, 6) ELSE '' END")
+    
+    def _registrar_entrada(self, nome, valores):
+        self.conn.register(nome, pd.DataFrame({'chave': sorted(set(valores))}))
+    
+    def preparar_socios(self, miolos):
+        miolos = set(miolos)
+        self._registrar_entrada('entrada_miolos', miolos)
+        tamanhos = {miolo: 0 for miolo in miolos}
+        tamanhos.update(self._executar(f"""
+        SELECT e.chave, COUNT(*)
+        FROM socios JOIN entrada_miolos e ON {self._expressao_miolo()} = e.chave{self._filtro_pf()}
+        GROUP BY e.chave
+        """))
+        self._tamanhos_balde.update(tamanhos)
+        self.conn.unregister('entrada_miolos')
+        
+        # Baldes quentes ficam fora do cache: são buscados um a um, quando consultados
+        frios = [miolo for miolo, tamanho in tamanhos.items() if tamanho <= LIMITE_BALDE_QUENTE]
+        self._registrar_entrada('entrada_miolos', frios)
+        grupos = {miolo: [] for miolo in frios}
+        for linha in self._executar(f"""
+        SELECT e.chave, {self._select_socios()}
+        FROM socios JOIN entrada_miolos e ON {self._expressao_miolo()} = e.chave{self._filtro_pf()}
+        ORDER BY e.chave, {ORDEM_SOCIOS}
+        """):
+            grupos[linha[0]].append(Socio._make(linha[1:]))
+        self._socios_por_miolo.update(grupos)
+        self.conn.unregister('entrada_miolos')
+        
+        # As empresas de qualquer candidato podem entrar no resultado
+        self.preparar_cnpjs([s.cnpj_basico for grupo in grupos.values() for s in grupo], socios=False)
+    
+    def preparar_cnpjs(self, cnpjs_basicos, socios=True):
+        cnpjs_basicos = set(cnpjs_basicos)
+        participadas = set()
+        self._registrar_entrada('entrada_cnpjs', cnpjs_basicos)
+        
+        estabelecimentos = {cnpj: [] for cnpj in cnpjs_basicos}
+        for linha in self._executar(f"""
+        SELECT e.chave, {self._select_estabelecimentos()}
+        FROM estabelecimentos JOIN entrada_cnpjs e ON estabelecimentos.cnpj_basico = e.chave
+        {self._ordem_estabelecimentos()}
+        """):
+            estabelecimentos[linha[0]].append(Estabelecimento._make(linha[1:]))
+        self._estabelecimentos.update(estabelecimentos)
+        
+        nomes_empresa = {cnpj: (None, None) for cnpj in cnpjs_basicos}
+        
+        if self.tem_tabela('empresa_resumo'):
+            resumos = dict.fromkeys(cnpjs_basicos)
+            for linha in self._executar(f"""
+            SELECT e.chave, {self._select_resumo()}
+            FROM empresa_resumo r JOIN entrada_cnpjs e ON r.cnpj_basico = e.chave
+            """):
+                resumos[linha[0]] = EmpresaResumo._make(linha[1:])
+            self._resumos.update(resumos)
+        for tabela, col_nome, col_chave in reversed(TABELAS_NOME_EMPRESA):
+            # Ordem inversa: a tabela preferida sobrescreve as demais
+            if not self.tem_tabela(tabela):
+                continue
+            for cnpj, nome in self._executar(f"""
+            SELECT e.chave, t.{col_nome} FROM {tabela} t JOIN entrada_cnpjs e ON t.{col_chave} = e.chave
+            WHERE t.{col_nome} IS NOT NULL AND t.{col_nome} <> ''
+            """):
+                nomes_empresa[cnpj] = (nome, tabela)
+        self._nomes_empresa.update(nomes_empresa)
+        
+        if socios:
+            col = self.colunas('socios')
+            grupos = {cnpj: [] for cnpj in cnpjs_basicos}
+            for linha in self._executar(f"""
+            SELECT e.chave, "{col['nome_socio']}", "{col['cnpj_cpf_socio']}", {self._select_qualificacao()}
+            FROM socios JOIN entrada_cnpjs e ON socios."{col['cnpj_basico']}" = e.chave
+            """):
+                grupos[linha[0]].append(linha[1:])
+            self._socios_da_empresa.update((cnpj, self._socios_empresa(linhas)) for cnpj, linhas in grupos.items())
+            
+            if col['identificador_socio']:
+                # Empresas em que cada CNPJ da entrada é sócio (pessoa jurídica)
+                participacoes = {cnpj: [] for cnpj in cnpjs_basicos}
+                for cnpj, cnpj_basico in self._executar(f"""
+                SELECT DISTINCT e.chave, socios."{col['cnpj_basico']}"
+                FROM socios JOIN entrada_cnpjs e ON substr(socios."{col['cnpj_cpf_socio']}", 1, 8) = e.chave
+                WHERE {filtro_identificador(IDENTIFICADOR_PJ, f'socios."{col["identificador_socio"]}"')}
+                ORDER BY 1, 2
+                """):
+                    participacoes[cnpj].append(cnpj_basico)
+                self._participacoes.update(participacoes)
+                participadas = {c for grupo in participacoes.values() for c in grupo}
+            
+            if self.tem_tabela('grupos_economicos'):
+                grupos = dict.fromkeys(cnpjs_basicos)
+                for cnpj, grupo_id, empresas in self._executar("""
+                SELECT e.chave, g.grupo_id, g.empresas
+                FROM grupos_economicos g JOIN entrada_cnpjs e ON g.cnpj_basico = e.chave
+                """):
+                    grupos[cnpj] = GrupoEconomico(grupo_id, empresas)
+                self._grupos.update(grupos)
+        
+        self.conn.unregister('entrada_cnpjs')
+        
+        # Nome das empresas participadas, usadas no resultado
+        if participadas - cnpjs_basicos:
+            self.preparar_cnpjs(participadas - cnpjs_basicos, socios=False)
+    
+    def fechar(self):
+        self.conn.close()
+
+class MotorMemoria(MotorSQLite):
+    """
+    Sócios pelo índice NumPy de indice_memoria.py; dados das empresas
+    continuam vindo do SQLite. Em lote, todos os miolos da entrada são
+    resolvidos com uma única busca vetorizada. O índice é mapeado dos
+    arquivos .npy (mmap), então processos paralelos o compartilham sem cópia.
+    """
+    
+    nome = 'memoria'
+    
+    def __init__(self, origem):
+        super().__init__(origem)
+        from indice_memoria import IndiceMemoria
+        self.indice = IndiceMemoria.carregar(origem)
+        self._faixas = {}
+    
+    def _faixa(self, miolo):
+        if miolo not in self._faixas:
+            self._faixas.update(self.indice.faixas_lote([miolo]) or {miolo: (0, 0)})
+        return self._faixas[miolo]
+    
+    def balde_quente(self, miolo):
+        inicio, fim = self._faixa(miolo)
+        return fim - inicio > LIMITE_BALDE_QUENTE
+    
+    def socios_por_miolo(self, miolo):
+        # Lote já resolvido: os sócios da faixa só viram objetos quando são comparados
+        inicio, fim = self._faixa(miolo)
+        return self.indice.linhas(np.arange(inicio, fim))
+    
+    def socios_da_empresa(self, cnpj_basico):
+        return self._socios_empresa(self.indice.socios_da_empresa(cnpj_basico))
+    
+    def preparar_socios(self, miolos):
+        # Só as faixas (dois inteiros por miolo), para não manter na memória os
+        # candidatos de um lote de milhões de linhas
+        self._faixas.update(self.indice.faixas_lote(miolos))
+
+MOTORES = {'sqlite': MotorSQLite, 'duckdb': MotorDuckDB, 'memoria': MotorMemoria}
+
+def criar_motor(engine, origem):
+    """Cria o backend pelo nome ('sqlite', 'duckdb' ou 'memoria'); origem é o banco SQLite ou o diretório Parquet"""
+    if engine not in MOTORES:
+        raise ValueError(f"Engine desconhecida: {engine} (opções: {', '.join(MOTORES)})")
+    return MOTORES[engine](origem)
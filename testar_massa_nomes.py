@@ -9,6 +9,8 @@ import re
 from tqdm import tqdm
 from difflib import SequenceMatcher
 
+from consulta_cnpj_corrigida import escolher_candidato
+
 def normalizar_nome(nome):
     """Normaliza o nome para comparação"""
     import unicodedata
@@ -115,28 +117,15 @@ def consultar_socio(conn, nome, cpf, limiar_similaridade=0.7):
         # Normalizar nome de entrada para comparação
         nome_normalizado = normalizar_nome(nome)
         
-        # Calcular similaridade para cada resultado
-        resultados_com_score = []
-        for resultado in resultados:
-            # Criar dicionário com os resultados
-            res_dict = {}
-            for i, col in enumerate(cursor.description):
-                res_dict[col[0]] = resultado[i]
-            
-            # Calcular similaridade do nome
-            nome_socio = resultado[1]  # Índice 1 = nome_socio
-            nome_socio_norm = normalizar_nome(nome_socio) if nome_socio else ""
-            score = similaridade(nome_normalizado, nome_socio_norm)
-            
-            res_dict['score'] = score
-            resultados_com_score.append(res_dict)
-        
-        # Ordenar por similaridade
-        resultados_com_score.sort(key=lambda x: x['score'], reverse=True)
+        # Melhor candidato pela cascata: candidatos cujo limite superior do
+        # score não alcança o limiar nem o melhor já visto não passam pelo ratio()
+        nomes_normalizados = [normalizar_nome(resultado[1]) if resultado[1] else "" for resultado in resultados]
+        posicao, score, _ = escolher_candidato(nome_normalizado, nomes_normalizados, limiar_similaridade)
         
         # Se encontrou resultado com score acima do limiar
-        if resultados_com_score and resultados_com_score[0]['score'] >= limiar_similaridade:
-            melhor_resultado = resultados_com_score[0]
+        if score >= limiar_similaridade:
+            melhor_resultado = {col[0]: valor for col, valor in zip(cursor.description, resultados[posicao])}
+            melhor_resultado['score'] = score
             
             # Buscar empresas associadas ao CNPJ
             empresas = []
@@ -200,7 +189,7 @@ def consultar_socio(conn, nome, cpf, limiar_similaridade=0.7):
             "cpf": cpf,
             "miolo_cpf": miolo_cpf,
             "status": "Nome não corresponde",
-            "score": resultados_com_score[0]['score'] if resultados_com_score else 0,
+            "score": score,
             "empresas": []
         }
     
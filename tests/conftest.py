@@ -0,0 +1,114 @@
+# conftest.py - Os scripts ficam na raiz do repositório, fora de um pacote
+import os
+import sys
+import random
+import zipfile
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Miolo com mais de LIMITE_BALDE_QUENTE sócios na base sintética
+MIOLO_QUENTE = '123456'
+
+PRENOMES = ['JOSE', 'JOSÉ', 'MARIA', 'JOAO', 'JOÃO', 'ANA', 'THEREZA', 'TEREZA', 'GUILHERME', 'CAROLINA',
+            'LUIZ', 'LUÍS', 'FRANCISCO', 'ANTONIO', 'ANTÔNIO', 'PAULO', 'CARLOS', 'MARCOS', 'LUCIA', 'RAFAEL',
+            'FERNANDA', 'JULIANA', 'RODRIGO', 'HELENA', 'CECILIA', 'BEATRIZ', 'EDUARDO', 'SERGIO', 'VITOR']
+SOBRENOMES = ['DA SILVA', 'DOS SANTOS', 'OLIVEIRA', 'SOUZA', 'SOUSA', 'PEREIRA', 'LIMA', 'CONCEIÇÃO',
+              'ARAÚJO', 'FERREIRA', 'RODRIGUES', 'ALVES', 'GOMES', 'RIBEIRO', 'CARVALHO', 'MARTINS', 'ROCHA',
+              'BARBOSA', 'CAVALCANTI', 'MENDES', 'NASCIMENTO', 'DE ALMEIDA', 'MOREIRA', 'TEIXEIRA']
+PALAVRAS_EMPRESA = ['COMERCIO', 'SERVICOS', 'TECNOLOGIA', 'ALIMENTOS', 'CONSTRUTORA', 'TRANSPORTES',
+                    'DISTRIBUIDORA', 'PADARIA', 'FARMACIA', 'AGRO', 'BRASIL', 'NORDESTE', 'PAULISTA', 'NOVA']
+
+DIMENSOES = {
+    'Cnaes.zip': [('6201501', 'Desenvolvimento de programas de computador sob encomenda'),
+                  ('4711302', 'Comércio varejista de mercadorias em geral')],
+    'Motivos.zip': [('00', 'SEM MOTIVO'), ('01', 'EXTINCAO POR ENCERRAMENTO')],
+    'Municipios.zip': [('7107', 'SAO PAULO'), ('6001', 'RIO DE JANEIRO'), ('2531', 'RECIFE')],
+    'Naturezas.zip': [('2062', 'Sociedade Empresária Limitada')],
+    'Paises.zip': [('105', 'BRASIL')],
+    'Qualificacoes.zip': [('49', 'Sócio-Administrador'), ('22', 'Sócio')],
+}
+
+def _gravar_zip(caminho, linhas):
+    texto = ''.join('"' + '";"'.join(linha) + '"\n' for linha in linhas)
+    with zipfile.ZipFile(caminho, 'w', zipfile.ZIP_DEFLATED) as arquivo_zip:
+        arquivo_zip.writestr(os.path.basename(caminho)[:-4] + '.CSV', texto.encode('latin-1'))
+
+def gerar_base(diretorio, semente=42):
+    """
+    Zips no layout da Receita de uma base pequena: 600 empresas, 2.650 pessoas
+    físicas sócias de uma a três delas, sócios pessoa jurídica (outras empresas
+    da base) e linhas sem CPF. Um miolo (MIOLO_QUENTE) é um balde
+    quente, com nomes iguais depois da normalização (JOSÉ / JOSE) em empresas
+    diferentes. Devolve as pessoas físicas geradas, (nome, miolo).
+    """
+    aleatorio = random.Random(semente)
+    os.makedirs(diretorio, exist_ok=True)
+    
+    cnpjs = sorted({f"{aleatorio.randrange(10 ** 7, 10 ** 8):08d}" for _ in range(600)})
+    empresas, estabelecimentos, socios, simples = [], [], [], []
+    
+    miolos = [f"{aleatorio.randrange(10 ** 6):06d}" for _ in range(700)]
+    pessoas = [(f"{aleatorio.choice(PRENOMES)} {aleatorio.choice(SOBRENOMES)} {aleatorio.choice(SOBRENOMES)}",
+                aleatorio.choice(miolos)) for _ in range(2500)]
+    # Balde quente: 150 pessoas no mesmo miolo, duas delas com o nome igual a menos do acento
+    pessoas += [(f"{aleatorio.choice(PRENOMES)} {aleatorio.choice(SOBRENOMES)}", MIOLO_QUENTE) for _ in range(148)]
+    pessoas += [('JOSÉ CARLOS PEREIRA', MIOLO_QUENTE), ('JOSE CARLOS PEREIRA', MIOLO_QUENTE)]
+    
+    for i, cnpj in enumerate(cnpjs):
+        razao = f"{aleatorio.choice(PALAVRAS_EMPRESA)} {aleatorio.choice(PALAVRAS_EMPRESA)} {i} LTDA"
+        empresas.append((cnpj, razao, '2062', '49', f"{aleatorio.randrange(1, 10 ** 6)},00", '01', ''))
+        for ordem in range(1, aleatorio.choice([1, 1, 2]) + 1):
+            uf, municipio = aleatorio.choice([('SP', '7107'), ('RJ', '6001'), ('PE', '2531')])
+            estabelecimentos.append((
+                cnpj, f"{ordem:04d}", '00', '1' if ordem == 1 else '2',
+                aleatorio.choice(['', f"{aleatorio.choice(PALAVRAS_EMPRESA)} {i}"]),
+                aleatorio.choice(['02', '02', '02', '08']), '20200101', '00', '', '', '20100101',
+                aleatorio.choice(['6201501', '4711302']), '', 'RUA', f"DAS FLORES {i}", str(ordem), '',
+                'CENTRO', '01001000', uf, municipio, '11', '30000000', '', '', '', '', '', '', ''))
+        if i % 3 == 0:
+            simples.append((cnpj, 'S', '20180101', '', 'N', '', ''))
+    
+    # Cada pessoa é sócia de uma a três empresas; o balde quente fica com mais de 100 linhas
+    for nome, miolo in pessoas:
+        for cnpj in aleatorio.sample(cnpjs, aleatorio.choice([1, 1, 2, 3])):
+            socios.append((cnpj, '2', nome, f"***{miolo}**", '49', '20150101', '', '***000000**', '', '00', '4'))
+    for _ in range(300):
+        socia, investida = aleatorio.sample(cnpjs, 2)
+        socios.append((investida, '1', empresas[cnpjs.index(socia)][1], f"{socia}000100", '22', '20160101',
+                       '', '', '', '', '0'))
+    for _ in range(50):
+        socios.append((aleatorio.choice(cnpjs), '2', aleatorio.choice(pessoas)[0], '', '49', '20150101',
+                       '', '', '', '', '4'))
+    aleatorio.shuffle(socios)
+    
+    _gravar_zip(os.path.join(diretorio, 'Empresas0.zip'), empresas)
+    _gravar_zip(os.path.join(diretorio, 'Estabelecimentos0.zip'), estabelecimentos)
+    metade = len(socios) // 2
+    _gravar_zip(os.path.join(diretorio, 'Socios0.zip'), socios[:metade])
+    _gravar_zip(os.path.join(diretorio, 'Socios1.zip'), socios[metade:])
+    _gravar_zip(os.path.join(diretorio, 'Simples.zip'), simples)
+    for nome, linhas in DIMENSOES.items():
+        _gravar_zip(os.path.join(diretorio, nome), linhas)
+    return pessoas
+
+@pytest.fixture(scope='session')
+def base_sintetica(tmp_path_factory):
+    """Banco SQLite da base sintética, carregado e indexado por carregar_base; (caminho, pessoas)"""
+    import carregar_base
+    
+    diretorio = tmp_path_factory.mktemp('receita')
+    pessoas = gerar_base(str(diretorio / 'zips'))
+    db_path = str(diretorio / 'cnpj.db')
+    carregar_base.carregar_diretorio(str(diretorio / 'zips'), db_path)
+    return db_path, pessoas
+
+@pytest.fixture(scope='session')
+def base_parquet(base_sintetica, tmp_path_factory):
+    """Exportação Parquet da base sintética (o DuckDB lê direto, sem a extensão sqlite)"""
+    import exportar_parquet
+    
+    destino = str(tmp_path_factory.mktemp('parquet'))
+    exportar_parquet.exportar_base(base_sintetica[0], destino)
+    return destino
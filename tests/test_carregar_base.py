@@ -0,0 +1,179 @@
+# test_carregar_base.py - Carga dos zips da Receita no SQLite
+import os
+import queue
+import sqlite3
+import zipfile
+
+import pytest
+
+import bitmap_presenca
+import carregar_base
+import grafo_societario
+from conftest import gerar_base
+
+LINHA_SOCIO = '"12345678";"2";"FULANO DE TAL";"***123456**";"49";"20200101";"";"***000000**";"";"00";"4"\n'
+
+def _zip_socios(caminho, corromper_segundo=False):
+    with zipfile.ZipFile(caminho, 'w', zipfile.ZIP_DEFLATED) as arquivo_zip:
+        arquivo_zip.writestr('a.csv', LINHA_SOCIO * 5000)
+        arquivo_zip.writestr('b.csv', LINHA_SOCIO * 5000)
+    if corromper_segundo:
+        dados = bytearray(caminho.read_bytes())
+        inicio = dados.find(b'b.csv') + 40
+        for i in range(inicio, inicio + 40):
+            dados[i] ^= 0xff
+        caminho.write_bytes(bytes(dados))
+
+def test_arquivo_com_falha_nao_deixa_linhas(tmp_path):
+    caminho = tmp_path / 'Socios0.zip'
+    _zip_socios(caminho, corromper_segundo=True)
+    conn = sqlite3.connect(tmp_path / 'base.db')
+    carregar_base.criar_tabelas(conn)
+    
+    with pytest.raises(Exception):
+        carregar_base.carregar_arquivo(conn, str(caminho))
+    conn.commit()
+    assert conn.execute("SELECT COUNT(*) FROM socios").fetchone()[0] == 0
+    assert conn.execute("SELECT COUNT(*) FROM arquivos_carregados").fetchone()[0] == 0
+    
+    # A nova tentativa, com o arquivo bom, carrega tudo uma vez só
+    _zip_socios(caminho)
+    assert carregar_base.carregar_arquivo(conn, str(caminho)) == 10000
+    assert conn.execute("SELECT COUNT(*) FROM socios").fetchone()[0] == 10000
+    assert conn.execute("SELECT COUNT(DISTINCT cpf_miolo) FROM socios").fetchone()[0] == 1
+    conn.close()
+
+def _estruturas_atualizadas(db_path):
+    return (grafo_societario.GrafoSocietario.atualizado(grafo_societario.diretorio_grafo(db_path), db_path)
+            and bitmap_presenca.BitmapPresenca.atualizado(bitmap_presenca.diretorio_bitmap(db_path), db_path))
+
+def test_carga_atualiza_grafo_e_bitmaps(base_sintetica, tmp_path):
+    assert _estruturas_atualizadas(base_sintetica[0])
+    
+    # Um arquivo novo no diretório: a segunda carga refaz grafo e bitmaps
+    diretorio = tmp_path / 'zips'
+    gerar_base(str(diretorio))
+    db_path = str(tmp_path / 'cnpj.db')
+    carregar_base.carregar_diretorio(str(diretorio), db_path)
+    assert not bitmap_presenca.BitmapPresenca.carregar(db_path).tem_miolo('999999')
+    with zipfile.ZipFile(diretorio / 'Socios9.zip', 'w') as arquivo_zip:
+        arquivo_zip.writestr('socios9.csv', LINHA_SOCIO.replace('123456', '999999'))
+    carregar_base.carregar_diretorio(str(diretorio), db_path)
+    assert _estruturas_atualizadas(db_path)
+    assert bitmap_presenca.BitmapPresenca.abrir_se_atualizado(db_path).tem_miolo('999999')
+
+def test_carga_em_pipeline_atualiza_grafo_e_bitmaps(tmp_path):
+    diretorio = tmp_path / 'zips'
+    gerar_base(str(diretorio))
+    db_path = str(tmp_path / 'cnpj.db')
+    fila = queue.Queue()
+    for nome in sorted(os.listdir(diretorio)):
+        fila.put(str(diretorio / nome))
+    fila.put(None)
+    resultado = {'linhas': 0, 'falhas': [], 'tempo_carga': 0.0}
+    carregar_base._consumidor_carga(db_path, fila, resultado)
+    assert resultado['falhas'] == [] and resultado['linhas'] > 0
+    assert _estruturas_atualizadas(db_path)
+
+@pytest.mark.parametrize('arquivos', [['Empresas0.zip'], ['Empresas0.zip', 'Estabelecimentos0.zip', 'Socios9.zip']])
+def test_carga_pequena_ou_sem_socios_constroi_bitmaps(tmp_path, arquivos):
+    # Só empresas, ou uma amostra com poucos miolos (abaixo de MINIMO_MIOLOS_VALIDOS)
+    completa = tmp_path / 'completa'
+    gerar_base(str(completa))
+    with zipfile.ZipFile(completa / 'Socios9.zip', 'w') as arquivo_zip:
+        arquivo_zip.writestr('socios9.csv', LINHA_SOCIO)
+    diretorio = tmp_path / 'zips'
+    diretorio.mkdir()
+    for nome in arquivos:
+        (diretorio / nome).write_bytes((completa / nome).read_bytes())
+    
+    db_path = str(tmp_path / 'cnpj.db')
+    carregar_base.carregar_diretorio(str(diretorio), db_path)
+    assert _estruturas_atualizadas(db_path)
+    bitmap = bitmap_presenca.BitmapPresenca.abrir_se_atualizado(db_path)
+    assert bitmap.tem_miolo('123456') == ('Socios9.zip' in arquivos)
+    assert bitmap.total('miolos') == ('Socios9.zip' in arquivos)
+    
+    fila = queue.Queue()
+    for nome in arquivos:
+        fila.put(str(diretorio / nome))
+    fila.put(None)
+    resultado = {'linhas': 0, 'falhas': [], 'tempo_carga': 0.0}
+    carregar_base._consumidor_carga(str(tmp_path / 'pipeline.db'), fila, resultado)
+    assert resultado['falhas'] == []
+    assert _estruturas_atualizadas(str(tmp_path / 'pipeline.db'))
+
+def test_bitmaps_recusam_miolo_nao_calculado(tmp_path):
+    # Base antiga, com cpf_miolo ainda NULL: um bitmap vazio negaria sócios existentes
+    db_path = str(tmp_path / 'antiga.db')
+    conn = sqlite3.connect(db_path)
+    carregar_base.criar_tabelas(conn)
+    conn.execute("INSERT INTO socios (cnpj_basico, identificador_socio, nome_socio, cnpj_cpf_socio) "
+                 "VALUES ('12345678', '2', 'FULANO', '***123456**')")
+    conn.commit()
+    conn.close()
+    with pytest.raises(ValueError):
+        bitmap_presenca.BitmapPresenca.construir(db_path)
+
+def _contagens(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        return {tabela: conn.execute(f"SELECT COUNT(*), TOTAL(LENGTH(cnpj_basico || {coluna})) FROM {tabela}").fetchone()
+                for tabela, coluna in [('empresas', 'razao_social'), ('socios', 'nome_socio'),
+                                       ('estabelecimentos', 'cnpj_ordem')]}
+    finally:
+        conn.close()
+
+def test_atualizacao_mensal_substitui_o_mes_anterior(tmp_path, monkeypatch):
+    meses = {}
+    for semente, mes in enumerate(['2025-04', '2025-05', '2025-06']):
+        meses[mes] = tmp_path / mes
+        gerar_base(str(meses[mes]), semente=semente)
+    atual = {'mes': '2025-04', 'interromper_apos': None}
+    carregados = []
+    
+    def baixar(output_dir, *args, ao_concluir=None, url_mes=None, **kwargs):
+        # Os zips do mês têm os mesmos nomes dos outros meses
+        diretorio = meses[url_mes.rstrip('/').rsplit('/', 1)[-1]]
+        for i, nome in enumerate(sorted(os.listdir(diretorio))):
+            if i == atual['interromper_apos']:
+                raise ConnectionError("download interrompido")
+            carregados.append(nome)
+            ao_concluir(str(diretorio / nome))
+        return {'failed': {}}
+    
+    monkeypatch.setattr(carregar_base.download_base_completa, 'descobrir_mes_atual',
+                        lambda url_base: f"http://receita.local/{atual['mes']}/")
+    monkeypatch.setattr(carregar_base.download_base_completa, 'baixar_base_completa', baixar)
+    
+    def referencia(mes):
+        db_path = str(tmp_path / f"referencia-{mes}.db")
+        carregar_base.carregar_diretorio(str(meses[mes]), db_path)
+        return _contagens(db_path)
+    
+    db_path = str(tmp_path / 'cnpj.db')
+    assert carregar_base.atualizar_base_mensal(str(tmp_path / 'downloads'), db_path)['linhas'] > 0
+    assert _contagens(db_path) == referencia('2025-04')
+    assert _estruturas_atualizadas(db_path)
+    
+    # Mês seguinte, no mesmo --banco: o conteúdo passa a ser só o do mês novo
+    atual['mes'] = '2025-05'
+    assert carregar_base.atualizar_base_mensal(str(tmp_path / 'downloads'), db_path)['linhas'] > 0
+    assert _contagens(db_path) == referencia('2025-05')
+    assert _estruturas_atualizadas(db_path)
+    
+    # De novo no mesmo mês: nada a fazer
+    carregados.clear()
+    assert carregar_base.atualizar_base_mensal(str(tmp_path / 'downloads'), db_path)['linhas'] == 0
+    assert carregados == []
+    
+    # Mês interrompido: o banco continua no anterior, e a retomada termina a carga
+    atual.update(mes='2025-06', interromper_apos=3)
+    with pytest.raises(ConnectionError):
+        carregar_base.atualizar_base_mensal(str(tmp_path / 'downloads'), db_path)
+    assert _contagens(db_path) == referencia('2025-05')
+    atual['interromper_apos'] = None
+    carregar_base.atualizar_base_mensal(str(tmp_path / 'downloads'), db_path)
+    assert _contagens(db_path) == referencia('2025-06')
+    assert _estruturas_atualizadas(db_path)
+    assert not [nome for nome in os.listdir(tmp_path) if '.carga' in nome]
@@ -0,0 +1,77 @@
+# test_consulta.py - Escolha do sócio nos motores de consulta
+import random
+
+import pytest
+
+from conftest import MIOLO_QUENTE
+from motor_consulta import criar_motor
+from consulta_cnpj_corrigida import _escolher_socio, normalizar_nome, similaridade
+
+MOTORES = ['sqlite', 'memoria', 'duckdb']
+
+@pytest.fixture(params=MOTORES)
+def motor(request, base_sintetica):
+    origem = base_sintetica[0]
+    if request.param == 'duckdb':
+        pytest.importorskip('duckdb')
+        origem = request.getfixturevalue('base_parquet')
+    motor = criar_motor(request.param, origem)
+    yield motor
+    motor.fechar()
+
+def _com_ruido(nome, aleatorio):
+    """Variações de digitação e de ordem das palavras de um nome"""
+    palavras = nome.split()
+    variacao = aleatorio.randrange(4)
+    if variacao == 0:
+        return nome
+    if variacao == 1:
+        return ' '.join(palavras[1:] + palavras[:1])
+    if variacao == 2:
+        i = aleatorio.randrange(len(nome))
+        return nome[:i] + nome[i + 1:]
+    return nome + ' ' + aleatorio.choice(['FILHO', 'JUNIOR', 'NETO'])
+
+def _exaustivo(socios, alvo):
+    """Maior similaridade() sobre o balde inteiro; no empate, o primeiro"""
+    nomes = [normalizar_nome(s.nome_socio) for s in socios]
+    posicao = max(range(len(nomes)), key=lambda i: (similaridade(alvo, nomes[i]), -i))
+    return socios[posicao], similaridade(alvo, nomes[posicao])
+
+def _consultas_balde_quente(pessoas):
+    aleatorio = random.Random(7)
+    nomes = [nome for nome, miolo in pessoas if miolo == MIOLO_QUENTE]
+    consultas = ['JOSE CARLOS PEREIRA', 'JOSÉ CARLOS PEREIRA', 'JOSE CARLOS PEREIRA NETO', 'FULANO DE TAL']
+    consultas += [_com_ruido(nome, aleatorio) for nome in aleatorio.sample(nomes, 60)]
+    return consultas
+
+def test_balde_quente_igual_ao_exaustivo(motor, base_sintetica):
+    assert motor.balde_quente(MIOLO_QUENTE)
+    balde = motor.socios_por_miolo(MIOLO_QUENTE)
+    for consulta in _consultas_balde_quente(base_sintetica[1]):
+        alvo = normalizar_nome(consulta)
+        socios, nomes, posicao, score, _ = _escolher_socio(motor, MIOLO_QUENTE, alvo, 0.7)
+        esperado, score_esperado = _exaustivo(balde, alvo)
+        assert (socios[posicao], score) == (esperado, score_esperado), consulta
+        # As empresas da pessoa (linhas com o mesmo nome normalizado) também são as do balde inteiro
+        assert sorted(s.cnpj_basico for s, n in zip(socios, nomes) if n == nomes[posicao]) == \
+            sorted(s.cnpj_basico for s in balde if normalizar_nome(s.nome_socio) == nomes[posicao])
+
+def test_nome_acentuado_no_balde_quente(motor):
+    # JOSÉ e JOSE normalizam igual: vale o primeiro na ordem do balde, qualquer que seja a grafia
+    balde = motor.socios_por_miolo(MIOLO_QUENTE)
+    primeiro = next(s for s in balde if normalizar_nome(s.nome_socio) == 'JOSE CARLOS PEREIRA')
+    socios, _, posicao, score, etapa = _escolher_socio(motor, MIOLO_QUENTE, 'JOSE CARLOS PEREIRA', 0.7)
+    assert (socios[posicao], score, etapa) == (primeiro, 1.0, 'exato')
+
+def test_candidatos_acima_igual_a_forca_bruta(base_sintetica):
+    from consulta_cnpj_corrigida import candidatos_acima
+    
+    nomes = [normalizar_nome(nome) for nome, _ in base_sintetica[1][:400]] + ['']
+    for consulta in _consultas_balde_quente(base_sintetica[1])[:30]:
+        alvo = normalizar_nome(consulta)
+        for limiar in (0.5, 0.7, 0.9):
+            esperado = [(i, similaridade(alvo, nome)) for i, nome in enumerate(nomes)
+                        if similaridade(alvo, nome) >= limiar]
+            assert candidatos_acima(alvo, nomes, limiar) == esperado, (consulta, limiar)
+    assert candidatos_acima('', nomes, 0.7) == []
@@ -0,0 +1,292 @@
+# test_download_base_completa.py - Downloads por faixas contra um servidor HTTP local
+import os
+import re
+import json
+import time
+import asyncio
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+import download_base_completa
+
+# O back-off é desligado nos testes (time.sleep do módulo), mas o servidor precisa esperar de verdade
+_dormir = time.sleep
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    
+    def log_message(self, *args):
+        pass
+    
+    def _responder(self, status, corpo=b'', cabecalhos=None):
+        self.send_response(status)
+        for nome, valor in (cabecalhos or {}).items():
+            self.send_header(nome, valor)
+        self.send_header('Content-Length', str(len(corpo)))
+        self.end_headers()
+        # Vazão limitada: uma pausa a cada 64 KB enviados
+        for inicio in range(0, len(corpo), 64 * 1024):
+            self.wfile.write(corpo[inicio:inicio + 64 * 1024])
+            if self.server.atraso:
+                _dormir(self.server.atraso)
+    
+    def do_GET(self):
+        servidor = self.server
+        faixa = self.headers.get('Range')
+        with servidor.lock:
+            servidor.pedidos.append((self.path, faixa, self.headers.get('If-Range')))
+            recusar = self.path in servidor.arquivos and faixa not in (None, 'bytes=0-0') and servidor.recusas > 0
+            if recusar:
+                servidor.recusas -= 1
+        
+        if self.path in servidor.paginas:
+            self._responder(200, servidor.paginas[self.path].encode(), {'Content-Type': 'text/html'})
+            return
+        if recusar:
+            self._responder(429, b'Too Many Requests', {'Retry-After': '1'})
+            return
+        
+        dados = servidor.arquivos.get(self.path)
+        if dados is None:
+            self._responder(404)
+            return
+        
+        cabecalhos = {'ETag': servidor.etag}
+        if not faixa or self.headers.get('If-Range', servidor.etag) != servidor.etag:
+            self._responder(200, dados, cabecalhos)
+            return
+        
+        inicio, fim = (int(n) for n in re.match(r'bytes=(\d+)-(\d+)', faixa).groups())
+        fim = min(fim, len(dados) - 1)
+        corpo = dados[inicio:fim + 1]
+        if inicio or fim:
+            # Metadados (bytes=0-0) sempre inteiros; as faixas passam pelo comportamento do teste
+            corpo = servidor.cortar(self.path, inicio, corpo)
+        cabecalhos['Content-Range'] = f"bytes {inicio}-{inicio + len(corpo) - 1}/{len(dados)}"
+        self._responder(206, corpo, cabecalhos)
+
+@pytest.fixture
+def servidor():
+    servidor = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+    servidor.lock = threading.Lock()
+    servidor.pedidos = []
+    servidor.arquivos = {}
+    servidor.paginas = {}
+    servidor.recusas = 0
+    servidor.atraso = 0
+    servidor.etag = '"v1"'
+    servidor.cortar = lambda caminho, inicio, corpo: corpo
+    servidor.url = f"http://127.0.0.1:{servidor.server_address[1]}"
+    thread = threading.Thread(target=servidor.serve_forever, daemon=True)
+    thread.start()
+    yield servidor
+    servidor.shutdown()
+    servidor.server_close()
+
+@pytest.fixture(autouse=True)
+def sem_espera(monkeypatch):
+    # Faixas pequenas para que um arquivo de 1 MB já seja dividido, e sem back-off real
+    monkeypatch.setattr(download_base_completa, 'TAMANHO_MINIMO_PARTE', 256 * 1024)
+    monkeypatch.setattr(download_base_completa.time, 'sleep', lambda segundos: None)
+
+def _dados(tamanho, semente=0):
+    return bytes((i * 7 + semente) % 251 for i in range(tamanho))
+
+def _baixar(servidor, destino, **kwargs):
+    """download_file numa thread, para que um laço infinito falhe o teste em vez de travá-lo"""
+    resultado = []
+    thread = threading.Thread(
+        target=lambda: resultado.append(download_base_completa.download_file(
+            servidor.url + '/Socios0.zip', str(destino), **kwargs)),
+        daemon=True
+    )
+    thread.start()
+    thread.join(timeout=30)
+    assert not thread.is_alive(), "download_file não terminou"
+    return resultado[0]
+
+def _faixas(servidor):
+    return [(faixa, if_range) for _, faixa, if_range in servidor.pedidos if faixa and faixa != 'bytes=0-0']
+
+def test_resposta_vazia_conta_como_tentativa(servidor, tmp_path):
+    servidor.arquivos['/Socios0.zip'] = _dados(1024 * 1024)
+    servidor.cortar = lambda caminho, inicio, corpo: b''
+    
+    assert _baixar(servidor, tmp_path / 'Socios0.zip', num_partes=1, max_attempts=3) is False
+    assert len(_faixas(servidor)) == 3
+    assert not os.path.exists(tmp_path / 'Socios0.zip')
+
+def test_respostas_curtas_continuam_de_onde_pararam(servidor, tmp_path):
+    dados = _dados(1024 * 1024)
+    servidor.arquivos['/Socios0.zip'] = dados
+    servidor.cortar = lambda caminho, inicio, corpo: corpo[:100 * 1024]
+    
+    assert _baixar(servidor, tmp_path / 'Socios0.zip', num_partes=4, max_attempts=2)
+    assert (tmp_path / 'Socios0.zip').read_bytes() == dados
+    assert not os.path.exists(tmp_path / 'Socios0.zip.estado.json')
+    
+    faixas = _faixas(servidor)
+    assert all(if_range == '"v1"' for _, if_range in faixas)
+    inicios = sorted(int(re.match(r'bytes=(\d+)-', faixa).group(1)) for faixa, _ in faixas)
+    # 4 faixas de 256 KB em pedaços de 100 KB: 3 pedidos por faixa
+    assert len(inicios) == 12
+    assert inicios[:3] == [0, 100 * 1024, 200 * 1024]
+
+def test_retomada_depois_de_interrupcao(servidor, tmp_path):
+    dados = _dados(1024 * 1024)
+    servidor.arquivos['/Socios0.zip'] = dados
+    
+    # Primeira execução: cada faixa recebe 100 KB e depois o servidor para de mandar bytes
+    servidor.cortar = lambda caminho, inicio, corpo: corpo[:100 * 1024] if inicio % (256 * 1024) == 0 else b''
+    assert _baixar(servidor, tmp_path / 'Socios0.zip', num_partes=4, max_attempts=2) is False
+    assert os.path.exists(tmp_path / 'Socios0.zip.part')
+    assert os.path.exists(tmp_path / 'Socios0.zip.estado.json')
+    
+    # Segunda execução: cada faixa recomeça dos 100 KB já gravados
+    servidor.pedidos.clear()
+    servidor.cortar = lambda caminho, inicio, corpo: corpo
+    assert _baixar(servidor, tmp_path / 'Socios0.zip', num_partes=4, max_attempts=2)
+    assert (tmp_path / 'Socios0.zip').read_bytes() == dados
+    inicios = sorted(int(re.match(r'bytes=(\d+)-', faixa).group(1)) for faixa, _ in _faixas(servidor))
+    assert inicios == [parte * 256 * 1024 + 100 * 1024 for parte in range(4)]
+
+def test_arquivo_alterado_no_meio_recomeca(servidor, tmp_path):
+    antigo = _dados(1024 * 1024)
+    novo = _dados(1024 * 1024, semente=1)
+    servidor.arquivos['/Socios0.zip'] = antigo
+    
+    def publicar_novo(caminho, inicio, corpo):
+        # Depois do primeiro pedaço, o servidor passa a ter outra versão do arquivo
+        servidor.arquivos['/Socios0.zip'] = novo
+        servidor.etag = '"v2"'
+        servidor.cortar = lambda caminho, inicio, corpo: corpo
+        return corpo[:100 * 1024]
+    servidor.cortar = publicar_novo
+    
+    assert _baixar(servidor, tmp_path / 'Socios0.zip', num_partes=1, max_attempts=2)
+    assert (tmp_path / 'Socios0.zip').read_bytes() == novo
+
+# Agendador: índice mensal, AIMD, checkpoint e retomada
+
+NOMES_MES = ['Empresas0.zip', 'Estabelecimentos0.zip', 'Socios0.zip', 'Socios1.zip', 'Socios2.zip', 'Cnaes.zip']
+
+class _ControleRegistrado(download_base_completa.ControleConcorrencia):
+    """Janela curta e histórico dos limites, para acompanhar o AIMD durante o teste"""
+    instancias = []
+    
+    def __init__(self, **kwargs):
+        super().__init__(janela=0.3, **kwargs)
+        self.historico = [self.limite]
+        _ControleRegistrado.instancias.append(self)
+    
+    def avaliar(self):
+        limite = super().avaliar()
+        if limite != self.historico[-1]:
+            self.historico.append(limite)
+        return limite
+
+def _publicar_mes(servidor, tamanho=1024 * 1024):
+    servidor.paginas['/dados/'] = '<a href="2025-04/">2025-04/</a> <a href="2025-05/">2025-05/</a>'
+    servidor.paginas['/dados/2025-05/'] = ' '.join(f'<a href="{nome}">{nome}</a>' for nome in NOMES_MES)
+    dados = {}
+    for semente, nome in enumerate(NOMES_MES):
+        dados[nome] = _dados(tamanho, semente)
+        servidor.arquivos['/dados/2025-05/' + nome] = dados[nome]
+    return dados
+
+def _baixar_mes(servidor, diretorio, checkpoint, monkeypatch, concluidos=None, **kwargs):
+    monkeypatch.setattr(download_base_completa, 'ControleConcorrencia', _ControleRegistrado)
+    _ControleRegistrado.instancias.clear()
+    return asyncio.run(asyncio.wait_for(download_base_completa.baixar_base_completa_async(
+        str(diretorio), servidor.url + '/dados/', num_partes=1, caminho_checkpoint=str(checkpoint),
+        ao_concluir=concluidos.append if concluidos is not None else None, **kwargs
+    ), timeout=60))
+
+def test_controle_concorrencia_aimd(monkeypatch):
+    relogio = [0.0]
+    monkeypatch.setattr(download_base_completa.time, 'monotonic', lambda: relogio[0])
+    controle = download_base_completa.ControleConcorrencia(inicial=4, maximo=6, janela=10)
+    
+    def janela(megabytes, erros=0):
+        controle.registrar_bytes(megabytes * 1024 * 1024)
+        for _ in range(erros):
+            controle.registrar_erro()
+        relogio[0] += 10
+        return controle.avaliar()
+    
+    assert controle.avaliar() == 4          # Janela ainda aberta
+    assert janela(10) == 5                   # Vazão subiu: +1
+    assert janela(20) == 6
+    assert janela(40) == 6                   # Teto
+    assert janela(20) == 5                   # Vazão caiu: -1
+    assert janela(20) == 5                   # Estável
+    assert janela(20, erros=1) == 2          # Erros: metade
+    assert janela(20, erros=3) == 1
+    assert janela(1, erros=1) == 1           # Piso
+
+def test_agendador_recua_com_429(servidor, tmp_path, monkeypatch):
+    dados = _publicar_mes(servidor)
+    servidor.atraso = 0.01
+    # Os primeiros pedidos de faixa levam 429, como num servidor sobrecarregado
+    servidor.recusas = 4
+    concluidos = []
+    
+    checkpoint = _baixar_mes(servidor, tmp_path / 'base', tmp_path / 'checkpoint.json', monkeypatch,
+                             concluidos, workers_iniciais=4, workers_max=6)
+    
+    controle = _ControleRegistrado.instancias[0]
+    assert controle.historico[:2] == [4, 2]
+    assert all(1 <= limite <= 6 for limite in controle.historico)
+    assert sorted(checkpoint['completed']) == sorted(NOMES_MES)
+    assert sorted(concluidos) == sorted(str(tmp_path / 'base' / nome) for nome in NOMES_MES)
+    for nome in NOMES_MES:
+        assert (tmp_path / 'base' / nome).read_bytes() == dados[nome]
+
+def test_checkpoint_mantem_formato(servidor, tmp_path, monkeypatch):
+    _publicar_mes(servidor, tamanho=64 * 1024)
+    caminho = tmp_path / 'checkpoint.json'
+    _baixar_mes(servidor, tmp_path / 'base', caminho, monkeypatch)
+    
+    with open(caminho, encoding='utf-8') as f:
+        checkpoint = json.load(f)
+    # Mesmas chaves e tipos do download_checkpoint.json das execuções anteriores
+    raiz = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    with open(os.path.join(raiz, 'download_checkpoint.json'), encoding='utf-8') as f:
+        anterior = json.load(f)
+    assert {chave: type(valor) for chave, valor in checkpoint.items()} == \
+        {chave: type(valor) for chave, valor in anterior.items()}
+    assert sorted(checkpoint['completed']) == sorted(NOMES_MES)
+    assert checkpoint['downloaded_files'] == checkpoint['total_files'] == len(NOMES_MES)
+    assert checkpoint['in_progress'] == {} and checkpoint['failed'] == {}
+    assert checkpoint['current_month_url'] == servidor.url + '/dados/2025-05/'
+
+def test_reinicio_retoma_so_o_que_faltou(servidor, tmp_path, monkeypatch):
+    dados = _publicar_mes(servidor)
+    caminho = tmp_path / 'checkpoint.json'
+    
+    # Primeira execução: Socios1.zip para de mandar bytes depois de 100 KB
+    def travar_socios1(caminho, inicio, corpo):
+        if caminho.endswith('Socios1.zip'):
+            return corpo[:100 * 1024] if inicio == 0 else b''
+        return corpo
+    servidor.cortar = travar_socios1
+    checkpoint = _baixar_mes(servidor, tmp_path / 'base', caminho, monkeypatch)
+    anteriores = list(checkpoint['completed'])
+    assert sorted(anteriores) == sorted(nome for nome in NOMES_MES if nome != 'Socios1.zip')
+    assert checkpoint['failed']['Socios1.zip']['attempts'] == 2
+    assert os.path.exists(tmp_path / 'base' / 'Socios1.zip.estado.json')
+    
+    # Segunda execução: os concluídos seguem direto para a carga e só Socios1.zip
+    # é pedido de novo, a partir dos bytes já gravados
+    servidor.pedidos.clear()
+    servidor.cortar = lambda caminho, inicio, corpo: corpo
+    concluidos = []
+    checkpoint = _baixar_mes(servidor, tmp_path / 'base', caminho, monkeypatch, concluidos)
+    
+    assert concluidos == [str(tmp_path / 'base' / nome) for nome in anteriores + ['Socios1.zip']]
+    assert checkpoint['completed'] == anteriores + ['Socios1.zip'] and checkpoint['failed'] == {}
+    assert {caminho for caminho, _, _ in servidor.pedidos if caminho.endswith('.zip')} == {'/dados/2025-05/Socios1.zip'}
+    assert _faixas(servidor)[0][0] == f"bytes={100 * 1024}-{1024 * 1024 - 1}"
+    assert (tmp_path / 'base' / 'Socios1.zip').read_bytes() == dados['Socios1.zip']
@@ -0,0 +1,48 @@
+import random
+import sqlite3
+import functools
+
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+import exportar_parquet
+from exportar_parquet import _EscritorParticionado
+
+def test_escritor_particionado_limita_memoria_e_arquivos_abertos(tmp_path):
+    esquema = pa.schema([('cnpj_basico', pa.string()), ('uf', pa.string()), ('valor', pa.int64())])
+    ufs = [f"U{i:02d}" for i in range(40)]
+    aleatorio = random.Random(7)
+    escritor = _EscritorParticionado(str(tmp_path), esquema, 'uf', limite_pendentes=500, limite_escritores=4)
+    
+    esperado = []
+    for lote in range(30):
+        linhas = [(f"{lote:04d}{i:04d}", aleatorio.choice(ufs), lote * 1000 + i) for i in range(200)]
+        esperado += linhas
+        escritor.escrever(pa.Table.from_pylist(
+            [dict(zip(esquema.names, linha)) for linha in linhas], schema=esquema))
+        assert escritor.total_pendente <= 500
+        assert sum(sum(t.num_rows for t in tabelas) for tabelas in escritor.pendentes.values()) \
+            == escritor.total_pendente
+        assert len(escritor.escritores) <= 4
+    
+    assert escritor.fechar() == sorted({linha[1] for linha in esperado})
+    # Partições fechadas e reabertas continuam em parte-1, parte-2, ... sem sobrescrever
+    assert any(n > 1 for n in escritor.arquivos.values())
+    
+    dataset = ds.dataset(str(tmp_path), format='parquet', partitioning='hive')
+    lido = dataset.to_table().to_pylist()
+    assert sorted((l['cnpj_basico'], l['uf'], l['valor']) for l in lido) == sorted(esperado)
+
+def test_exportar_tabela_com_limites_pequenos(base_sintetica, tmp_path, monkeypatch):
+    monkeypatch.setattr(exportar_parquet, '_EscritorParticionado',
+                        functools.partial(_EscritorParticionado, limite_pendentes=300, limite_escritores=2))
+    conn = sqlite3.connect(base_sintetica[0])
+    try:
+        linhas, particoes = exportar_parquet.exportar_tabela(conn, 'socios', str(tmp_path), 'prefixo_cnpj',
+                                                             tamanho_lote=1000)
+        esperado = conn.execute("SELECT COUNT(*) FROM socios").fetchone()[0]
+    finally:
+        conn.close()
+    assert linhas == esperado
+    lido = ds.dataset(str(tmp_path / 'socios'), format='parquet', partitioning='hive').count_rows()
+    assert lido == esperado
@@ -0,0 +1,48 @@
+# test_grafo_societario.py - Travessias do grafo de participações
+import random
+
+from grafo_societario import GrafoSocietario, DONOS, PARTICIPADAS
+
+A, B, C, D = 10000001, 10000002, 10000003, 10000004
+
+def _grafo(arestas):
+    """Arestas (dono, participada)"""
+    return GrafoSocietario.de_arestas([dono for dono, _ in arestas], [participada for _, participada in arestas])
+
+def test_truncada_so_com_empresa_nova_cortada():
+    # B e C são donos de A; C também é dono de B
+    grafo = _grafo([(B, A), (C, A), (C, B)])
+    travessia = grafo.percorrer(f"{A}", DONOS, profundidade=1)
+    assert travessia.alcancadas == [(f"{B}", 1), (f"{C}", 1)]
+    assert not travessia.truncada
+    
+    # D dono de C: agora o corte deixa D de fora
+    grafo = _grafo([(B, A), (C, A), (C, B), (D, C)])
+    assert grafo.percorrer(f"{A}", DONOS, profundidade=1).truncada
+    assert not grafo.percorrer(f"{A}", DONOS, profundidade=2).truncada
+
+def test_truncada_com_ciclo_de_volta_a_origem():
+    grafo = _grafo([(A, B), (B, A)])
+    travessia = grafo.percorrer(f"{A}", DONOS, profundidade=1)
+    assert travessia.alcancadas == [(f"{B}", 1)] and travessia.truncada
+    travessia = grafo.percorrer(f"{A}", DONOS, profundidade=2)
+    assert travessia.alcancadas == [(f"{B}", 1), (f"{A}", 2)] and not travessia.truncada
+
+def test_truncada_equivale_a_perder_empresas():
+    aleatorio = random.Random(3)
+    nos = list(range(20000000, 20000060))
+    grafo = _grafo([tuple(aleatorio.sample(nos, 2)) for _ in range(90)])
+    for cnpj in map(str, nos):
+        for sentido in (DONOS, PARTICIPADAS):
+            completa = grafo.percorrer(cnpj, sentido).alcancadas
+            for profundidade in range(5):
+                travessia = grafo.percorrer(cnpj, sentido, profundidade)
+                assert travessia.truncada == (travessia.alcancadas != completa), (cnpj, sentido, profundidade)
+
+def test_cnpj_formatado_ou_sem_zeros_a_esquerda():
+    dono, participada = 1234567, 45678901
+    grafo = _grafo([(dono, participada)])
+    for cnpj in ['01234567', '1234567', 1234567, '01.234.567/0001-90', '1234567000190', '01234567000190']:
+        assert grafo.percorrer(cnpj, PARTICIPADAS).alcancadas == [(f"{participada}", 1)], cnpj
+    for cnpj in ['', 'ABC', '99999999', '99.999.999/0001-99']:
+        assert grafo.percorrer(cnpj, PARTICIPADAS).alcancadas == [], cnpj
@@ -0,0 +1,33 @@
+# test_indice_memoria.py - Índice NumPy de sócios
+import sqlite3
+
+import numpy as np
+
+from indice_memoria import IndiceMemoria, ARRAYS, SEM_MIOLO
+
+def _copiar_socios(origem, destino, tipo_identificador):
+    """Só a tabela de sócios, com identificador_socio do tipo pedido (bancos antigos: TEXT)"""
+    conn = sqlite3.connect(destino)
+    conn.execute("ATTACH DATABASE ? AS base", (origem,))
+    colunas = [(nome, tipo_identificador if nome == 'identificador_socio' else tipo)
+               for _, nome, tipo, *_ in conn.execute("PRAGMA base.table_info(socios)")]
+    conn.execute(f"CREATE TABLE socios ({', '.join(f'{nome} {tipo}' for nome, tipo in colunas)})")
+    conn.execute("INSERT INTO socios SELECT * FROM base.socios")
+    conn.commit()
+    conn.close()
+
+def test_identificador_texto_igual_a_inteiro(base_sintetica, tmp_path):
+    _copiar_socios(base_sintetica[0], str(tmp_path / 'inteiro.db'), 'INTEGER')
+    _copiar_socios(base_sintetica[0], str(tmp_path / 'texto.db'), 'TEXT')
+    conn = sqlite3.connect(str(tmp_path / 'texto.db'))
+    assert conn.execute("SELECT DISTINCT typeof(identificador_socio) FROM socios").fetchall() == [('text',)]
+    pf = conn.execute("SELECT COUNT(*) FROM socios WHERE identificador_socio = 2 "
+                      "AND length(cpf_miolo) = 6").fetchone()[0]
+    conn.close()
+    
+    inteiro = IndiceMemoria.construir(str(tmp_path / 'inteiro.db'))
+    texto = IndiceMemoria.construir(str(tmp_path / 'texto.db'))
+    for nome in ARRAYS:
+        assert np.array_equal(getattr(texto, nome), getattr(inteiro, nome)), nome
+    assert np.count_nonzero(texto.miolo != SEM_MIOLO) == pf
+    assert set(np.unique(texto.identificador).tolist()) == {1, 2}
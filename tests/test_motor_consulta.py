@@ -0,0 +1,49 @@
+# test_motor_consulta.py - Consultas dos backends sobre a base sintética
+import sqlite3
+
+from motor_consulta import MotorSQLite, TABELA_FONETICA, LIMITE_FTS, CAMPOS_SOCIO
+from consulta_cnpj_corrigida import chave_fonetica, normalizar_nome
+
+def test_fonetica_sem_miolo_e_deterministica(base_sintetica):
+    db_path = base_sintetica[0]
+    conn = sqlite3.connect(db_path)
+    # A chave mais comum, com mais sócios que o limite
+    chave, total = conn.execute(f"SELECT chave, COUNT(*) FROM {TABELA_FONETICA} "
+                                "GROUP BY chave ORDER BY 2 DESC, 1 LIMIT 1").fetchone()
+    assert total > 5
+    # Os 5 primeiros na ordem da chave primária, com os campos de Socio
+    esperados = sorted(conn.execute(
+        f"SELECT {', '.join(CAMPOS_SOCIO)} FROM socios WHERE rowid IN "
+        f"(SELECT socio FROM {TABELA_FONETICA} WHERE chave = ? ORDER BY miolo, socio LIMIT 5)", (chave,)))
+    
+    motor = MotorSQLite(db_path)
+    try:
+        socios = motor.socios_por_fonetica(chave, limite=5)
+        assert sorted(map(tuple, socios)) == esperados
+        assert all(chave_fonetica(normalizar_nome(s.nome_socio)) == chave for s in socios)
+        assert motor.socios_por_fonetica(chave, limite=5) == socios
+        assert len(motor.socios_por_fonetica(chave)) == min(total, LIMITE_FTS)
+    finally:
+        motor.fechar()
+        conn.close()
+
+def test_tabelas_listadas_uma_vez_por_conexao(base_sintetica):
+    conn = sqlite3.connect(base_sintetica[0])
+    comandos = []
+    conn.set_trace_callback(comandos.append)
+    motor = MotorSQLite(conn)
+    cnpjs = [cnpj for (cnpj,) in conn.execute("SELECT cnpj_basico FROM empresas ORDER BY 1 LIMIT 20")]
+    try:
+        nomes = [motor.nome_empresa(cnpj) for cnpj in cnpjs]
+        assert all(nome for nome, _ in nomes)
+        assert motor.nome_empresa('00000000') == (None, None)
+        motor.total_socios_pf()
+        motor.balde_quente('123456')
+        # Repetidas, saem do cache sem SQL
+        antes = len(comandos)
+        assert [motor.nome_empresa(cnpj) for cnpj in cnpjs] == nomes
+        assert len(comandos) == antes
+        assert sum('sqlite_master' in comando for comando in comandos) == 1
+    finally:
+        motor.fechar()
+        conn.close()
@@ -0,0 +1,127 @@
+# test_processamento.py - Processamento em lote: mesmos resultados em todos os caminhos
+import random
+import sqlite3
+
+import pytest
+
+from conftest import MIOLO_QUENTE
+from motor_consulta import criar_motor
+from consulta_cnpj_corrigida import (
+    processar_arquivo_socios, processar_arquivo_cnpjs, consulta_socio_direta, verificar_cnpj_direto,
+    resultado_para_json, normalizar_nome, similaridade, _usar_sort_merge
+)
+
+MOTORES = ['sqlite', 'memoria', 'duckdb']
+
+def _origem(engine, base_sintetica, request):
+    if engine == 'duckdb':
+        pytest.importorskip('duckdb')
+        return request.getfixturevalue('base_parquet')
+    return base_sintetica[0]
+
+@pytest.fixture(scope='module')
+def lista_socios(base_sintetica, tmp_path_factory):
+    """CSV de sócios (nome, CPF completo) com acertos, nomes com ruído, o balde quente e miolos ausentes"""
+    aleatorio = random.Random(11)
+    pessoas = base_sintetica[1]
+    linhas = []
+    for nome, miolo in aleatorio.sample(pessoas, 150) + [p for p in pessoas if p[1] == MIOLO_QUENTE][:20]:
+        if aleatorio.random() < 0.3:
+            nome = nome.replace('A', 'E', 1)
+        linhas.append((nome, f"{aleatorio.randrange(1000):03d}.{miolo[:3]}.{miolo[3:]}-{aleatorio.randrange(100):02d}"))
+    linhas += [(f"PESSOA AUSENTE {i}", f"999{i:06d}00") for i in range(10)]
+    linhas += [('SEM CPF VALIDO', '000.000.000-00')]
+    aleatorio.shuffle(linhas)
+    
+    caminho = tmp_path_factory.mktemp('entrada') / 'socios.csv'
+    caminho.write_text('nome;cpf\n' + ''.join(f"{nome};{cpf}\n" for nome, cpf in linhas), encoding='utf-8')
+    return str(caminho), linhas
+
+@pytest.fixture(scope='module')
+def lista_cnpjs(base_sintetica, tmp_path_factory):
+    conn = sqlite3.connect(base_sintetica[0])
+    cnpjs = [cnpj for (cnpj,) in conn.execute("SELECT cnpj_basico FROM empresas ORDER BY cnpj_basico")]
+    conn.close()
+    aleatorio = random.Random(13)
+    linhas = [f"{cnpj}0001{aleatorio.randrange(100):02d}" for cnpj in aleatorio.sample(cnpjs, 80)]
+    linhas += [f"{cnpj}000100" for cnpj in ('00000001', '99999999')]
+    caminho = tmp_path_factory.mktemp('entrada') / 'cnpjs.txt'
+    caminho.write_text('\n'.join(linhas) + '\n', encoding='utf-8')
+    return str(caminho), linhas
+
+@pytest.fixture(scope='module')
+def resultados_socios(base_sintetica, lista_socios):
+    """Referência: uma consulta pontual por sócio no SQLite, sem o caminho em lote"""
+    motor = criar_motor('sqlite', base_sintetica[0])
+    try:
+        return [resultado_para_json(consulta_socio_direta(base_sintetica[0], nome, cpf, 0.7, motor=motor))
+                for nome, cpf in lista_socios[1]]
+    finally:
+        motor.fechar()
+
+@pytest.mark.parametrize('engine', MOTORES)
+def test_socios_iguais_em_todos_os_motores(engine, base_sintetica, lista_socios, resultados_socios, request):
+    resultados = processar_arquivo_socios(_origem(engine, base_sintetica, request), lista_socios[0],
+                                          engine=engine, razao_sort_merge=float('inf'))
+    assert len(resultados) == len(lista_socios[1])
+    for resultado, esperado in zip(resultados, resultados_socios):
+        assert resultado == esperado, esperado['nome']
+    assert sum(r['status'] == 'Encontrado' for r in resultados) > 100
+
+def test_sort_merge_igual_as_buscas_pelo_indice(base_sintetica, lista_socios, resultados_socios):
+    # Razão 0: qualquer lista passa pelo sort-merge
+    assert _usar_sort_merge(base_sintetica[0], len(lista_socios[1]), 0)
+    resultados = processar_arquivo_socios(base_sintetica[0], lista_socios[0], razao_sort_merge=0)
+    assert resultados == resultados_socios
+
+@pytest.mark.parametrize('engine', MOTORES)
+def test_cnpjs_iguais_em_todos_os_motores(engine, base_sintetica, lista_cnpjs, request):
+    motor = criar_motor('sqlite', base_sintetica[0])
+    try:
+        esperados = [resultado_para_json(verificar_cnpj_direto(base_sintetica[0], cnpj, motor=motor))
+                     for cnpj in lista_cnpjs[1]]
+    finally:
+        motor.fechar()
+    resultados = processar_arquivo_cnpjs(_origem(engine, base_sintetica, request), lista_cnpjs[0], engine=engine)
+    assert resultados == esperados
+
+def _jaccard(a, b):
+    trigramas_a, trigramas_b = ({t[i:i + 3] for i in range(len(t) - 2)} for t in (f" {a} ", f" {b} "))
+    return len(trigramas_a & trigramas_b) / len(trigramas_a | trigramas_b)
+
+def test_conciliacao_lsh_contra_forca_bruta(base_sintetica):
+    from indice_lsh import IndiceLSH
+    
+    db_path, pessoas = base_sintetica
+    conn = sqlite3.connect(db_path)
+    socios = [(rowid, normalizar_nome(nome), cnpj, uf or '') for rowid, nome, cnpj, uf in conn.execute(
+        "SELECT s.rowid, s.nome_socio, s.cnpj_basico, r.uf FROM socios s "
+        "LEFT JOIN empresa_resumo r ON r.cnpj_basico = s.cnpj_basico")]
+    conn.close()
+    
+    aleatorio = random.Random(17)
+    entradas = [(nome, aleatorio.choice(['', 'SP', 'RJ'])) for nome, _ in aleatorio.sample(pessoas, 40)]
+    entradas += [(nome[:-1], '') for nome, _ in aleatorio.sample(pessoas, 20)]
+    limiar = 0.8
+    pares = IndiceLSH.construir(db_path).conciliar(entradas, limiar=limiar, limite=10 ** 6)
+    
+    encontrados, total = 0, 0
+    for i, (nome, uf) in enumerate(entradas):
+        alvo = normalizar_nome(nome)
+        esperado = {rowid: similaridade(alvo, nome_socio) for rowid, nome_socio, _, uf_socio in socios
+                    if (not uf or uf_socio == uf) and similaridade(alvo, nome_socio) >= limiar}
+        obtido = {par.socio: par for par in pares if par.entrada == i}
+        # Sem falsos positivos: cada par está na força bruta, com o mesmo score
+        for rowid, par in obtido.items():
+            assert rowid in esperado and par.score == esperado[rowid], (nome, par)
+        # Nomes iguais (depois da normalização) caem em todas as bandas: todos aparecem
+        iguais = {rowid for rowid, nome_socio, _, uf_socio in socios
+                  if nome_socio == alvo and (not uf or uf_socio == uf)}
+        assert iguais <= set(obtido), nome
+        # Os demais dependem das bandas, que seguem a semelhança dos trigramas (Jaccard),
+        # não a do SequenceMatcher: acima de 0,7 a chance de virar candidato é 99,6%
+        nomes_socios = {rowid: nome_socio for rowid, nome_socio, _, _ in socios}
+        proximos = {rowid for rowid in esperado if _jaccard(alvo, nomes_socios[rowid]) >= 0.7}
+        encontrados += len(proximos & set(obtido))
+        total += len(proximos)
+    assert total > 50 and encontrados >= 0.97 * total